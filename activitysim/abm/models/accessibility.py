@@ -79,7 +79,8 @@ class AccessibilitySkims(object):
         skim['DISTANCE'] or skim[('SOVTOLL_TIME', 'MD')]
         """
 
-        data = self.skim_dict.get(key).data
+        skim = self.skim_dict.get(key)
+        data = skim.data
 
         if self.transpose:
             data = data.transpose()
@@ -94,7 +95,7 @@ class AccessibilitySkims(object):
 
             data = data[self.orig_map, :][:, self.dest_map]
 
-        return data.flatten()
+        return skim.decode(data.flatten())
 
 
 @inject.step()
@@ -167,7 +168,8 @@ def compute_accessibility(accessibility, skim_dict, land_use, trace_od):
         locals_d.update(constants)
 
     results, trace_results, trace_assigned_locals \
-        = assign.assign_variables(assignment_spec, od_df, locals_d, trace_rows=trace_od_rows)
+        = assign.assign_variables(assignment_spec, od_df, locals_d, trace_rows=trace_od_rows,
+                                  trace_label=trace_label)
 
     for column in results.columns:
         data = np.asanyarray(results[column])
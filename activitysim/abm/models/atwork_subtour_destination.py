@@ -9,6 +9,7 @@ from activitysim.core import config
 from activitysim.core import pipeline
 from activitysim.core import simulate
 from activitysim.core import inject
+from activitysim.core import spec_columns
 
 from activitysim.core.interaction_sample_simulate import interaction_sample_simulate
 from activitysim.core.interaction_sample import interaction_sample
@@ -38,9 +39,6 @@ def atwork_subtour_destination_sample(
 
     # merge persons into tours
     choosers = pd.merge(tours, persons_merged, left_on='person_id', right_index=True)
-    # FIXME - MEMORY HACK - only include columns actually used in spec
-    chooser_columns = model_settings['SIMULATE_CHOOSER_COLUMNS']
-    choosers = choosers[chooser_columns]
 
     constants = config.get_model_constants(model_settings)
 
@@ -65,6 +63,10 @@ def atwork_subtour_destination_sample(
     if constants is not None:
         locals_d.update(constants)
 
+    # FIXME - MEMORY HACK - only include columns actually used in spec
+    choosers = spec_columns.select_chooser_columns(model_settings, choosers, destination_size_terms, model_spec,
+                                                   locals_d, skims, trace_label)
+
     choices = interaction_sample(
         choosers,
         alternatives=destination_size_terms,
@@ -113,7 +115,8 @@ def atwork_subtour_destination_logsums(
     logsum_settings = config.read_model_settings(model_settings['LOGSUM_SETTINGS'])
 
     # FIXME - MEMORY HACK - only include columns actually used in spec
-    persons_merged = logsum.filter_chooser_columns(persons_merged, logsum_settings, model_settings)
+    persons_merged = logsum.filter_chooser_columns(persons_merged, logsum_settings, model_settings,
+                                                   trace_label)
 
     # merge persons into tours
     choosers = pd.merge(destination_sample,
@@ -167,12 +170,6 @@ def atwork_subtour_destination_simulate(
     choosers = pd.merge(subtours,
                         persons_merged,
                         left_on='person_id', right_index=True)
-    # FIXME - MEMORY HACK - only include columns actually used in spec
-    chooser_columns = model_settings['SIMULATE_CHOOSER_COLUMNS']
-    choosers = choosers[chooser_columns]
-
-    if estimator:
-        estimator.write_choosers(choosers)
 
     alt_dest_col_name = model_settings['ALT_DEST_COL_NAME']
     chooser_col_name = 'workplace_taz'
@@ -200,6 +197,13 @@ def atwork_subtour_destination_simulate(
     if constants is not None:
         locals_d.update(constants)
 
+    # FIXME - MEMORY HACK - only include columns actually used in spec
+    choosers = spec_columns.select_chooser_columns(model_settings, choosers, alternatives, model_spec,
+                                                   locals_d, skims, trace_label)
+
+    if estimator:
+        estimator.write_choosers(choosers)
+
     tracing.dump_df(DUMP, choosers, trace_label, 'choosers')
 
     choices = interaction_sample_simulate(
@@ -9,6 +9,7 @@ from activitysim.core import config
 from activitysim.core import inject
 from activitysim.core import pipeline
 from activitysim.core import simulate
+from activitysim.core import spec_columns
 
 from activitysim.core.mem import force_garbage_collect
 
@@ -42,9 +43,6 @@ def run_destination_sample(
     # choosers are tours - in a sense tours are choosing their destination
     choosers = pd.merge(tours, households_merged,
                         left_on='household_id', right_index=True, how='left')
-    # FIXME - MEMORY HACK - only include columns actually used in spec
-    chooser_columns = model_settings['SIMULATE_CHOOSER_COLUMNS']
-    choosers = choosers[chooser_columns]
 
     alt_dest_col_name = model_settings["ALT_DEST_COL_NAME"]
 
@@ -73,6 +71,10 @@ def run_destination_sample(
     if constants is not None:
         locals_d.update(constants)
 
+    # FIXME - MEMORY HACK - only include columns actually used in spec
+    choosers = spec_columns.select_chooser_columns(model_settings, choosers, destination_size_terms, spec,
+                                                   locals_d, skims, trace_label)
+
     choices = interaction_sample(
         choosers,
         alternatives=destination_size_terms,
@@ -108,7 +110,8 @@ def run_destination_logsums(
     logsum_settings = config.read_model_settings(model_settings['LOGSUM_SETTINGS'])
 
     # FIXME - MEMORY HACK - only include columns actually used in spec
-    persons_merged = logsum.filter_chooser_columns(persons_merged, logsum_settings, model_settings)
+    persons_merged = logsum.filter_chooser_columns(persons_merged, logsum_settings, model_settings,
+                                                   trace_label)
 
     # merge persons into tours
     choosers = pd.merge(destination_sample,
@@ -155,11 +158,6 @@ def run_destination_simulate(
     choosers = pd.merge(tours,
                         persons_merged,
                         left_on='person_id', right_index=True, how='left')
-    # FIXME - MEMORY HACK - only include columns actually used in spec
-    chooser_columns = model_settings['SIMULATE_CHOOSER_COLUMNS']
-    choosers = choosers[chooser_columns]
-    if estimator:
-        estimator.write_choosers(choosers)
 
     alt_dest_col_name = model_settings["ALT_DEST_COL_NAME"]
     origin_col_name = model_settings['CHOOSER_ORIG_COL_NAME']
@@ -184,6 +182,12 @@ def run_destination_simulate(
     if constants is not None:
         locals_d.update(constants)
 
+    # FIXME - MEMORY HACK - only include columns actually used in spec
+    choosers = spec_columns.select_chooser_columns(model_settings, choosers, destination_sample, spec,
+                                                   locals_d, skims, trace_label)
+    if estimator:
+        estimator.write_choosers(choosers)
+
     choices = interaction_sample_simulate(
         choosers,
         destination_sample,
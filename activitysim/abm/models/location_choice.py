@@ -11,6 +11,7 @@ from activitysim.core import config
 from activitysim.core import pipeline
 from activitysim.core import simulate
 from activitysim.core import inject
+from activitysim.core import spec_columns
 from activitysim.core.mem import force_garbage_collect
 
 from activitysim.core.interaction_sample_simulate import interaction_sample_simulate
@@ -120,14 +121,10 @@ def run_location_sample(
     """
     assert not persons_merged.empty
 
-    # FIXME - MEMORY HACK - only include columns actually used in spec
-    chooser_columns = model_settings['SIMULATE_CHOOSER_COLUMNS']
-    choosers = persons_merged[chooser_columns]
-
     alternatives = dest_size_terms
     alt_dest_col_name = model_settings['ALT_DEST_COL_NAME']
 
-    logger.info("Running %s with %d persons" % (trace_label, len(choosers.index)))
+    logger.info("Running %s with %d persons" % (trace_label, len(persons_merged.index)))
 
     sample_size = model_settings["SAMPLE_SIZE"]
     if estimator:
@@ -151,6 +148,10 @@ def run_location_sample(
     spec = simulate.spec_for_segment(model_settings, spec_id='SAMPLE_SPEC',
                                      segment_name=segment_name, estimator=estimator)
 
+    # FIXME - MEMORY HACK - only include columns actually used in spec
+    choosers = spec_columns.select_chooser_columns(model_settings, persons_merged, alternatives, spec,
+                                                   locals_d, skims, trace_label)
+
     choices = interaction_sample(
         choosers,
         alternatives,
@@ -199,7 +200,7 @@ def run_location_logsums(
 
     # FIXME - MEMORY HACK - only include columns actually used in spec
     persons_merged_df = \
-        logsum.filter_chooser_columns(persons_merged_df, logsum_settings, model_settings)
+        logsum.filter_chooser_columns(persons_merged_df, logsum_settings, model_settings, trace_label)
 
     logger.info("Running %s with %s rows" % (trace_label, len(location_sample_df.index)))
 
@@ -250,10 +251,6 @@ def run_location_simulate(
     """
     assert not persons_merged.empty
 
-    # FIXME - MEMORY HACK - only include columns actually used in spec
-    chooser_columns = model_settings['SIMULATE_CHOOSER_COLUMNS']
-    choosers = persons_merged[chooser_columns]
-
     alt_dest_col_name = model_settings['ALT_DEST_COL_NAME']
 
     # alternatives are pre-sampled and annotated with logsums and pick_count
@@ -262,7 +259,7 @@ def run_location_simulate(
         pd.merge(location_sample_df, dest_size_terms,
                  left_on=alt_dest_col_name, right_index=True, how="left")
 
-    logger.info("Running %s with %d persons" % (trace_label, len(choosers)))
+    logger.info("Running %s with %d persons" % (trace_label, len(persons_merged)))
 
     # create wrapper with keys for this lookup - in this case there is a TAZ in the choosers
     # and a TAZ in the alternatives which get merged during interaction
@@ -278,14 +275,18 @@ def run_location_simulate(
     if constants is not None:
         locals_d.update(constants)
 
+    spec = simulate.spec_for_segment(model_settings, spec_id='SPEC', segment_name=segment_name, estimator=estimator)
+
+    # FIXME - MEMORY HACK - only include columns actually used in spec
+    choosers = spec_columns.select_chooser_columns(model_settings, persons_merged, alternatives, spec,
+                                                   locals_d, skims, trace_label)
+
     if estimator:
         # write choosers after annotation
         estimator.write_choosers(choosers)
         estimator.set_alt_id(alt_dest_col_name)
         estimator.write_interaction_sample_alternatives(alternatives)
 
-    spec = simulate.spec_for_segment(model_settings, spec_id='SPEC', segment_name=segment_name, estimator=estimator)
-
     choices = interaction_sample_simulate(
         choosers,
         alternatives,
@@ -126,7 +126,8 @@ def compute_columns(df, model_settings, locals_dict={}, trace_label=None):
         = assign.assign_variables(expressions_spec,
                                   df,
                                   _locals_dict,
-                                  trace_rows=tracing.trace_targets(df))
+                                  trace_rows=tracing.trace_targets(df),
+                                  trace_label=trace_label)
 
     if trace_results is not None:
         tracing.trace_df(trace_results,
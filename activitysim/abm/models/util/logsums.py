@@ -5,6 +5,8 @@ import logging
 from activitysim.core import simulate
 from activitysim.core import tracing
 from activitysim.core import config
+from activitysim.core import assign
+from activitysim.core import spec_columns
 
 from activitysim.core.assign import evaluate_constants
 
@@ -15,13 +17,64 @@ from . import expressions
 logger = logging.getLogger(__name__)
 
 
-def filter_chooser_columns(choosers, logsum_settings, model_settings):
+def logsum_chooser_columns(logsum_settings, model_settings):
+    """
+    Return the columns compute_logsums choosers need (before they are annotated by compute_logsums)
+
+    These are the columns referenced by the logsum spec and preprocessor expressions (less the
+    columns the preprocessor and compute_logsums assign) and the skim origin and destination.
+
+    Returns
+    -------
+    columns : set of str or None
+        None if the columns can't be determined
+    """
+
+    # skim column names and constants that expressions may use to select df columns (e.g. df[dest_col_name])
+    locals_d = dict(config.get_model_constants(logsum_settings))
+    locals_d.update({
+        'orig_col_name': model_settings.get('CHOOSER_ORIG_COL_NAME'),
+        'dest_col_name': model_settings.get('ALT_DEST_COL_NAME')
+    })
+
+    logsum_spec = simulate.read_model_spec(file_name=logsum_settings['SPEC'])
+    columns = spec_columns.spec_columns(logsum_spec, locals_d, allow_temps=False)
+    if columns is None:
+        return None
+
+    preprocessor_settings = logsum_settings.get(model_settings.get('LOGSUM_PREPROCESSOR', 'preprocessor'))
+    if preprocessor_settings:
+        spec_name = preprocessor_settings['SPEC']
+        if not spec_name.endswith('.csv'):
+            spec_name = '%s.csv' % spec_name
+        assignment_spec = assign.read_assignment_spec(config.config_file_path(spec_name))
+        df_names = {'df', preprocessor_settings.get('DF', 'df')}
+        preprocessor_columns, targets = spec_columns.assignment_columns(assignment_spec, locals_d, df_names)
+        if preprocessor_columns is None:
+            return None
+        columns = (columns - targets) | preprocessor_columns
+
+    # compute_logsums adds these to choosers
+    columns -= {'in_period', 'out_period', 'duration'}
+
+    columns |= {model_settings[c] for c in ['CHOOSER_ORIG_COL_NAME', 'ALT_DEST_COL_NAME'] if c in model_settings}
+
+    return columns
+
+
+def filter_chooser_columns(choosers, logsum_settings, model_settings, trace_label=None):
 
     chooser_columns = logsum_settings.get('LOGSUM_CHOOSER_COLUMNS', [])
 
     if 'CHOOSER_ORIG_COL_NAME' in model_settings:
         chooser_columns.append(model_settings['CHOOSER_ORIG_COL_NAME'])
 
+    # (only when pruning, since the analysis reads the logsum spec and preprocessor spec again)
+    if spec_columns.enabled() and not spec_columns.column_list_reported('LOGSUM_CHOOSER_COLUMNS', trace_label):
+        spec_columns.report_column_list('LOGSUM_CHOOSER_COLUMNS', chooser_columns,
+                                        logsum_chooser_columns(logsum_settings, model_settings),
+                                        choosers.columns, trace_label)
+
     missing_columns = [c for c in chooser_columns if c not in choosers]
     if missing_columns:
         logger.debug("logsum.filter_chooser_columns missing_columns %s" % missing_columns)
@@ -5,7 +5,11 @@ from builtins import int
 
 import sys
 import os
+import ast
+import hashlib
 import logging
+import re
+import time
 import multiprocessing
 
 from collections import OrderedDict
@@ -14,6 +18,7 @@ from operator import mul
 
 import numpy as np
 import openmatrix as omx
+import yaml
 
 from activitysim.core import skim
 from activitysim.core import inject
@@ -28,16 +33,174 @@ Read in the omx files and create the skim objects
 """
 
 
-def get_skim_info(omx_file_path, tags_to_load=None):
+def skim_layout():
+    """
+    block layout of skim buffers specified by skim_layout setting (defaults to skim.OD_MAJOR)
+    """
+
+    layout = config.setting('skim_layout', skim.OD_MAJOR)
+    if layout not in skim.SKIM_LAYOUTS:
+        raise RuntimeError("unrecognized skim_layout '%s' in settings (expected one of %s)" %
+                           (layout, skim.SKIM_LAYOUTS))
+    return layout
+
+
+# multiprocessing.RawArray typecodes for supported skim dtypes
+# (RawArray has no half float type, so float16 skims are shared as 2 byte unsigned ints)
+SKIM_DTYPE_TYPECODES = {
+    'float64': 'd',
+    'float32': 'f',
+    'float16': 'H',
+    'int32': 'i',
+    'uint32': 'I',
+    'int16': 'h',
+    'uint16': 'H',
+    'int8': 'b',
+    'uint8': 'B',
+}
+
+
+def skim_dtypes():
+    """
+    per-skim storage dtypes specified by skim_dtypes setting
+
+    skim_dtypes maps skim key1 to either a dtype name or a dict with dtype and (optional) scale
+    where skim values are stored as round(value / scale) and decoded as stored_value * scale
+
+    ::
+
+        skim_dtypes:
+          DIST: float16
+          SOV_TIME:
+            dtype: uint16
+            scale: 0.01
+          SOV_TOLL_AVAIL: uint8
+
+    Returns
+    -------
+    dict {<key1>: (<numpy.dtype>, <scale or None>)}
+    """
+
+    dtypes = {}
+    for key1, spec in (config.setting('skim_dtypes') or {}).items():
+
+        if isinstance(spec, dict):
+            dtype, scale = spec.get('dtype'), spec.get('scale')
+        else:
+            dtype, scale = spec, None
+
+        if dtype not in SKIM_DTYPE_TYPECODES:
+            raise RuntimeError("unsupported skim_dtypes dtype '%s' for skim %s (expected one of %s)" %
+                               (dtype, key1, list(SKIM_DTYPE_TYPECODES.keys())))
+
+        dtypes[key1] = (np.dtype(dtype), scale)
+
+    return dtypes
+
+
+def block_dtype(skim_info, block_name):
+    """
+    storage dtype of skim block (defaults to skim_info dtype if block_dtypes not specified)
+    """
+    return np.dtype(skim_info.get('block_dtypes', {}).get(block_name, skim_info['dtype']))
+
+
+def skim_keys_from_configs():
+    """
+    key1 names of skims that might be referenced by configured models
+
+    Scans the csv (spec and preprocessor expression) and yaml files in the configs dirs for
+    quoted names - e.g. odt_skims['SOV_TIME'] or skim_od["DIST"]. This errs on the side of
+    inclusion, since any quoted string that happens to match an omx key1 name will be loaded.
+
+    Returns
+    -------
+    keys : set of str
+    """
+
+    configs_dirs = inject.get_injectable('configs_dir')
+    if isinstance(configs_dirs, str):
+        configs_dirs = [configs_dirs]
+
+    quoted_name = re.compile(r"""['"]([A-Za-z_][A-Za-z0-9_]*)['"]""")
+
+    keys = set()
+    for configs_dir in configs_dirs:
+        for file_name in sorted(os.listdir(configs_dir)):
+            if os.path.splitext(file_name)[1].lower() not in ['.csv', '.yaml']:
+                continue
+            with open(os.path.join(configs_dir, file_name)) as f:
+                keys.update(quoted_name.findall(f.read()))
+
+    return keys
+
+
+def skim_keys_from_usage_file(file_path):
+    """
+    key1 names of skims used by a prior run, as recorded in skim_usage.txt by track_skim_usage
+
+    Only the skim_dict and skim_stack usage sections are read, the unused key sections are ignored.
+
+    Returns
+    -------
+    keys : set of str
+    """
+
+    keys = set()
+    in_usage_section = False
+    with open(file_path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('###'):
+                in_usage_section = line.endswith(' usage')
+                continue
+            if not (line and in_usage_section):
+                continue
+
+            # tuple keys are written as ('SOV_TIME', 'AM') and str keys as bare DIST
+            key = ast.literal_eval(line) if line.startswith('(') else line
+            keys.add(key[0] if isinstance(key, tuple) else key)
+
+    return keys
+
+
+def skim_keys_to_load():
+    """
+    key1 names of the skims to load if load_only_used_skims setting is True, otherwise None
+
+    This is the union of the names referenced by the model configs and (optionally) the names
+    recorded as used in a prior run's skim_usage.txt, specified by the skim_usage_file setting.
+
+    Returns
+    -------
+    keys : set of str or None
+    """
+
+    if not config.setting('load_only_used_skims', False):
+        return None
+
+    keys = skim_keys_from_configs()
+
+    skim_usage_file = config.setting('skim_usage_file')
+    if skim_usage_file:
+        keys |= skim_keys_from_usage_file(config.config_file_path(skim_usage_file))
+
+    return keys
+
+
+def get_skim_info(omx_file_path, tags_to_load=None, keys_to_load=None):
 
     # this is sys.maxint for p2.7 but no limit for p3
     # windows sys.maxint =  2147483647
     MAX_BLOCK_BYTES = sys.maxint - 1 if sys.version_info < (3,) else sys.maxsize - 1
 
     # Note: we load all skims except those with key2 not in tags_to_load
-    # Note: we require all skims to be of same dtype so they can share buffer - is that ok?
-    # fixme is it ok to require skims be all the same type? if so, is this the right choice?
+    # Note: and (if keys_to_load is specified) those with key1 not in keys_to_load
+    # Note: skims are stored as skim_dtype unless skim_dtypes setting specifies otherwise,
+    # skims with other storage dtypes are grouped into separate blocks, and decoded to skim_dtype on lookup
     skim_dtype = np.float32
+    key1_dtypes = skim_dtypes()
+    layout = skim_layout()
     omx_name = os.path.splitext(os.path.basename(omx_file_path))[0]
 
     with omx.open_file(omx_file_path) as omx_file:
@@ -66,6 +229,7 @@ def get_skim_info(omx_file_path, tags_to_load=None):
     # DISTWALK: DISTWALK
     # ('DRV_COM_WLK_BOARDS', 'AM'): DRV_COM_WLK_BOARDS__AM, ...
     omx_keys = OrderedDict()
+    skipped_keys = set()
     for skim_name in omx_skim_names:
         key1, sep, key2 = skim_name.partition('__')
 
@@ -73,11 +237,20 @@ def get_skim_info(omx_file_path, tags_to_load=None):
         if tags_to_load and sep and key2 not in tags_to_load:
             continue
 
+        # - ignore skims not referenced by any model
+        if keys_to_load is not None and key1 not in keys_to_load:
+            skipped_keys.add(key1)
+            continue
+
         skim_key = (key1, key2) if sep else key1
         omx_keys[skim_key] = skim_name
 
     num_skims = len(omx_keys)
 
+    if skipped_keys:
+        logger.info("get_skim_info omx_name %s skipping %s unreferenced skim keys" % (omx_name, len(skipped_keys)))
+        logger.debug("get_skim_info skipped keys: %s" % sorted(skipped_keys))
+
     # - key1_subkeys dict maps key1 to dict of subkeys with that key1
     # DIST: {'DIST': 0}
     # DRV_COM_WLK_BOARDS: {'MD': 1, 'AM': 0, 'PM': 2}, ...
@@ -90,34 +263,59 @@ def get_skim_info(omx_file_path, tags_to_load=None):
         key2_dict = key1_subkeys.setdefault(key1, {})
         key2_dict[key2] = len(key2_dict)
 
+    # - dtype_key1s dict maps storage dtype to list of key1 with that dtype (skim_dtype first)
+    dtype_key1s = OrderedDict([(np.dtype(skim_dtype), [])])
+    for key1 in key1_subkeys:
+        dtype = key1_dtypes.get(key1, (skim_dtype, None))[0]
+        dtype_key1s.setdefault(np.dtype(dtype), []).append(key1)
+
     # - blocks dict maps block name to blocksize (number of subkey skims in block)
     # skims_0: 198,
     # skims_1: 198, ...
+    # - block_dtypes dict maps block name to storage dtype of skims in block
     # - key1_block_offsets dict maps key1 to (block, offset) of first skim with that key1
     # DISTWALK: (0, 2),
     # DRV_COM_WLK_BOARDS: (0, 3), ...
 
-    if MAX_BLOCK_BYTES:
-        max_block_items = MAX_BLOCK_BYTES // np.dtype(skim_dtype).itemsize
-        max_skims_per_block = max_block_items // multiply_large_numbers(omx_shape)
-    else:
-        max_skims_per_block = num_skims
-
-    def block_name(block):
-        return "skim_%s_%s" % (omx_name, block)
+    def block_name(block, dtype):
+        if dtype == skim_dtype:
+            return "skim_%s_%s" % (omx_name, block)
+        return "skim_%s_%s_%s" % (omx_name, dtype.name, block)
 
     key1_block_offsets = OrderedDict()
     blocks = OrderedDict()
-    block = offset = 0
-    for key1, v in key1_subkeys.items():
-        num_subkeys = len(v)
-        if offset + num_subkeys > max_skims_per_block:  # next block
-            blocks[block_name(block)] = offset
-            block += 1
-            offset = 0
-        key1_block_offsets[key1] = (block, offset)
-        offset += num_subkeys
-    blocks[block_name(block)] = offset  # last block
+    block_dtypes = OrderedDict()
+    block = 0
+    for dtype, key1s in dtype_key1s.items():
+
+        # default dtype group may be empty if all skims have skim_dtypes
+        if not key1s and len(dtype_key1s) > 1:
+            continue
+
+        if MAX_BLOCK_BYTES:
+            max_block_items = MAX_BLOCK_BYTES // dtype.itemsize
+            max_skims_per_block = max_block_items // multiply_large_numbers(omx_shape)
+        else:
+            max_skims_per_block = num_skims
+
+        if blocks:
+            block += 1  # new block for each dtype
+        offset = 0
+        for key1 in key1s:
+            num_subkeys = len(key1_subkeys[key1])
+            if offset + num_subkeys > max_skims_per_block:  # next block
+                blocks[block_name(block, dtype)] = offset
+                block_dtypes[block_name(block, dtype)] = dtype
+                block += 1
+                offset = 0
+            key1_block_offsets[key1] = (block, offset)
+            offset += num_subkeys
+        blocks[block_name(block, dtype)] = offset  # last block for dtype
+        block_dtypes[block_name(block, dtype)] = dtype
+
+    # - scales dict maps key1 to scale factor to decode quantized skims
+    # SOV_TIME: 0.01, ...
+    scales = {key1: scale for key1, (dtype, scale) in key1_dtypes.items() if scale and key1 in key1_subkeys}
 
     # - block_offsets dict maps skim_key to (block, offset) of omx matrix
     # DIST: (0, 0),
@@ -138,20 +336,24 @@ def get_skim_info(omx_file_path, tags_to_load=None):
         block_offsets[skim_key] = (block, key1_offset + key2_relative_offset)
 
     logger.debug("get_skim_info from %s" % (omx_file_path, ))
-    logger.debug("get_skim_info skim_dtype %s omx_shape %s num_skims %s num_blocks %s" %
-                 (skim_dtype, omx_shape, num_skims, len(blocks)))
+    logger.debug("get_skim_info skim_dtype %s omx_shape %s num_skims %s num_blocks %s layout %s" %
+                 (skim_dtype, omx_shape, num_skims, len(blocks), layout))
 
     skim_info = {
         'omx_name': omx_name,
         'omx_shape': omx_shape,
         'num_skims': num_skims,
         'dtype': skim_dtype,
+        'layout': layout,
         'offset_map_name': offset_map_name,
         'offset_map': offset_map,
         'omx_keys': omx_keys,
         'key1_block_offsets': key1_block_offsets,
         'block_offsets': block_offsets,
         'blocks': blocks,
+        'block_dtypes': block_dtypes,
+        'scales': scales,
+        'skipped_keys': skipped_keys,
     }
 
     return skim_info
@@ -159,27 +361,25 @@ def get_skim_info(omx_file_path, tags_to_load=None):
 
 def buffers_for_skims(skim_info, shared=False):
 
-    skim_dtype = skim_info['dtype']
     omx_shape = skim_info['omx_shape']
     blocks = skim_info['blocks']
 
     skim_buffers = {}
     for block_name, block_size in blocks.items():
 
+        skim_dtype = block_dtype(skim_info, block_name)
+
         # buffer_size must be int, not np.int64
         buffer_size = int(multiply_large_numbers(omx_shape) * block_size)
 
-        itemsize = np.dtype(skim_dtype).itemsize
+        itemsize = skim_dtype.itemsize
         csz = buffer_size * itemsize
         logger.info("allocating shared buffer %s for %s skims (skim size: %s * %s bytes = %s) total size: %s (%s)" %
                     (block_name, block_size, omx_shape, itemsize, buffer_size, csz, util.GB(csz)))
 
         if shared:
-            if np.issubdtype(skim_dtype, np.float64):
-                typecode = 'd'
-            elif np.issubdtype(skim_dtype, np.float32):
-                typecode = 'f'
-            else:
+            typecode = SKIM_DTYPE_TYPECODES.get(skim_dtype.name)
+            if typecode is None:
                 raise RuntimeError("buffers_for_skims unrecognized dtype %s" % skim_dtype)
 
             buffer = multiprocessing.RawArray(typecode, buffer_size)
@@ -191,20 +391,33 @@ def buffers_for_skims(skim_info, shared=False):
     return skim_buffers
 
 
+def block_shape(skim_info, block_size):
+    """
+    shape of a skim block with block_size skims, according to the skim_info block layout
+
+    od_major blocks are (orig, dest, skim) and skim_major blocks are (skim, orig, dest)
+    """
+
+    omx_shape = skim_info['omx_shape']
+
+    if skim_info.get('layout', skim.OD_MAJOR) == skim.SKIM_MAJOR:
+        return (block_size,) + omx_shape
+
+    return omx_shape + (block_size,)
+
+
 def skim_data_from_buffers(skim_buffers, skim_info):
 
     assert type(skim_buffers) == dict
 
-    omx_shape = skim_info['omx_shape']
-    skim_dtype = skim_info['dtype']
     blocks = skim_info['blocks']
 
     skim_data = []
     for block_name, block_size in blocks.items():
-        skims_shape = omx_shape + (block_size,)
+        skims_shape = block_shape(skim_info, block_size)
         block_buffer = skim_buffers[block_name]
         assert len(block_buffer) == int(multiply_large_numbers(skims_shape))
-        block_data = np.frombuffer(block_buffer, dtype=skim_dtype).reshape(skims_shape)
+        block_data = np.frombuffer(block_buffer, dtype=block_dtype(skim_info, block_name)).reshape(skims_shape)
         skim_data.append(block_data)
 
     return skim_data
@@ -214,26 +427,177 @@ def default_skim_cache_dir():
     return inject.get_injectable('output_dir')
 
 
-def build_skim_cache_file_name(omx_name, block):
+def get_skim_cache_dir():
+    # only fall back on output_dir if skim_cache_dir is not specified
+    return config.setting('skim_cache_dir') or default_skim_cache_dir()
+
+
+def build_skim_cache_file_name(omx_name, block, layout=skim.OD_MAJOR):
+    # skim_major caches are named distinctly since their blocks are not interchangeable with od_major
+    if layout == skim.SKIM_MAJOR:
+        return f"cached_{omx_name}_{layout}_{block}.mmap"
     return f"cached_{omx_name}_{block}.mmap"
 
 
+def build_skim_cache_path(skim_info, block):
+    skim_cache_file_name = build_skim_cache_file_name(skim_info['omx_name'], block, skim_info['layout'])
+    return os.path.join(get_skim_cache_dir(), skim_cache_file_name)
+
+
+def skim_cache_exists(skim_info):
+    return all(os.path.isfile(build_skim_cache_path(skim_info, block))
+               for block in range(len(skim_info['blocks'])))
+
+
+def build_skim_cache_manifest_path(skim_info):
+    skim_cache_file_name = build_skim_cache_file_name(skim_info['omx_name'], 'manifest', skim_info['layout'])
+    return os.path.join(get_skim_cache_dir(), os.path.splitext(skim_cache_file_name)[0] + '.yaml')
+
+
+def omx_file_fingerprint(omx_file_path):
+    """
+    identify omx file by path, size, and mtime (and content hash if skim_cache_hash setting is True)
+    """
+
+    stat = os.stat(omx_file_path)
+    fingerprint = {
+        'omx_file_path': os.path.abspath(omx_file_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+    }
+
+    if config.setting('skim_cache_hash', False):
+        sha256 = hashlib.sha256()
+        with open(omx_file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 24), b''):
+                sha256.update(chunk)
+        fingerprint['sha256'] = sha256.hexdigest()
+
+    return fingerprint
+
+
+def skim_cache_manifest(omx_file_path, skim_info):
+    """
+    manifest describing the skim cache that would be built from omx_file_path with skim_info
+
+    The manifest identifies the omx file and records everything about skim_info that determines
+    cache file contents - the skims loaded (after tag and key filtering), and their layout, dtypes
+    and block offsets - so a cache is only valid if its manifest matches exactly.
+    """
+
+    manifest = omx_file_fingerprint(omx_file_path)
+    manifest.update({
+        'omx_shape': list(skim_info['omx_shape']),
+        'layout': skim_info['layout'],
+        'dtype': np.dtype(skim_info['dtype']).name,
+        'blocks': {block_name: int(block_size) for block_name, block_size in skim_info['blocks'].items()},
+        'block_dtypes': {block_name: block_dtype(skim_info, block_name).name for block_name in skim_info['blocks']},
+        'scales': {key1: float(scale) for key1, scale in skim_info.get('scales', {}).items()},
+        'skims': {omx_key: list(skim_info['block_offsets'][skim_key])
+                  for skim_key, omx_key in skim_info['omx_keys'].items()},
+    })
+
+    return manifest
+
+
+def write_skim_cache_manifest(omx_file_path, skim_info):
+    """
+    write manifest for a (complete) skim cache
+    """
+
+    manifest_path = build_skim_cache_manifest_path(skim_info)
+    with open(manifest_path, 'w') as f:
+        yaml.safe_dump(skim_cache_manifest(omx_file_path, skim_info), f)
+
+
+def remove_skim_cache_manifest(skim_info):
+    """
+    remove manifest before (re)writing skim cache, so a partially written cache is never valid
+    """
+
+    manifest_path = build_skim_cache_manifest_path(skim_info)
+    if os.path.isfile(manifest_path):
+        os.remove(manifest_path)
+
+
+def skim_cache_is_valid(omx_file_path, skim_info):
+    """
+    True if skim cache exists and its manifest matches the omx file and skim_info
+
+    Returns
+    -------
+    valid : boolean or None
+        None if the cache files exist but have no manifest (e.g. caches written before manifests)
+    """
+
+    manifest_path = build_skim_cache_manifest_path(skim_info)
+
+    if not skim_cache_exists(skim_info):
+        logger.info("skim cache for %s not found" % (skim_info['omx_name'], ))
+        return False
+
+    if not os.path.isfile(manifest_path):
+        logger.info("skim cache manifest %s not found" % (manifest_path, ))
+        return None
+
+    with open(manifest_path) as f:
+        cached_manifest = yaml.safe_load(f)
+
+    manifest = skim_cache_manifest(omx_file_path, skim_info)
+    stale = [k for k in manifest if cached_manifest.get(k) != manifest[k]]
+
+    if stale:
+        logger.info("skim cache for %s is stale (manifest %s differs in %s)" %
+                    (skim_info['omx_name'], manifest_path, stale))
+        return False
+
+    return True
+
+
+def skim_load_processes():
+    """
+    number of processes to read skims from omx, specified by skim_load_processes setting (default 1)
+
+    if greater than 1, omx matrices are partitioned among that many processes, each of which reads
+    its matrices directly into the shared skim buffers (or skim cache files)
+    """
+    return max(int(config.setting('skim_load_processes', 1) or 1), 1)
+
+
+def auto_skim_cache():
+    """
+    auto_skim_cache setting (default False)
+
+    if True, load_skims reads the skim cache if its manifest shows it is up to date with
+    the omx file and skim settings, and otherwise reads skims from omx and (re)writes the cache
+    """
+    return config.setting('auto_skim_cache', False)
+
+
+def mmap_skim_cache():
+    """
+    mmap_skim_cache setting (default False)
+
+    if True, skim_dict wraps the read-only skim cache memmap files directly rather than
+    copying their contents into allocated skim buffers
+    """
+    return config.setting('mmap_skim_cache', False)
+
+
 def read_skim_cache(skim_info, skim_data):
     """
         read cached memmapped skim data from canonically named cache file(s) in output directory into skim_data
     """
 
-    skim_cache_dir = config.setting('skim_cache_dir', default_skim_cache_dir())
+    skim_cache_dir = get_skim_cache_dir()
     logger.info(f"load_skims reading skims data from cache directory {skim_cache_dir}")
 
-    omx_name = skim_info['omx_name']
-    dtype = np.dtype(skim_info['dtype'])
-
     blocks = skim_info['blocks']
     block = 0
     for block_name, block_size in blocks.items():
-        skim_cache_file_name = build_skim_cache_file_name(omx_name, block)
-        skim_cache_path = os.path.join(skim_cache_dir, skim_cache_file_name)
+        skim_cache_path = build_skim_cache_path(skim_info, block)
+        skim_cache_file_name = os.path.basename(skim_cache_path)
+        dtype = block_dtype(skim_info, block_name)
 
         assert os.path.isfile(skim_cache_path), \
             "read_skim_cache could not find skim_cache_path: %s" % (skim_cache_path, )
@@ -255,17 +619,15 @@ def write_skim_cache(skim_info, skim_data):
         write skim data from skim_data to canonically named cache file(s) in output directory
     """
 
-    skim_cache_dir = config.setting('skim_cache_dir', default_skim_cache_dir())
+    skim_cache_dir = get_skim_cache_dir()
     logger.info(f"load_skims writing skims data to cache directory {skim_cache_dir}")
 
-    omx_name = skim_info['omx_name']
-    dtype = np.dtype(skim_info['dtype'])
-
     blocks = skim_info['blocks']
     block = 0
     for block_name, block_size in blocks.items():
-        skim_cache_file_name = build_skim_cache_file_name(omx_name, block)
-        skim_cache_path = os.path.join(skim_cache_dir, skim_cache_file_name)
+        skim_cache_path = build_skim_cache_path(skim_info, block)
+        skim_cache_file_name = os.path.basename(skim_cache_path)
+        dtype = block_dtype(skim_info, block_name)
 
         block_data = skim_data[block]
 
@@ -273,21 +635,139 @@ def write_skim_cache(skim_info, skim_data):
 
         data = np.memmap(skim_cache_path, shape=block_data.shape, dtype=dtype, mode='w+')
         data[::] = block_data
+        data.flush()
 
         block += 1
 
 
-def read_skims_from_omx(skim_info, skim_data, omx_file_path):
+def build_skim_cache(omx_file_path, skim_info):
+    """
+    read skims from omx file directly into newly created cache file(s)
+
+    (unlike write_skim_cache, this does not require allocating skim buffers to hold the skims)
+    """
+
+    skim_cache_dir = get_skim_cache_dir()
+    logger.info(f"build_skim_cache writing skims data to cache directory {skim_cache_dir}")
+
+    skim_data = []
+    for block, (block_name, block_size) in enumerate(skim_info['blocks'].items()):
+        skim_cache_path = build_skim_cache_path(skim_info, block)
+        shape = block_shape(skim_info, block_size)
+        dtype = block_dtype(skim_info, block_name)
+        skim_data.append(np.memmap(skim_cache_path, shape=shape, dtype=dtype, mode='w+'))
+
+    num_processes = skim_load_processes()
+    if num_processes > 1:
+        # flush the newly created (empty) cache files so load processes can map them
+        for data in skim_data:
+            data.flush()
+        skim_cache_paths = [build_skim_cache_path(skim_info, block) for block in range(len(skim_data))]
+        read_skims_from_omx_parallel(skim_info, omx_file_path, num_processes, skim_cache_paths=skim_cache_paths)
+    else:
+        read_skims_from_omx(skim_info, skim_data, omx_file_path)
+
+    for data in skim_data:
+        data.flush()
+
+
+def skim_data_from_cache(skim_info):
+    """
+    wrap cached skim data file(s) as read-only memmaps without copying
+
+    Pages are read on demand and shared through the OS page cache by every process
+    (forked sub-processes or concurrent runs) that maps the same cache files.
+
+    Returns
+    -------
+    skim_data : list of numpy.memmap
+        one read-only memmap per skim block, shaped as in skim_data_from_buffers
+    """
+
+    skim_data = []
+    for block, (block_name, block_size) in enumerate(skim_info['blocks'].items()):
+        skim_cache_path = build_skim_cache_path(skim_info, block)
+        dtype = block_dtype(skim_info, block_name)
+
+        assert os.path.isfile(skim_cache_path), \
+            "skim_data_from_cache could not find skim_cache_path: %s" % (skim_cache_path, )
+
+        shape = block_shape(skim_info, block_size)
+        logger.info(f"mapping block_name {block_name} {shape} from {os.path.basename(skim_cache_path)}")
+
+        skim_data.append(np.memmap(skim_cache_path, shape=shape, dtype=dtype, mode='r'))
+
+    return skim_data
+
+
+def setup_skim_cache(omx_file_path, skim_info):
+    """
+    ensure a valid skim cache exists for mmap_skim_cache, building it from omx if it is missing
+    or stale (or if write_skim_cache is set)
+    """
+
+    if config.setting('write_skim_cache') or not skim_cache_is_valid(omx_file_path, skim_info):
+        t0 = tracing.print_elapsed_time()
+        remove_skim_cache_manifest(skim_info)
+        build_skim_cache(omx_file_path, skim_info)
+        write_skim_cache_manifest(omx_file_path, skim_info)
+        tracing.print_elapsed_time("build_skim_cache", t0)
+
+
+def encode_skim_values(values, dtype, scale=None, omx_key=None):
+    """
+    encode omx skim values for storage as dtype, quantizing integer dtypes as round(values / scale)
+
+    integer encoded values outside the range of dtype are clipped (with a warning)
+    """
+
+    if scale:
+        values = values / scale
+
+    if np.issubdtype(dtype, np.integer):
+
+        if np.isnan(values).any():
+            raise RuntimeError("skim %s has nan values which can not be stored as %s" % (omx_key, dtype))
+
+        values = np.round(values)
+
+        dtype_info = np.iinfo(dtype)
+        if (values < dtype_info.min).any() or (values > dtype_info.max).any():
+            logger.warning("skim %s values outside range of %s (scale %s) will be clipped" %
+                           (omx_key, dtype, scale))
+            values = np.clip(values, dtype_info.min, dtype_info.max)
+
+    return values.astype(dtype)
+
+
+def read_skims_from_omx(skim_info, skim_data, omx_file_path, skim_keys=None):
     """
     read skims from omx file into skim_data
+
+    Parameters
+    ----------
+    skim_info : dict
+    skim_data : list of numpy.ndarray
+        skim blocks, as returned by skim_data_from_buffers
+    omx_file_path : str
+    skim_keys : list or None
+        keys of the subset of skim_info omx_keys to read (or None to read all skims)
     """
 
     block_offsets = skim_info['block_offsets']
     omx_keys = skim_info['omx_keys']
+    scales = skim_info.get('scales', {})
+    skim_major = (skim_info['layout'] == skim.SKIM_MAJOR)
+
+    if skim_keys is None:
+        skim_keys = list(omx_keys.keys())
 
     # read skims into skim_data
     with omx.open_file(omx_file_path) as omx_file:
-        for skim_key, omx_key in omx_keys.items():
+        for skim_key in skim_keys:
+
+            omx_key = omx_keys[skim_key]
+            t0 = time.time()
 
             omx_data = omx_file[omx_key]
             assert np.issubdtype(omx_data.dtype, np.floating)
@@ -299,10 +779,103 @@ def read_skims_from_omx(skim_info, skim_data, omx_file_path):
                          (omx_key, skim_key, block, offset))
 
             # this will trigger omx readslice to read and copy data to skim_data's buffer
-            a = block_data[:, :, offset]
-            a[:] = omx_data[:]
+            if skim_major:
+                a = block_data[offset]
+            else:
+                a = block_data[:, :, offset]
+
+            scale = scales.get(skim_key[0] if isinstance(skim_key, tuple) else skim_key)
+            if a.dtype == skim_info['dtype'] and not scale:
+                a[:] = omx_data[:]
+            else:
+                a[:] = encode_skim_values(omx_data[:], a.dtype, scale, omx_key)
+
+            logger.debug("load_skims read omx_key %s in %s" %
+                         (omx_key, tracing.format_elapsed_time(time.time() - t0)))
 
-    logger.info("load_skims loaded skims from %s" % (omx_file_path, ))
+    logger.info("load_skims loaded %s skims from %s" % (len(skim_keys), omx_file_path, ))
+
+
+def _read_skims_from_omx_process(skim_info, omx_file_path, skim_keys, skim_cache_paths, **skim_buffers):
+    """
+    read_skims_from_omx_parallel sub process entry point
+
+    reads skim_keys skims into either the shared skim_buffers or (if skim_cache_paths are
+    specified) the skim cache files, using its own omx file handle
+
+    skim_buffers are passed as kwargs to avoid pickling dict (as with mp_tasks shared_data_buffers)
+    """
+
+    if skim_cache_paths:
+        skim_data = [np.memmap(skim_cache_path,
+                               shape=block_shape(skim_info, block_size),
+                               dtype=block_dtype(skim_info, block_name),
+                               mode='r+')
+                     for skim_cache_path, (block_name, block_size)
+                     in zip(skim_cache_paths, skim_info['blocks'].items())]
+    else:
+        skim_data = skim_data_from_buffers(skim_buffers, skim_info)
+
+    read_skims_from_omx(skim_info, skim_data, omx_file_path, skim_keys)
+
+    if skim_cache_paths:
+        for data in skim_data:
+            data.flush()
+
+
+def read_skims_from_omx_parallel(skim_info, omx_file_path, num_processes, skim_buffers=None, skim_cache_paths=None):
+    """
+    read skims from omx file using num_processes sub processes, each reading a partition of omx_keys
+
+    Skims are read either into shared (multiprocessing.RawArray) skim_buffers or into existing
+    skim cache files specified by skim_cache_paths. Each skim is read and encoded exactly as by
+    read_skims_from_omx, so the result is identical to the serial path.
+
+    Parameters
+    ----------
+    skim_info : dict
+    omx_file_path : str
+    num_processes : int
+    skim_buffers : dict {<block_name>: <multiprocessing.RawArray>} or None
+    skim_cache_paths : list of str or None
+        paths of skim cache files, one per block, in block order
+    """
+
+    assert bool(skim_buffers) != bool(skim_cache_paths)
+
+    skim_keys = list(skim_info['omx_keys'].keys())
+    num_processes = min(num_processes, len(skim_keys))
+
+    logger.info("read_skims_from_omx_parallel reading %s skims from %s using %s processes" %
+                (len(skim_keys), omx_file_path, num_processes))
+
+    # only pass the skim blocks (mp_tasks shared_data_buffers also include shadow pricing buffers)
+    if skim_buffers:
+        skim_buffers = {block_name: skim_buffers[block_name] for block_name in skim_info['blocks']}
+
+    procs = []
+    for i in range(num_processes):
+        p = multiprocessing.Process(target=_read_skims_from_omx_process, name='read_skims_%s' % i,
+                                    args=(skim_info, omx_file_path, skim_keys[i::num_processes],
+                                          skim_cache_paths),
+                                    kwargs=skim_buffers or {})
+        p.start()
+        procs.append(p)
+
+    num_skims_read = 0
+    try:
+        for i, p in enumerate(procs):
+            p.join()
+            if p.exitcode:
+                raise RuntimeError("read_skims_from_omx_parallel process %s failed with exitcode %s" %
+                                   (p.name, p.exitcode))
+            num_skims_read += len(skim_keys[i::num_processes])
+            logger.info("read_skims_from_omx_parallel process %s finished (%s of %s skims read)" %
+                        (p.name, num_skims_read, len(skim_keys)))
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
 
 
 def load_skims(omx_file_path, skim_info, skim_buffers):
@@ -312,19 +885,44 @@ def load_skims(omx_file_path, skim_info, skim_buffers):
     assert not (read_cache and write_cache), \
         "read_skim_cache and write_skim_cache are both True in settings file. I am assuming this is a mistake"
 
+    if auto_skim_cache():
+        assert not (read_cache or write_cache), \
+            "read_skim_cache and write_skim_cache settings are not used with auto_skim_cache"
+        # read valid cache, otherwise read omx and (re)write cache
+        read_cache = bool(skim_cache_is_valid(omx_file_path, skim_info))
+        write_cache = not read_cache
+    elif read_cache:
+        valid = skim_cache_is_valid(omx_file_path, skim_info)
+        if valid is None:
+            logger.warning("read_skim_cache unable to verify skim cache (no manifest) for %s" % (omx_file_path, ))
+        elif not valid:
+            raise RuntimeError("read_skim_cache skim cache is missing or stale for %s "
+                               "(set write_skim_cache or auto_skim_cache to rebuild it)" % (omx_file_path, ))
+
     skim_data = skim_data_from_buffers(skim_buffers, skim_info)
 
     t0 = tracing.print_elapsed_time()
 
+    # parallel reads require shared buffers (e.g. not the numpy buffers allocated with shared=False)
+    num_processes = skim_load_processes()
+    if num_processes > 1 and any(isinstance(skim_buffers[b], np.ndarray) for b in skim_info['blocks']):
+        logger.warning("load_skims reading skims serially since skim_buffers are not shared")
+        num_processes = 1
+
     if read_cache:
         read_skim_cache(skim_info, skim_data)
         t0 = tracing.print_elapsed_time("read_skim_cache", t0)
+    elif num_processes > 1:
+        read_skims_from_omx_parallel(skim_info, omx_file_path, num_processes, skim_buffers=skim_buffers)
+        t0 = tracing.print_elapsed_time("read_skims_from_omx_parallel", t0)
     else:
         read_skims_from_omx(skim_info, skim_data, omx_file_path)
         t0 = tracing.print_elapsed_time("read_skims_from_omx", t0)
 
     if write_cache:
+        remove_skim_cache_manifest(skim_info)
         write_skim_cache(skim_info, skim_data)
+        write_skim_cache_manifest(omx_file_path, skim_info)
         t0 = tracing.print_elapsed_time("write_skim_cache", t0)
 
 
@@ -337,18 +935,28 @@ def skim_dict(settings):
     logger.info("loading skim_dict from %s" % (omx_file_path, ))
 
     # select the skims to load
-    skim_info = get_skim_info(omx_file_path, tags_to_load)
-
-    logger.debug("omx_shape %s skim_dtype %s" % (skim_info['omx_shape'], skim_info['dtype']))
-
-    skim_buffers = inject.get_injectable('data_buffers', None)
-    if skim_buffers:
-        logger.info('Using existing skim_buffers for skims')
+    skim_info = get_skim_info(omx_file_path, tags_to_load, skim_keys_to_load())
+
+    logger.debug("omx_shape %s skim_dtype %s layout %s block_dtypes %s" %
+                 (skim_info['omx_shape'], skim_info['dtype'], skim_info['layout'],
+                  list(skim_info['block_dtypes'].values())))
+
+    if mmap_skim_cache():
+        # when multiprocessing, mp_setup_skims will already have built the cache
+        if inject.get_injectable('data_buffers', None) is None:
+            setup_skim_cache(omx_file_path, skim_info)
+        logger.info('Using memory-mapped skim cache for skims')
+        skim_data = skim_data_from_cache(skim_info)
     else:
-        skim_buffers = buffers_for_skims(skim_info, shared=False)
-        load_skims(omx_file_path, skim_info, skim_buffers)
+        skim_buffers = inject.get_injectable('data_buffers', None)
+        if skim_buffers:
+            logger.info('Using existing skim_buffers for skims')
+        else:
+            # skim buffers must be shared for skim_load_processes to read into them
+            skim_buffers = buffers_for_skims(skim_info, shared=(skim_load_processes() > 1))
+            load_skims(omx_file_path, skim_info, skim_buffers)
 
-    skim_data = skim_data_from_buffers(skim_buffers, skim_info)
+        skim_data = skim_data_from_buffers(skim_buffers, skim_info)
 
     block_names = list(skim_info['blocks'].keys())
     for i in range(len(skim_data)):
@@ -376,7 +984,7 @@ def multiply_large_numbers(list_of_numbers):
 
 
 @inject.injectable(cache=True)
-def skim_stack(skim_dict):
+def skim_stack(skim_dict, settings):
 
     logger.debug("loading skim_stack injectable")
-    return skim.SkimStack(skim_dict)
+    return skim.SkimStack(skim_dict, dim3_labels=settings['skim_time_periods']['labels'])
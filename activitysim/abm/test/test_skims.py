@@ -1,10 +1,26 @@
+import os
+import shutil
+
 from collections import OrderedDict
 
 
 import numpy as np
+import openmatrix as omx
 import pytest
 
 from activitysim.abm.tables import skims
+from activitysim.core import inject
+from activitysim.core import skim
+
+
+def teardown_function(func):
+    inject.clear_cache()
+    inject.reinject_decorated_tables()
+
+
+@pytest.fixture(scope="module")
+def omx_file_path():
+    return os.path.join(os.path.dirname(__file__), '..', '..', 'examples', 'example_mtc', 'data', 'skims.omx')
 
 
 @pytest.fixture(scope="session")
@@ -65,3 +81,155 @@ def test_multiple_large_floats():
     calculated_value = skims.multiply_large_numbers([6205.1, 5423.2, 932.4, 15.4])
     actual_value = 483200518316.9472
     assert abs(calculated_value - actual_value) < 0.0001
+
+
+def test_block_shape(skim_info):
+
+    block_size = skim_info['blocks']['skim_arc_skims_0']
+    omx_shape = skim_info['omx_shape']
+
+    # default layout is od_major
+    assert skims.block_shape(skim_info, block_size) == omx_shape + (block_size,)
+
+    skim_major_info = dict(skim_info, layout='skim_major')
+    assert skims.block_shape(skim_major_info, block_size) == (block_size,) + omx_shape
+
+
+def test_mmap_skim_cache(tmpdir, omx_file_path):
+
+    inject.add_injectable('settings', {'skim_cache_dir': str(tmpdir), 'mmap_skim_cache': True})
+
+    skim_info = skims.get_skim_info(omx_file_path, ['AM', 'PM'])
+
+    assert not skims.skim_cache_exists(skim_info)
+    skims.setup_skim_cache(omx_file_path, skim_info)
+    assert skims.skim_cache_exists(skim_info)
+
+    mapped_data = skims.skim_data_from_cache(skim_info)
+
+    skim_buffers = skims.buffers_for_skims(skim_info)
+    skim_data = skims.skim_data_from_buffers(skim_buffers, skim_info)
+    skims.read_skims_from_omx(skim_info, skim_data, omx_file_path)
+
+    for mapped, loaded in zip(mapped_data, skim_data):
+        assert isinstance(mapped, np.memmap)
+        assert not mapped.flags.writeable
+        np.testing.assert_array_equal(mapped, loaded)
+
+
+def test_skim_keys_from_usage_file(tmpdir):
+
+    usage_file_path = os.path.join(str(tmpdir), 'skim_usage.txt')
+    with open(usage_file_path, 'w') as f:
+        f.write("\n### skim_dict usage\nDIST\n('SOV_TIME', 'AM')\n"
+                "\n### skim_stack usage\nSOVTOLL_TIME\n"
+                "\n### unused skim str keys\nDISTBIKE\n")
+
+    assert skims.skim_keys_from_usage_file(usage_file_path) == {'DIST', 'SOV_TIME', 'SOVTOLL_TIME'}
+
+
+def test_get_skim_info_keys_to_load(omx_file_path):
+
+    inject.add_injectable('settings', {})
+
+    skim_info = skims.get_skim_info(omx_file_path, ['AM', 'PM'], keys_to_load={'DIST', 'SOV_TIME'})
+
+    assert set(skim_info['omx_keys']) == {'DIST', ('SOV_TIME', 'AM'), ('SOV_TIME', 'PM')}
+    assert skim_info['num_skims'] == 3
+    assert 'DISTWALK' in skim_info['skipped_keys']
+    assert 'SOV_TIME' not in skim_info['skipped_keys']
+
+
+def test_skim_dtypes(omx_file_path):
+
+    skim_dtypes = {
+        'DIST': 'float16',
+        'SOV_TIME': {'dtype': 'uint16', 'scale': 0.01},
+    }
+    inject.add_injectable('settings', {'skim_dtypes': skim_dtypes})
+
+    skim_info = skims.get_skim_info(omx_file_path, ['AM', 'PM'], keys_to_load={'DIST', 'DISTWALK', 'SOV_TIME'})
+
+    assert list(skim_info['block_dtypes'].values()) == [np.float32, np.float16, np.uint16]
+    assert skim_info['scales'] == {'SOV_TIME': 0.01}
+
+    skim_buffers = skims.buffers_for_skims(skim_info, shared=True)
+    skim_data = skims.skim_data_from_buffers(skim_buffers, skim_info)
+    skims.read_skims_from_omx(skim_info, skim_data, omx_file_path)
+
+    skim_dict = skim.SkimDict(skim_data, skim_info)
+    skim_dict.offset_mapper.set_offset_int(-1)
+
+    orig = np.array([1, 5, 10, 25])
+    dest = np.array([2, 20, 25, 3])
+
+    with omx.open_file(omx_file_path) as omx_file:
+        dist = omx_file['DIST'][:][orig - 1, dest - 1]
+        sov_time_pm = omx_file['SOV_TIME__PM'][:][orig - 1, dest - 1]
+
+    values = skim_dict.get('DIST').get(orig, dest)
+    assert values.dtype == np.float32
+    np.testing.assert_allclose(values, dist, rtol=1e-3)
+
+    values = skim_dict.get(('SOV_TIME', 'PM')).get(orig, dest)
+    assert values.dtype == np.float32
+    np.testing.assert_allclose(values, sov_time_pm, atol=0.005 + 1e-6)
+
+    values = skim.SkimStack(skim_dict).lookup(orig, dest, np.array(['PM'] * len(orig)), 'SOV_TIME')
+    np.testing.assert_allclose(values, sov_time_pm, atol=0.005 + 1e-6)
+
+
+def test_read_skims_from_omx_parallel(tmpdir, omx_file_path):
+
+    inject.add_injectable('settings', {'skim_cache_dir': str(tmpdir), 'skim_load_processes': 3})
+
+    skim_info = skims.get_skim_info(omx_file_path, ['AM', 'PM'])
+
+    skim_buffers = skims.buffers_for_skims(skim_info, shared=False)
+    skim_data = skims.skim_data_from_buffers(skim_buffers, skim_info)
+    skims.read_skims_from_omx(skim_info, skim_data, omx_file_path)
+
+    # parallel read into shared buffers
+    shared_buffers = skims.buffers_for_skims(skim_info, shared=True)
+    skims.read_skims_from_omx_parallel(skim_info, omx_file_path, 3, skim_buffers=shared_buffers)
+    for shared, serial in zip(skims.skim_data_from_buffers(shared_buffers, skim_info), skim_data):
+        assert shared.tobytes() == serial.tobytes()
+
+    # parallel read into skim cache files
+    skims.build_skim_cache(omx_file_path, skim_info)
+    for mapped, serial in zip(skims.skim_data_from_cache(skim_info), skim_data):
+        assert mapped.tobytes() == serial.tobytes()
+
+
+def test_auto_skim_cache(tmpdir, omx_file_path):
+
+    # copy omx file so we can modify it
+    tmp_omx_file_path = os.path.join(str(tmpdir), 'skims.omx')
+    shutil.copyfile(omx_file_path, tmp_omx_file_path)
+
+    inject.add_injectable('settings', {'skim_cache_dir': str(tmpdir), 'auto_skim_cache': True})
+
+    skim_info = skims.get_skim_info(tmp_omx_file_path, ['AM', 'PM'])
+    assert not skims.skim_cache_is_valid(tmp_omx_file_path, skim_info)
+
+    # first load reads omx and writes cache
+    skim_buffers = skims.buffers_for_skims(skim_info, shared=False)
+    skims.load_skims(tmp_omx_file_path, skim_info, skim_buffers)
+    assert skims.skim_cache_is_valid(tmp_omx_file_path, skim_info)
+
+    # cache is not valid for different tag filter
+    assert not skims.skim_cache_is_valid(tmp_omx_file_path, skims.get_skim_info(tmp_omx_file_path, ['AM']))
+
+    # or if omx file has changed
+    os.utime(tmp_omx_file_path, (0, 0))
+    assert not skims.skim_cache_is_valid(tmp_omx_file_path, skim_info)
+
+    # manual read_skim_cache refuses stale cache
+    inject.add_injectable('settings', {'skim_cache_dir': str(tmpdir), 'read_skim_cache': True})
+    with pytest.raises(RuntimeError, match='stale'):
+        skims.load_skims(tmp_omx_file_path, skim_info, skim_buffers)
+
+    # auto_skim_cache rebuilds stale cache
+    inject.add_injectable('settings', {'skim_cache_dir': str(tmpdir), 'auto_skim_cache': True})
+    skims.load_skims(tmp_omx_file_path, skim_info, skim_buffers)
+    assert skims.skim_cache_is_valid(tmp_omx_file_path, skim_info)
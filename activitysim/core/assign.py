@@ -12,6 +12,8 @@ import pandas as pd
 from activitysim.core import util
 from activitysim.core import config
 from activitysim.core import pipeline
+from activitysim.core import spec_compiler
+from activitysim.core import expression_profile
 
 logger = logging.getLogger(__name__)
 
@@ -113,6 +115,9 @@ def read_assignment_spec(fname,
     cfg.target = cfg.target.str.strip()
     cfg.expression = cfg.expression.str.strip()
 
+    # parse expressions once here rather than for every chunk they are evaluated for
+    spec_compiler.compile_assignment_expressions(cfg.expression)
+
     return cfg
 
 
@@ -149,7 +154,8 @@ def local_utilities():
     return utility_dict
 
 
-def assign_variables(assignment_expressions, df, locals_dict, df_alias=None, trace_rows=None):
+def assign_variables(assignment_expressions, df, locals_dict, df_alias=None, trace_rows=None,
+                     trace_label=None):
     """
     Evaluate a set of variable expressions from a spec in the context
     of a given data table.
@@ -179,6 +185,8 @@ def assign_variables(assignment_expressions, df, locals_dict, df_alias=None, tra
         This is a dictionary of local variables that will be the environment
         for an evaluation of "python" expression.
     trace_rows: series or array of bools to use as mask to select target rows to trace
+    trace_label: str
+        label for expression profile (if profile_expressions setting is True)
 
     Returns
     -------
@@ -229,11 +237,17 @@ def assign_variables(assignment_expressions, df, locals_dict, df_alias=None, tra
     # since we allow targets to be recycled, we want to only keep the last usage
     variables = OrderedDict()
 
+    profiling = expression_profile.enabled()
+    profile_label = trace_label or 'assign_variables'
+
     # need to be able to identify which variables causes an error, which keeps
     # this from being expressed more parsimoniously
-    for e in zip(assignment_expressions.target, assignment_expressions.expression):
+    for i, e in enumerate(zip(assignment_expressions.target, assignment_expressions.expression)):
         target, expression = e
 
+        if profiling:
+            t0 = expression_profile.start()
+
         assert isinstance(target, str), \
             "expected target '%s' for expression '%s' to be string not %s" % \
             (target, expression, type(target))
@@ -243,7 +257,8 @@ def assign_variables(assignment_expressions, df, locals_dict, df_alias=None, tra
 
         if is_temp_scalar(target) or is_throwaway(target):
             try:
-                x = eval(expression, globals(), _locals_dict)
+                compiled = spec_compiler.compile_expression(expression, spec_compiler.ASSIGNMENT_EXPRESSION)
+                x = compiled.eval_python(globals(), _locals_dict)
             except Exception as err:
                 logger.error("assign_variables error: %s: %s", type(err).__name__, str(err))
                 logger.error("assign_variables expression: %s = %s", str(target), str(expression))
@@ -253,6 +268,8 @@ def assign_variables(assignment_expressions, df, locals_dict, df_alias=None, tra
                 _locals_dict[target] = x
                 if trace_assigned_locals is not None:
                     trace_assigned_locals[uniquify_key(trace_assigned_locals, target)] = x
+            if profiling:
+                expression_profile.record(profile_label, i, '%s = %s' % (target, expression), x, t0, len(df))
             continue
 
         try:
@@ -265,7 +282,8 @@ def assign_variables(assignment_expressions, df, locals_dict, df_alias=None, tra
 
             # FIXME should whitelist globals for security?
             globals_dict = {}
-            expr_values = to_series(eval(expression, globals_dict, _locals_dict))
+            compiled = spec_compiler.compile_expression(expression, spec_compiler.ASSIGNMENT_EXPRESSION)
+            expr_values = to_series(compiled.eval_python(globals_dict, _locals_dict))
 
             np.seterr(**save_err)
             np.seterrcall(saved_handler)
@@ -284,6 +302,9 @@ def assign_variables(assignment_expressions, df, locals_dict, df_alias=None, tra
         # update locals to allows us to ref previously assigned targets
         _locals_dict[target] = expr_values
 
+        if profiling:
+            expression_profile.record(profile_label, i, '%s = %s' % (target, expression), expr_values, t0, len(df))
+
     if trace_results is not None:
 
         trace_results = pd.DataFrame.from_dict(trace_results)
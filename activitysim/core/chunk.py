@@ -261,12 +261,6 @@ def chunked_choosers_and_alts(choosers, alternatives, rows_per_chunk):
     #     logger.warning('sorting choosers because not monotonic increasing')
     #     choosers = choosers.sort_index()
 
-    # alternatives index should match choosers (except with duplicate repeating alt rows)
-    assert choosers.index.equals(alternatives.index[~alternatives.index.duplicated(keep='first')])
-
-    last_repeat = alternatives.index != np.roll(alternatives.index, -1)
-    assert (choosers.shape[0] == 1) or choosers.index.equals(alternatives.index[last_repeat])
-
     assert choosers.shape[0] > 0
     assert 'pick_count' in alternatives.columns or choosers.index.name == alternatives.index.name
 
@@ -279,6 +273,11 @@ def chunked_choosers_and_alts(choosers, alternatives, rows_per_chunk):
     alt_ids = alternatives.index.values
     alt_chunk_end = np.where(alt_ids[:-1] != alt_ids[1:])[0] + 1
     alt_chunk_end = np.append([0], alt_chunk_end)  # including the first...
+
+    # alternatives index should match choosers (except with duplicate repeating alt rows)
+    assert len(alt_chunk_end) == num_choosers
+    assert (alt_ids[alt_chunk_end] == choosers.index.values).all()
+
     alt_chunk_end = alt_chunk_end[rows_per_chunk::rows_per_chunk]
 
     # add index to end of array to capture any final partial chunk
@@ -292,7 +291,7 @@ def chunked_choosers_and_alts(choosers, alternatives, rows_per_chunk):
         chooser_chunk = choosers[offset: offset + rows_per_chunk]
         alternative_chunk = alternatives[alt_offset: alt_end]
 
-        assert len(chooser_chunk.index) == len(np.unique(alternative_chunk.index.values))
+        assert alternative_chunk.index[0] == chooser_chunk.index[0]
 
         yield i+1, num_chunks, chooser_chunk, alternative_chunk
 
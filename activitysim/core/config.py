@@ -62,6 +62,51 @@ def rng_base_seed():
     return 0
 
 
+@inject.injectable(cache=True)
+def rng_channel_type(settings):
+    return settings.get('rng_channel_type', 'simple')
+
+
+@inject.injectable(cache=True)
+def rng_bulk_choice(settings):
+    return settings.get('rng_bulk_choice', False)
+
+
+@inject.injectable(cache=True)
+def utility_dtype(settings):
+    return settings.get('utility_dtype', 'float64')
+
+
+@inject.injectable(cache=True)
+def profile_expressions(settings):
+    return settings.get('profile_expressions', False)
+
+
+@inject.injectable(cache=True)
+def expression_threads(settings):
+    return settings.get('expression_threads', 1)
+
+
+@inject.injectable(cache=True)
+def prune_chooser_columns(settings):
+    return settings.get('prune_chooser_columns', False)
+
+
+@inject.injectable(cache=True)
+def dedupe_choosers(settings):
+    return settings.get('dedupe_choosers', False)
+
+
+@inject.injectable(cache=True)
+def broadcast_interaction_sample(settings):
+    return settings.get('broadcast_interaction_sample', False)
+
+
+@inject.injectable(cache=True)
+def dedupe_sample_choosers(settings):
+    return settings.get('dedupe_sample_choosers', False)
+
+
 @inject.injectable(cache=True)
 def settings():
     settings_dict = read_settings_file('settings.yaml', mandatory=True)
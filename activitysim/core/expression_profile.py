@@ -0,0 +1,178 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE_NAME = 'expression_profile.csv'
+
+# profile is keyed by model (pipeline step), (chunkless) trace_label, and spec row
+KEY_COLUMNS = ['model', 'trace_label', 'spec_row', 'expression']
+STAT_COLUMNS = ['calls', 'rows', 'seconds', 'bytes']
+
+_ENABLED = False
+_MODEL_NAME = ''
+
+# {(model, trace_label, spec_row, expression): [calls, rows, seconds, bytes, dtype]}
+_PROFILE = OrderedDict()
+
+# record may be called from eval_utilities expression threads (so _PROFILE is only accessed under lock)
+_PROFILE_LOCK = threading.Lock()
+
+
+def set_enabled(enabled):
+    """
+    Turn expression profiling on or off (called with the profile_expressions setting by open_pipeline)
+    """
+    global _ENABLED
+    _ENABLED = bool(enabled)
+
+
+def enabled():
+    return _ENABLED
+
+
+def begin_model(model_name):
+    """
+    Set the model (pipeline step) name under which subsequent expressions are profiled
+    """
+    global _MODEL_NAME
+    _MODEL_NAME = model_name
+
+
+def start():
+    """
+    Return the start time of an expression evaluation, to pass to record
+    """
+    return time.perf_counter()
+
+
+def record(trace_label, spec_row, expression, value, start_time, rows):
+    """
+    Add an expression evaluation to the profile
+
+    Parameters
+    ----------
+    trace_label : str
+        trace_label of the evaluator (chunk suffixes are removed so chunks are profiled together)
+    spec_row : int
+        position of expression in spec (or assignment spec)
+    expression : str
+    value : scalar, numpy.ndarray or pandas.Series
+        result of expression (for its dtype and size)
+    start_time : float
+        from start()
+    rows : int
+        number of rows (e.g. choosers) the expression was evaluated for
+    """
+
+    seconds = time.perf_counter() - start_time
+
+    trace_label = re.sub(r'\.chunk_\d+', '', str(trace_label))
+    key = (_MODEL_NAME, trace_label, spec_row, str(expression))
+
+    with _PROFILE_LOCK:
+        stats = _PROFILE.get(key)
+        if stats is None:
+            stats = _PROFILE[key] = [0, 0, 0.0, 0, None]
+
+        stats[0] += 1
+        stats[1] += rows
+        stats[2] += seconds
+        stats[3] += getattr(value, 'nbytes', 0)
+        stats[4] = str(getattr(value, 'dtype', type(value).__name__))
+
+
+def clear():
+    with _PROFILE_LOCK:
+        _PROFILE.clear()
+
+
+def summarize(profile):
+    """
+    Add per row timings to profile and sort by descending total seconds
+    """
+
+    profile = profile.copy()
+    profile['usec_per_row'] = (1e6 * profile.seconds / profile.rows.clip(lower=1)).round(4)
+    profile['pct_seconds'] = (100 * profile.seconds / max(profile.seconds.sum(), 1e-12)).round(3)
+
+    return profile.sort_values('seconds', ascending=False).reset_index(drop=True)
+
+
+def profile_df():
+    """
+    Return profile of evaluated expressions as a dataframe sorted by descending total seconds
+
+    Returns
+    -------
+    profile : pandas.DataFrame
+        one row per model, trace_label, and spec row with columns
+        calls, rows, seconds, bytes (size of results), dtype (of results),
+        usec_per_row, and pct_seconds (percent of total profiled seconds)
+    """
+
+    # copy stats under lock since expression threads may be recording
+    with _PROFILE_LOCK:
+        rows = [key + tuple(stats) for key, stats in _PROFILE.items()]
+
+    profile = pd.DataFrame(rows, columns=KEY_COLUMNS + STAT_COLUMNS + ['dtype'])
+
+    return summarize(profile)
+
+
+def write_profile(file_name=PROFILE_FILE_NAME):
+    """
+    Write profile csv to log dir (with the log_file_prefix of multiprocess sub-processes)
+    """
+
+    profile = profile_df()
+    if profile.empty:
+        return
+
+    file_path = config.log_file_path(file_name)
+    logger.info("writing expression profile of %s expressions to %s" % (len(profile), file_path))
+
+    profile.to_csv(file_path, index=False)
+
+
+def merge_profiles(process_names, file_name=PROFILE_FILE_NAME):
+    """
+    Merge the profiles written by multiprocess sub-processes and write the combined profile
+
+    Parameters
+    ----------
+    process_names : list of str
+        names of sub-processes (the log_file_prefix of their profiles)
+    file_name : str
+    """
+
+    profiles = []
+    for process_name in process_names:
+        file_path = config.log_file_path('%s-%s' % (process_name, file_name))
+        if os.path.exists(file_path):
+            profiles.append(pd.read_csv(file_path, keep_default_na=False))
+
+    if not profiles:
+        return
+
+    profile = pd.concat(profiles)
+    dtypes = profile.groupby(KEY_COLUMNS, sort=False).dtype.first()
+    profile = profile.groupby(KEY_COLUMNS, sort=False)[STAT_COLUMNS].sum()
+    profile['dtype'] = dtypes
+    profile = summarize(profile.reset_index())
+
+    file_path = config.log_file_path(file_name)
+    logger.info("writing expression profile merged from %s sub-processes to %s" % (len(profiles), file_path))
+
+    profile.to_csv(file_path, index=False)
@@ -13,23 +13,111 @@ from activitysim.core.mem import force_garbage_collect
 from . import logit
 from . import tracing
 from . import chunk
+from . import simulate
+from . import spec_columns
 from .simulate import set_skim_wrapper_targets
 
 
 from .interaction_simulate import eval_interaction_utilities
+from .interaction_simulate import eval_broadcast_interaction_utilities
 from . import pipeline
 
 logger = logging.getLogger(__name__)
 
 DUMP = False
 
+# whether interaction_sample evaluates chooser-only and alternative-only spec expressions on their own
+# tables and broadcasts them to the interaction grid (see eval_broadcast_interaction_utilities)
+_broadcast_interaction_sample = False
+
+# whether interaction_sample computes utilities once per unique chooser (see dedupe_sample_chooser_columns)
+_dedupe_sample_choosers = False
+
+
+def set_broadcast_interaction_sample(broadcast):
+    """
+    Turn broadcasting of interaction_sample utilities on or off
+
+    This is called with the broadcast_interaction_sample setting when the pipeline is opened.
+
+    Parameters
+    ----------
+    broadcast : bool
+    """
+
+    global _broadcast_interaction_sample
+    _broadcast_interaction_sample = bool(broadcast)
+
+
+def set_dedupe_sample_choosers(dedupe):
+    """
+    Turn interaction_sample chooser deduplication on or off
+
+    This is called with the dedupe_sample_choosers setting when the pipeline is opened.
+
+    Parameters
+    ----------
+    dedupe : bool
+    """
+
+    global _dedupe_sample_choosers
+    _dedupe_sample_choosers = bool(dedupe)
+
+
+def sample_positions(cum_probs_arr, rands, rows=None):
+    """
+    Return the position of the alternative chosen by each rand (inverse cdf draw)
+
+    This is a batched row-wise binary search over the cumulative probabilities for all rands at
+    once, with the same result as np.argmax(cum_probs_arr[row] > rand) (i.e. the first alternative
+    whose cumulative probability is greater than the rand, or 0 if there is none), but without
+    comparing each rand with every alternative.
+
+    Parameters
+    ----------
+    cum_probs_arr : 2-D numpy.ndarray
+        cumulative probabilities (non-decreasing along rows) with one column per alternative
+    rands : 2-D numpy.ndarray
+        one row per chooser and one column per sample
+    rows : numpy.ndarray or None
+        row of cum_probs_arr for each chooser (or None if cum_probs_arr has one row per chooser)
+
+    Returns
+    -------
+    positions : 2-D numpy.ndarray of int
+        same shape as rands
+    """
+
+    alternative_count = cum_probs_arr.shape[1]
+
+    if rows is None:
+        rows = np.arange(len(rands))
+    assert len(rows) == len(rands)
+
+    flat_cum_probs = cum_probs_arr.ravel()
+    row_offsets = (rows * alternative_count).reshape(-1, 1)
+
+    lo = np.zeros(rands.shape, dtype=np.int64)
+    hi = np.full(rands.shape, alternative_count, dtype=np.int64)
+    for _ in range(int(np.ceil(np.log2(alternative_count + 1)))):
+        mid = (lo + hi) // 2
+        greater = np.take(flat_cum_probs, row_offsets + np.minimum(mid, alternative_count - 1)) > rands
+        active = lo < hi
+        hi = np.where(active & greater, mid, hi)
+        lo = np.where(active & ~greater, mid + 1, lo)
+
+    # like argmax, choose first alternative if no cum_prob is greater than rand
+    lo[lo == alternative_count] = 0
+
+    return lo
+
 
 def make_sample_choices(
         choosers, probs,
         alternatives,
         sample_size, alternative_count, alt_col_name,
         allow_zero_probs,
-        trace_label):
+        trace_label, inverse=None):
     """
 
     Parameters
@@ -37,6 +125,7 @@ def make_sample_choices(
     choosers
     probs : pandas DataFrame
         one row per chooser and one column per alternative
+        (or one row per unique chooser if inverse is not None)
     alternatives
         dataframe with index containing alt ids
     sample_size : int
@@ -44,6 +133,9 @@ def make_sample_choices(
     alternative_count
     alt_col_name : str
     trace_label
+    inverse : numpy.ndarray or None
+        position in probs of each chooser's row if choosers were deduped
+        (each chooser's sample is drawn from its unique chooser's probs with its own rands)
 
     Returns
     -------
@@ -51,90 +143,191 @@ def make_sample_choices(
     """
 
     assert isinstance(probs, pd.DataFrame)
-    assert probs.shape == (len(choosers), alternative_count)
+    assert probs.shape == (len(choosers) if inverse is None else probs.shape[0], alternative_count)
+    assert inverse is None or len(inverse) == len(choosers)
 
     assert isinstance(alternatives, pd.DataFrame)
     assert len(alternatives) == alternative_count
 
     if allow_zero_probs:
-        zero_probs = (probs.sum(axis=1) == 0)
+        zero_probs = (probs.values.sum(axis=1) == 0)
+        if inverse is not None:
+            zero_probs = zero_probs[inverse]
         if zero_probs.all():
             return pd.DataFrame(columns=[alt_col_name, 'rand', 'prob', choosers.index.name])
         if zero_probs.any():
             # remove from sample
-            probs = probs[~zero_probs]
             choosers = choosers[~zero_probs]
+            if inverse is None:
+                probs = probs[~zero_probs]
+            else:
+                inverse = inverse[~zero_probs]
 
     cum_probs_arr = probs.values.cumsum(axis=1)
 
-    # alt probs in convenient layout to return prob of chose alternative
-    # (same layout as cum_probs_arr)
-    alt_probs_array = probs.values.flatten()
-
     # get sample_size rands for each chooser
-    # transform as we iterate over alternatives
-    # reshape so rands[i] is in broadcastable (2-D) shape for cum_probs_arr
-    # i.e rands[i] is a 2-D array of one alt choice rand for each chooser
-    rands = pipeline.get_rn_generator().random_for_df(probs, n=sample_size)
-    rands = rands.T.reshape(sample_size, -1, 1)
+    # one row per chooser and one column per sample
+    rands = pipeline.get_rn_generator().random_for_df(choosers, n=sample_size)
 
-    # the alternative value chosen
-    choices_array = np.empty([sample_size, len(choosers)]).astype(int)
+    # row of cum_probs_arr (and probs) for each chooser
+    rows = np.arange(len(choosers)) if inverse is None else inverse
 
-    # the probability of the chosen alternative
-    choice_probs_array = np.empty([sample_size, len(choosers)])
+    # scale rands to (float32) row totals
+    scaled_rands = logit.scaled_rands(rands, cum_probs_arr[:, -1:][rows])
 
-    alts = np.tile(alternatives.index.values, len(choosers))
+    # positions are the chosen alternatives represented as column index in probs
+    positions = sample_positions(cum_probs_arr, scaled_rands, rows)
 
-    # FIXME - do this all at once rather than iterate?
-    for i in range(sample_size):
+    # explode to one row per chooser.index, alt_TAZ
+    choices_df = pd.DataFrame(
+        {alt_col_name: alternatives.index.values[positions].ravel(),
+         'rand': rands.ravel(),
+         'prob': probs.values[rows.reshape(-1, 1), positions].ravel(),
+         choosers.index.name: np.repeat(np.asanyarray(choosers.index), sample_size)
+         })
 
-        # FIXME - do this in numpy, not pandas?
+    return choices_df
 
-        # rands for this alt in broadcastable shape
-        r = rands[i]
 
-        # position of first occurrence of positive value
-        positions = np.argmax(cum_probs_arr > r, axis=1)
+def collapse_duplicate_picks(choices_df, chooser_col_name, alt_col_name):
+    """
+    Collapse duplicate picks of the same alternative by the same chooser to a single row
 
-        # FIXME - leave positions as numpy array, not pandas series?
-        # positions is series with the chosen alternative represented as a column index in probs
-        # which is an integer between zero and num alternatives in the alternative sample
-        positions = pd.Series(positions, index=probs.index)
+    Each (chooser, alternative) pick is encoded as a single integer key (chooser offset times
+    number of distinct alternatives plus factorized alternative code) whose unique values and counts
+    are the rows and pick_counts of the result.
 
-        # need to get from an integer offset into the alternative sample to the alternative index
-        # that is, we want the index value of the row that is offset by <position> rows into the
-        # tranche of this choosers alternatives created by cross join of alternatives and choosers
+    Parameters
+    ----------
+    choices_df : pandas.DataFrame
+        one row per pick (from make_sample_choices) with chooser_col_name, alt_col_name, rand
+        and prob columns, with the picks of each chooser in contiguous rows
+    chooser_col_name : str
+    alt_col_name : str
 
-        # offsets is the offset into model_design df of first row of chooser alternatives
-        offsets = np.arange(len(positions)) * alternative_count
+    Returns
+    -------
+    choices_df : pandas.DataFrame
+        indexed by chooser_col_name with one row per unique chooser and alternative (sorted by
+        alternative within chooser), columns alt_col_name, rand, prob (of first pick) and pick_count
+    """
 
-        # choices and choice_probs have one element per chooser and is in same order as choosers
-        choices_array[i] = np.take(alts, positions + offsets)
-        choice_probs_array[i] = np.take(alt_probs_array, positions + offsets)
+    chooser_ids = choices_df[chooser_col_name].values
+    alt_ids = choices_df[alt_col_name].values
 
-    # explode to one row per chooser.index, alt_TAZ
-    choices_df = pd.DataFrame(
-        {alt_col_name: choices_array.flatten(order='F'),
-         'rand': rands.flatten(order='F'),
-         'prob': choice_probs_array.flatten(order='F'),
-         choosers.index.name: np.repeat(np.asanyarray(choosers.index), sample_size)
-         })
+    if len(chooser_ids) == 0:
+        return pd.DataFrame(columns=[alt_col_name, 'rand', 'prob', 'pick_count'],
+                            index=pd.Index([], name=chooser_col_name))
 
-    return choices_df
+    # offset of each pick's chooser
+    new_chooser = np.ones(len(chooser_ids), dtype=bool)
+    new_chooser[1:] = chooser_ids[1:] != chooser_ids[:-1]
+    chooser_offsets = np.cumsum(new_chooser) - 1
+
+    # dense alternative codes (in alternative id order) rather than offsets in the alternative id range
+    # so keys are less than len(choosers) * number of distinct picked alternatives (and can't overflow)
+    alt_codes, alt_uniques = pd.factorize(alt_ids, sort=True)
+
+    pick_keys = chooser_offsets * len(alt_uniques) + alt_codes
+
+    # rows of first pick of each unique key (in key order) and number of picks
+    _, rows, pick_count = np.unique(pick_keys, return_index=True, return_counts=True)
+
+    return pd.DataFrame(
+        {alt_col_name: alt_ids[rows],
+         'rand': choices_df['rand'].values[rows],
+         'prob': choices_df['prob'].values[rows],
+         'pick_count': pick_count},
+        index=pd.Index(chooser_ids[rows], name=chooser_col_name))
+
+
+def _interaction_dataset_utilities(choosers, alternatives, spec, skims, locals_d, trace_label, have_trace_targets):
+    """
+    Evaluate spec on the cross join of choosers and alternatives and return utilities
+    with one row per chooser and one column per alternative
+    """
+
+    alternative_count = alternatives.shape[0]
+
+    # - cross join choosers and alternatives (cartesian product)
+    # for every chooser, there will be a row for each alternative
+    # index values (non-unique) are from alternatives df
+    interaction_df = \
+        logit.interaction_dataset(choosers, alternatives, sample_size=alternative_count)
+
+    chunk.log_df(trace_label, 'interaction_df', interaction_df)
+
+    assert alternative_count == len(interaction_df.index) / len(choosers.index)
+
+    if skims is not None:
+        set_skim_wrapper_targets(interaction_df, skims)
+
+    # evaluate expressions from the spec multiply by coefficients and sum
+    # spec is df with one row per spec expression and one col with utility coefficient
+    # column names of interaction_df match spec index values
+    # utilities has utility value for element in the cross product of choosers and alternatives
+    # interaction_utilities is a df with one utility column and one row per row in interaction_df
+    if have_trace_targets:
+        trace_rows, trace_ids \
+            = tracing.interaction_trace_rows(interaction_df, choosers, alternative_count)
+
+        tracing.trace_df(interaction_df[trace_rows],
+                         tracing.extend_trace_label(trace_label, 'interaction_df'),
+                         slicer='NONE', transpose=False)
+    else:
+        trace_rows = trace_ids = None
+
+    # interaction_utilities is a df with one utility column and one row per interaction_df row
+    interaction_utilities, trace_eval_results \
+        = eval_interaction_utilities(spec, interaction_df, locals_d, trace_label, trace_rows)
+    chunk.log_df(trace_label, 'interaction_utilities', interaction_utilities)
+
+    del interaction_df
+    chunk.log_df(trace_label, 'interaction_df', None)
+
+    if have_trace_targets:
+        tracing.trace_interaction_eval_results(trace_eval_results, trace_ids,
+                                               tracing.extend_trace_label(trace_label, 'eval'))
+
+        tracing.trace_df(interaction_utilities[trace_rows],
+                         tracing.extend_trace_label(trace_label, 'interaction_utilities'),
+                         slicer='NONE', transpose=False)
+
+    tracing.dump_df(DUMP, interaction_utilities, trace_label, 'interaction_utilities')
+
+    # reshape utilities (one utility column and one row per row in interaction_utilities)
+    # to a dataframe with one row per chooser and one column per alternative
+    utilities = pd.DataFrame(
+        interaction_utilities.values.reshape(len(choosers), alternative_count),
+        index=choosers.index)
+    chunk.log_df(trace_label, 'utilities', utilities)
+
+    del interaction_utilities
+    chunk.log_df(trace_label, 'interaction_utilities', None)
+
+    return utilities
 
 
 def _interaction_sample(
         choosers, alternatives,
         spec, sample_size, alt_col_name, allow_zero_probs,
         skims=None, locals_d=None,
-        trace_label=None):
+        trace_label=None, broadcast_sides=None, dedupe_columns=None):
     """
     Run a MNL simulation in the situation in which alternatives must
     be merged with choosers because there are interaction terms or
     because alternatives are being sampled.
 
     Parameters are same as for public function interaction_sa,ple
+    (except for broadcast_sides and dedupe_columns)
+
+    broadcast_sides : list of str or None
+        spec_columns.interaction_expression_sides of spec if utilities are to be computed
+        by eval_broadcast_interaction_utilities rather than with a full interaction dataset
+
+    dedupe_columns : list of str or None
+        chooser columns utilities depend on, if utilities and probs are to be computed once
+        for each unique combination of their values (see dedupe_sample_chooser_columns)
 
     spec : dataframe
         one row per spec expression and one col with utility coefficient
@@ -201,62 +394,27 @@ def _interaction_sample(
     if skims is not None:
         alternatives[alternatives.index.name] = alternatives.index
 
-    # - cross join choosers and alternatives (cartesian product)
-    # for every chooser, there will be a row for each alternative
-    # index values (non-unique) are from alternatives df
-    alternative_count = alternatives.shape[0]
-    interaction_df = \
-        logit.interaction_dataset(choosers, alternatives, sample_size=alternative_count)
-
-    chunk.log_df(trace_label, 'interaction_df', interaction_df)
+    if not have_trace_targets:
+        choosers, alternatives = \
+            spec_columns.prune_interaction_tables(choosers, alternatives, spec, locals_d, skims, trace_label)
 
-    assert alternative_count == len(interaction_df.index) / len(choosers.index)
-
-    if skims is not None:
-        set_skim_wrapper_targets(interaction_df, skims)
-
-    # evaluate expressions from the spec multiply by coefficients and sum
-    # spec is df with one row per spec expression and one col with utility coefficient
-    # column names of interaction_df match spec index values
-    # utilities has utility value for element in the cross product of choosers and alternatives
-    # interaction_utilities is a df with one utility column and one row per row in interaction_df
-    if have_trace_targets:
-        trace_rows, trace_ids \
-            = tracing.interaction_trace_rows(interaction_df, choosers, alternative_count)
+    alternative_count = alternatives.shape[0]
 
-        tracing.trace_df(interaction_df[trace_rows],
-                         tracing.extend_trace_label(trace_label, 'interaction_df'),
-                         slicer='NONE', transpose=False)
+    if dedupe_columns is not None and not have_trace_targets:
+        # choosers with the same values of the columns utilities depend on have the same probs
+        unique_choosers, inverse = simulate.unique_choosers(choosers, dedupe_columns, trace_label)
     else:
-        trace_rows = trace_ids = None
-
-    # interaction_utilities is a df with one utility column and one row per interaction_df row
-    interaction_utilities, trace_eval_results \
-        = eval_interaction_utilities(spec, interaction_df, locals_d, trace_label, trace_rows)
-    chunk.log_df(trace_label, 'interaction_utilities', interaction_utilities)
-
-    del interaction_df
-    chunk.log_df(trace_label, 'interaction_df', None)
-
-    if have_trace_targets:
-        tracing.trace_interaction_eval_results(trace_eval_results, trace_ids,
-                                               tracing.extend_trace_label(trace_label, 'eval'))
-
-        tracing.trace_df(interaction_utilities[trace_rows],
-                         tracing.extend_trace_label(trace_label, 'interaction_utilities'),
-                         slicer='NONE', transpose=False)
-
-    tracing.dump_df(DUMP, interaction_utilities, trace_label, 'interaction_utilities')
-
-    # reshape utilities (one utility column and one row per row in interaction_utilities)
-    # to a dataframe with one row per chooser and one column per alternative
-    utilities = pd.DataFrame(
-        interaction_utilities.values.reshape(len(choosers), alternative_count),
-        index=choosers.index)
-    chunk.log_df(trace_label, 'utilities', utilities)
-
-    del interaction_utilities
-    chunk.log_df(trace_label, 'interaction_utilities', None)
+        unique_choosers, inverse = choosers, None
+
+    if broadcast_sides is not None and not have_trace_targets:
+        # utilities of chooser-only and alternative-only terms are broadcast without building
+        # the interaction dataset (which is built with only the columns of interaction terms)
+        utilities = eval_broadcast_interaction_utilities(spec, broadcast_sides, unique_choosers, alternatives,
+                                                         locals_d, skims, trace_label)
+        chunk.log_df(trace_label, 'utilities', utilities)
+    else:
+        utilities = _interaction_dataset_utilities(unique_choosers, alternatives, spec, skims, locals_d,
+                                                   trace_label, have_trace_targets)
 
     if have_trace_targets:
         tracing.trace_df(utilities, tracing.extend_trace_label(trace_label, 'utilities'),
@@ -267,7 +425,7 @@ def _interaction_sample(
     # convert to probabilities (utilities exponentiated and normalized to probs)
     # probs is same shape as utilities, one row per chooser and one column for alternative
     probs = logit.utils_to_probs(utilities, allow_zero_probs=allow_zero_probs,
-                                 trace_label=trace_label, trace_choosers=choosers)
+                                 trace_label=trace_label, trace_choosers=unique_choosers)
     chunk.log_df(trace_label, 'probs', probs)
 
     del utilities
@@ -281,6 +439,9 @@ def _interaction_sample(
         # FIXME return full alternative set rather than sample
         logger.info("Estimation mode for %s using unsampled alternatives" % (trace_label, ))
 
+        if inverse is not None:
+            probs = simulate.broadcast_unique_rows(probs, inverse, choosers.index)
+
         index_name = probs.index.name
         choices_df = \
             pd.melt(probs.reset_index(), id_vars=[index_name])\
@@ -298,33 +459,17 @@ def _interaction_sample(
             choosers, probs, alternatives,
             sample_size, alternative_count, alt_col_name,
             allow_zero_probs=allow_zero_probs,
-            trace_label=trace_label)
+            trace_label=trace_label, inverse=inverse)
 
     chunk.log_df(trace_label, 'choices_df', choices_df)
 
     del probs
     chunk.log_df(trace_label, 'probs', None)
 
-    # pick_count and pick_dup
-    # pick_count is number of duplicate picks
-    # pick_dup flag is True for all but first of duplicates
-    pick_group = choices_df.groupby([choosers.index.name, alt_col_name])
-
-    # number each item in each group from 0 to the length of that group - 1.
-    choices_df['pick_count'] = pick_group.cumcount(ascending=True)
-    # flag duplicate rows after first
-    choices_df['pick_dup'] = choices_df['pick_count'] > 0
-    # add reverse cumcount to get total pick_count (conveniently faster than groupby.count + merge)
-    choices_df['pick_count'] += pick_group.cumcount(ascending=False) + 1
-
-    # drop the duplicates
-    choices_df = choices_df[~choices_df['pick_dup']]
-    del choices_df['pick_dup']
+    # one row per unique chooser and alt with pick_count number of duplicate picks
+    choices_df = collapse_duplicate_picks(choices_df, choosers.index.name, alt_col_name)
     chunk.log_df(trace_label, 'choices_df', choices_df)
 
-    # set index after groupby so we can trace on it
-    choices_df.set_index(choosers.index.name, inplace=True)
-
     tracing.dump_df(DUMP, choices_df, trace_label, 'choices_df')
 
     if have_trace_targets:
@@ -345,7 +490,47 @@ def _interaction_sample(
     return choices_df
 
 
-def calc_rows_per_chunk(chunk_size, choosers, alternatives, trace_label):
+def dedupe_sample_chooser_columns(choosers, alternatives, spec, locals_d, skims, trace_label):
+    """
+    Return the chooser columns interaction_sample utilities depend on if dedupe_sample_choosers is
+    set (see set_dedupe_sample_choosers)
+
+    Choosers with the same values of these columns (e.g. home TAZ and income segment of workers
+    for workplace location sample) have the same utilities and probs for every alternative,
+    so they can be computed once per unique chooser, and each chooser's sample drawn from them
+    with the chooser's own random stream.
+
+    Parameters
+    ----------
+    choosers : pandas.DataFrame
+    alternatives : pandas.DataFrame
+    spec : pandas.DataFrame
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+    trace_label : str
+
+    Returns
+    -------
+    columns : list of str or None
+        None if not deduping or if the columns can't be determined
+    """
+
+    if not _dedupe_sample_choosers:
+        return None
+
+    # results of random channel methods differ by row even if column values are the same
+    columns, _ = spec_columns.interaction_columns(spec, choosers, alternatives, locals_d, skims,
+                                                  index_only_calls=False)
+
+    if columns is None:
+        logger.warning("%s can't dedupe interaction_sample choosers "
+                       "since spec expression columns can't be determined" % trace_label)
+
+    return columns
+
+
+def calc_rows_per_chunk(chunk_size, choosers, alternatives, trace_label, interaction_columns=None,
+                        unique_choosers=None, sample_size=0):
 
     num_choosers = choosers.shape[0]
 
@@ -353,11 +538,16 @@ def calc_rows_per_chunk(chunk_size, choosers, alternatives, trace_label):
     # if chunk_size == 0:
     #     return num_choosers, 0
 
-    # all columns from choosers
-    chooser_row_size = choosers.shape[1]
+    if interaction_columns is None:
+        # all columns from choosers
+        chooser_row_size = choosers.shape[1]
 
-    # interaction_df has one column per alternative plus a skim column and a join column
-    alt_row_size = alternatives.shape[1] + 2
+        # interaction_df has one column per alternative plus a skim column and a join column
+        alt_row_size = alternatives.shape[1] + 2
+    else:
+        # broadcast utilities interaction_df only has columns referenced by interaction terms
+        chooser_row_size = 0
+        alt_row_size = interaction_columns
 
     # interaction_utilities
     alt_row_size += 1
@@ -368,6 +558,14 @@ def calc_rows_per_chunk(chunk_size, choosers, alternatives, trace_label):
     # utilities and probs have one row per chooser and one column per alternative row
     row_size += 2 * alternatives.shape[0]
 
+    if unique_choosers is not None and sample_size > 0 and unique_choosers * row_size < chunk_size:
+        # deduped choosers only need utilities and probs for (at most) unique_choosers rows,
+        # and a choice, rand, prob, and chooser id for each of their samples
+        unique_size = unique_choosers * row_size
+        rows_per_chunk, effective_chunk_size = \
+            chunk.rows_per_chunk(chunk_size - unique_size, 4 * sample_size, num_choosers, trace_label)
+        return rows_per_chunk, effective_chunk_size + unique_size
+
     logger.debug("%s #chunk_calc choosers %s" % (trace_label, choosers.shape))
     logger.debug("%s #chunk_calc alternatives %s" % (trace_label, alternatives.shape))
 
@@ -449,8 +647,30 @@ def interaction_sample(
 
     sample_size = min(sample_size, len(alternatives.index))
 
+    broadcast_sides = interaction_columns = None
+    if _broadcast_interaction_sample:
+        broadcast_sides = \
+            spec_columns.interaction_expression_sides(spec, choosers, alternatives, locals_d, skims)
+        if broadcast_sides is None:
+            logger.warning("%s can't broadcast interaction_sample utilities "
+                           "since spec expression columns can't be determined" % trace_label)
+        elif spec_columns.INTERACTION_SIDE in broadcast_sides:
+            chooser_columns, alt_columns = spec_columns.interaction_columns(
+                spec[[side == spec_columns.INTERACTION_SIDE for side in broadcast_sides]],
+                choosers, alternatives, locals_d, skims)
+            interaction_columns = len(chooser_columns) + len(alt_columns) + 1
+        else:
+            interaction_columns = 0
+
+    dedupe_columns = dedupe_sample_chooser_columns(choosers, alternatives, spec, locals_d, skims, trace_label)
+    if dedupe_columns:
+        unique_choosers = choosers.groupby(dedupe_columns, sort=False, observed=True, dropna=False).ngroups
+    else:
+        unique_choosers = None if dedupe_columns is None else 1
+
     rows_per_chunk, effective_chunk_size = \
-        calc_rows_per_chunk(chunk_size, choosers, alternatives, trace_label)
+        calc_rows_per_chunk(chunk_size, choosers, alternatives, trace_label, interaction_columns,
+                            unique_choosers, sample_size)
 
     result_list = []
     for i, num_chunks, chooser_chunk in chunk.chunked_choosers(choosers, rows_per_chunk):
@@ -465,7 +685,7 @@ def interaction_sample(
         choices = _interaction_sample(chooser_chunk, alternatives,
                                       spec, sample_size, alt_col_name, allow_zero_probs,
                                       skims, locals_d,
-                                      chunk_trace_label)
+                                      chunk_trace_label, broadcast_sides, dedupe_columns)
 
         chunk.log_close(chunk_trace_label)
 
@@ -12,6 +12,7 @@ from . import tracing
 from . import chunk
 from . import util
 from . import mem
+from . import spec_columns
 from .simulate import set_skim_wrapper_targets
 
 from activitysim.core.mem import force_garbage_collect
@@ -19,6 +20,57 @@ from .interaction_simulate import eval_interaction_utilities
 
 logger = logging.getLogger(__name__)
 
+# utility of padding in padded (choosers x max sample count) utilities (so low it is never chosen)
+PAD_UTILITY = -999
+
+
+def padded_sample_layout(choosers, alternatives):
+    """
+    Return the layout of sampled alternatives in padded arrays with one row per chooser and
+    one column per sampled alternative
+
+    Alternatives have the index of choosers (repeated once for each of the chooser's alternatives)
+    with each chooser's alternatives in contiguous rows in the same order as choosers. Choosers
+    have varying numbers of alternatives (since duplicate picks were collapsed), so the padded
+    arrays have max_sample_count columns and the columns of missing alternatives are padding.
+
+    Parameters
+    ----------
+    choosers : pandas.DataFrame
+    alternatives : pandas.DataFrame
+
+    Returns
+    -------
+    chooser_rows : numpy.ndarray
+        position in choosers of the chooser of each alternatives row
+    sample_columns : numpy.ndarray
+        column in padded arrays of each alternatives row
+    first_row_offsets : numpy.ndarray
+        position in alternatives of the first alternative of each chooser
+    available : 2-D numpy.ndarray of bool
+        (choosers x max_sample_count) False for padding
+    """
+
+    alt_ids = alternatives.index.values
+
+    # alternatives rows where chooser changes
+    new_chooser = np.ones(len(alt_ids), dtype=bool)
+    new_chooser[1:] = alt_ids[1:] != alt_ids[:-1]
+
+    first_row_offsets = np.flatnonzero(new_chooser)
+    assert len(first_row_offsets) == len(choosers.index)
+    assert (alt_ids[first_row_offsets] == choosers.index.values).all()
+
+    sample_counts = np.diff(np.append(first_row_offsets, len(alt_ids)))
+
+    chooser_rows = np.cumsum(new_chooser) - 1
+    sample_columns = np.arange(len(alt_ids)) - first_row_offsets[chooser_rows]
+
+    max_sample_count = sample_counts.max() if len(sample_counts) else 0
+    available = np.arange(max_sample_count) < sample_counts.reshape(-1, 1)
+
+    return chooser_rows, sample_columns, first_row_offsets, available
+
 
 def _interaction_sample_simulate(
         choosers, alternatives, spec,
@@ -89,11 +141,9 @@ def _interaction_sample_simulate(
     assert choosers.index.is_monotonic_increasing
     assert alternatives.index.is_monotonic_increasing
 
-    # assert choosers.index.equals(alternatives.index[~alternatives.index.duplicated(keep='first')])
-
-    # this is the more general check (not requiring is_monotonic_increasing)
-    last_repeat = alternatives.index != np.roll(alternatives.index, -1)
-    assert (choosers.shape[0] == 1) or choosers.index.equals(alternatives.index[last_repeat])
+    # position of alternatives in padded arrays (also checks that alternatives are in choosers order)
+    chooser_rows, sample_columns, first_row_offsets, available = padded_sample_layout(choosers, alternatives)
+    chunk.log_df(trace_label, 'available', available)
 
     have_trace_targets = tracing.has_trace_targets(choosers)
 
@@ -110,15 +160,25 @@ def _interaction_sample_simulate(
     if skims is not None:
         alternatives[alternatives.index.name] = alternatives.index
 
+    if not have_trace_targets and estimator is None:
+        choosers, alternatives = \
+            spec_columns.prune_interaction_tables(choosers, alternatives, spec, locals_d, skims, trace_label,
+                                                  keep_alt_columns=[choice_column])
+
     # - join choosers and alts
     # in vanilla interaction_simulate interaction_df is cross join of choosers and alternatives
     # interaction_df = logit.interaction_dataset(choosers, alternatives, sample_size)
     # here, alternatives is sparsely repeated once for each (non-dup) sample
     # we expect alternatives to have same index of choosers (but with duplicate index values)
-    # so we just need to left join alternatives with choosers
+    # so (like a left join of alternatives with choosers) we repeat chooser rows by position
     assert alternatives.index.name == choosers.index.name
 
-    interaction_df = alternatives.join(choosers, how='left', rsuffix='_chooser')
+    chooser_columns = choosers.take(chooser_rows)
+    chooser_columns.index = alternatives.index
+    chooser_columns.columns = [('%s_chooser' % c) if c in alternatives.columns else c for c in choosers.columns]
+
+    interaction_df = pd.concat([alternatives, chooser_columns], axis=1)
+    del chooser_columns
 
     chunk.log_df(trace_label, 'interaction_df', interaction_df)
 
@@ -155,40 +215,16 @@ def _interaction_sample_simulate(
                          transpose=False)
 
     # reshape utilities (one utility column and one row per row in model_design)
-    # to a dataframe with one row per chooser and one column per alternative
+    # to an array with one row per chooser and one column per alternative
     # interaction_utilities is sparse because duplicate sampled alternatives were dropped
     # so we need to pad with dummy utilities so low that they are never chosen
-
-    # number of samples per chooser
-    sample_counts = interaction_utilities.groupby(interaction_utilities.index).size().values
-    chunk.log_df(trace_label, 'sample_counts', sample_counts)
-
-    # max number of alternatvies for any chooser
-    max_sample_count = sample_counts.max()
-
-    # offsets of the first and last rows of each chooser in sparse interaction_utilities
-    last_row_offsets = sample_counts.cumsum()
-    first_row_offsets = np.insert(last_row_offsets[:-1], 0, 0)
-
-    # repeat the row offsets once for each dummy utility to insert
-    # (we want to insert dummy utilities at the END of the list of alternative utilities)
-    # inserts is a list of the indices at which we want to do the insertions
-    inserts = np.repeat(last_row_offsets, max_sample_count - sample_counts)
-
-    del sample_counts
-    chunk.log_df(trace_label, 'sample_counts', None)
-
-    # insert the zero-prob utilities to pad each alternative set to same size
-    padded_utilities = np.insert(interaction_utilities.utility.values, inserts, -999)
-    del inserts
+    padded_utilities = np.full(available.shape, PAD_UTILITY, dtype=interaction_utilities.utility.dtype)
+    padded_utilities[chooser_rows, sample_columns] = interaction_utilities.utility.values
+    chunk.log_df(trace_label, 'padded_utilities', padded_utilities)
 
     del interaction_utilities
     chunk.log_df(trace_label, 'interaction_utilities', None)
 
-    # reshape to array with one row per chooser, one column per alternative
-    padded_utilities = padded_utilities.reshape(-1, max_sample_count)
-    chunk.log_df(trace_label, 'padded_utilities', padded_utilities)
-
     # convert to a dataframe with one row per chooser and one column per alternative
     utilities_df = pd.DataFrame(
         padded_utilities,
@@ -238,14 +274,17 @@ def _interaction_sample_simulate(
     chunk.log_df(trace_label, 'probs', None)
 
     # shouldn't have chosen any of the dummy pad utilities
-    assert positions.max() < max_sample_count
+    assert available[np.arange(len(positions)), positions.values].all()
+
+    del available
+    chunk.log_df(trace_label, 'available', None)
 
     # need to get from an integer offset into the alternative sample to the alternative index
     # that is, we want the index value of the row that is offset by <position> rows into the
     # tranche of this choosers alternatives created by cross join of alternatives and choosers
 
-    # resulting pandas Int64Index has one element per chooser row and is in same order as choosers
-    choices = alternatives[choice_column].take(positions + first_row_offsets)
+    # (first_row_offsets of choosers in alternatives are in same order as choosers)
+    choices = alternatives[choice_column].values[first_row_offsets + positions.values]
 
     # create a series with index from choosers and the index of the chosen alternative
     choices = pd.Series(choices, index=choosers.index)
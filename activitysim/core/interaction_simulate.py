@@ -13,8 +13,11 @@ from . import tracing
 from . import config
 from .simulate import set_skim_wrapper_targets
 from . import chunk
+from . import spec_columns
 
 from . import simulate
+from . import spec_compiler
+from . import expression_profile
 
 from activitysim.core.mem import force_garbage_collect
 
@@ -90,7 +93,9 @@ def eval_interaction_utilities(spec, df, locals_d, trace_label, trace_rows, esti
     # need to be able to identify which variables causes an error, which keeps
     # this from being expressed more parsimoniously
 
-    utilities = pd.DataFrame({'utility': 0.0}, index=df.index)
+    dtype = simulate.utility_dtype()
+
+    utilities = pd.DataFrame({'utility': np.zeros(len(df), dtype=dtype)}, index=df.index)
     no_variability = has_missing_vals = 0
 
     if estimator:
@@ -118,29 +123,37 @@ def eval_interaction_utilities(spec, df, locals_d, trace_label, trace_rows, esti
         exprs = spec.index
         labels = spec.index
 
-    for expr, label, coefficient in zip(exprs, labels, spec.iloc[:, 0]):
+    profiling = expression_profile.enabled()
+
+    for i, (expr, label, coefficient) in enumerate(zip(exprs, labels, spec.iloc[:, 0])):
         try:
 
+            if profiling:
+                t0 = expression_profile.start()
+
+            compiled = spec_compiler.compile_spec_expression(expr)
+
             # - allow temps of form _od_DIST@od_skim['DIST']
-            if expr.startswith('_'):
+            if compiled.kind == spec_compiler.TEMP_EXPRESSION:
 
-                target = expr[:expr.index('@')]
-                rhs = expr[expr.index('@') + 1:]
-                v = to_series(eval(rhs, globals(), locals_d))
+                v = to_series(compiled.eval_python(globals(), locals_d))
 
                 # update locals to allows us to ref previously assigned targets
-                locals_d[target] = v
+                locals_d[compiled.target] = v
 
                 if trace_eval_results is not None:
                     trace_eval_results[expr] = v[trace_rows]
 
+                if profiling:
+                    expression_profile.record(trace_label, i, expr, v, t0, len(df))
+
                 # mem.trace_memory_info("eval_interaction_utilities TEMP: %s" % expr)
                 continue
 
-            if expr.startswith('@'):
-                v = to_series(eval(expr[1:], globals(), locals_d))
+            if compiled.kind == spec_compiler.PYTHON_EXPRESSION:
+                v = to_series(compiled.eval_python(globals(), locals_d))
             else:
-                v = df.eval(expr)
+                v = compiled.eval_pandas(df)
 
             if check_for_variability and v.std() == 0:
                 logger.info("%s: no variability (%s) in: %s" % (trace_label, v.iloc[0], expr))
@@ -157,7 +170,10 @@ def eval_interaction_utilities(spec, df, locals_d, trace_label, trace_rows, esti
                 expression_values_df.insert(loc=len(expression_values_df.columns), column=label,
                                             value=v.values if isinstance(v, pd.Series) else v)
 
-            utilities.utility += (v * coefficient).astype('float')
+            utilities.utility += (v * coefficient).astype(dtype)
+
+            if profiling:
+                expression_profile.record(trace_label, i, expr, v, t0, len(df))
 
             if trace_eval_results is not None:
 
@@ -199,6 +215,154 @@ def eval_interaction_utilities(spec, df, locals_d, trace_label, trace_rows, esti
     return utilities, trace_eval_results
 
 
+def eval_broadcast_interaction_utilities(spec, sides, choosers, alternatives, locals_d, skims, trace_label):
+    """
+    Compute the utilities of every alternative for every chooser without building the full
+    interaction dataset (cross join of choosers and alternatives)
+
+    Chooser-only and alternative-only expressions (see spec_columns.interaction_expression_sides)
+    are evaluated once on the choosers or alternatives table and their partial utilities are
+    combined as an outer sum. Only the interaction expressions (e.g. skims) are evaluated on an
+    interaction dataset, which has just the chooser and alternatives columns they reference.
+
+    Expressions with zero coefficients (other than temps) aren't evaluated and, since partial
+    utilities are summed in a different order, utilities may differ from eval_interaction_utilities
+    in the last bits.
+
+    Parameters
+    ----------
+    spec : dataframe
+        one row per spec expression and one col with utility coefficient
+    sides : list of str
+        from spec_columns.interaction_expression_sides
+    choosers : dataframe
+    alternatives : dataframe
+        with alternatives index as a column if skims is not None
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+    trace_label : str
+
+    Returns
+    -------
+    utilities : pandas.DataFrame
+        one row per chooser (with index of choosers) and one column per alternative
+    """
+    trace_label = tracing.extend_trace_label(trace_label, "eval_broadcast_interaction_utilities")
+
+    assert len(spec.columns) == 1
+    assert len(sides) == len(spec)
+
+    chooser_count = len(choosers)
+    alternative_count = len(alternatives)
+
+    tables = OrderedDict()
+
+    # chooser columns have the same names as in interaction dataset
+    tables[spec_columns.CHOOSER_SIDE] = choosers.rename(
+        columns={c: '%s%s' % (c, spec_columns.CHOOSER_SUFFIX) for c in choosers.columns if c in alternatives.columns})
+    tables[spec_columns.ALT_SIDE] = alternatives
+
+    if spec_columns.INTERACTION_SIDE in sides:
+        # interaction dataset with only the columns referenced by interaction expressions
+        chooser_columns, alt_columns = spec_columns.interaction_columns(
+            spec[[side == spec_columns.INTERACTION_SIDE for side in sides]],
+            choosers, alternatives, locals_d, skims)
+        assert chooser_columns is not None
+
+        interaction_df = logit.interaction_dataset(
+            choosers[chooser_columns], alternatives[alt_columns], sample_size=alternative_count)
+
+        if skims is not None:
+            set_skim_wrapper_targets(interaction_df, skims)
+
+        tables[spec_columns.INTERACTION_SIDE] = interaction_df
+
+    check_for_variability = config.setting('check_for_variability')
+    profiling = expression_profile.enabled()
+    dtype = simulate.utility_dtype()
+
+    # avoid altering caller's passed-in locals_d parameter (they may be looping)
+    side_locals = {side: dict(locals_d or {}, df=df) for side, df in tables.items()}
+    side_utilities = {side: np.zeros(len(df), dtype=dtype) for side, df in tables.items()}
+    temp_sides = {}
+
+    if isinstance(spec.index, pd.MultiIndex):
+        exprs = spec.index.get_level_values(simulate.SPEC_EXPRESSION_NAME)
+    else:
+        exprs = spec.index
+
+    no_variability = has_missing_vals = 0
+    for i, (expr, side, coefficient) in enumerate(zip(exprs, sides, spec.iloc[:, 0])):
+
+        if side is None:
+            continue
+
+        try:
+
+            if profiling:
+                t0 = expression_profile.start()
+
+            df = tables[side]
+            compiled = spec_compiler.compile_spec_expression(expr)
+
+            if side == spec_columns.INTERACTION_SIDE:
+                # broadcast chooser and alternatives temps referenced by interaction expression
+                for name in spec_columns.expression_columns(expr, locals_d)[1]:
+                    if temp_sides.get(name) == spec_columns.CHOOSER_SIDE:
+                        values = np.repeat(np.asanyarray(side_locals[temp_sides[name]][name]), alternative_count)
+                    elif temp_sides.get(name) == spec_columns.ALT_SIDE:
+                        values = np.tile(np.asanyarray(side_locals[temp_sides[name]][name]), chooser_count)
+                    else:
+                        continue
+                    side_locals[side][name] = pd.Series(values, index=df.index)
+
+            if compiled.kind == spec_compiler.PANDAS_EXPRESSION:
+                v = compiled.eval_pandas(df)
+            else:
+                v = compiled.eval_python(globals(), side_locals[side])
+                if np.isscalar(v):
+                    v = pd.Series([v] * len(df), index=df.index)
+
+            assert len(v) == len(df), \
+                "%s expression result has %s rows rather than %s: %s" % (side, len(v), len(df), expr)
+
+            if compiled.kind == spec_compiler.TEMP_EXPRESSION:
+                side_locals[side][compiled.target] = v
+                temp_sides[compiled.target] = side
+            else:
+                values = np.asanyarray(v)
+
+                if check_for_variability and values.std() == 0:
+                    logger.info("%s: no variability (%s) in: %s" % (trace_label, values[0], expr))
+                    no_variability += 1
+
+                if check_for_variability and np.count_nonzero(pd.isnull(values)) > 0:
+                    logger.info("%s: missing values in: %s" % (trace_label, expr))
+                    has_missing_vals += 1
+
+                side_utilities[side] += (values * coefficient).astype(dtype)
+
+            if profiling:
+                expression_profile.record(trace_label, i, expr, v, t0, len(df))
+
+        except Exception as err:
+            logger.exception("Variable evaluation failed for: %s" % str(expr))
+            raise err
+
+    if no_variability > 0:
+        logger.warning("%s: %s columns have no variability" % (trace_label, no_variability))
+
+    if has_missing_vals > 0:
+        logger.warning("%s: %s columns have missing values" % (trace_label, has_missing_vals))
+
+    # outer sum of chooser and alternatives partial utilities
+    utilities = np.add.outer(side_utilities[spec_columns.CHOOSER_SIDE], side_utilities[spec_columns.ALT_SIDE])
+    if spec_columns.INTERACTION_SIDE in tables:
+        utilities += side_utilities[spec_columns.INTERACTION_SIDE].reshape(chooser_count, alternative_count)
+
+    return pd.DataFrame(utilities.astype(dtype, copy=False), index=choosers.index)
+
+
 def _interaction_simulate(
         choosers, alternatives, spec,
         skims=None, locals_d=None, sample_size=None,
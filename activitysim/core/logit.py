@@ -69,6 +69,39 @@ def report_bad_choices(bad_row_map, df, trace_label, msg, trace_choosers=None, r
         raise RuntimeError(msg_with_count)
 
 
+def exp_utilities(utils_arr):
+    """
+    Exponentiate utilities, avoiding float32 overflow
+
+    exp overflows for float32 (utility_dtype) utilities above about 88 and underflows to zero below
+    about -103 (rather than 709 and -745 for float64) so rows of float32 utilities are shifted down
+    by their max utility before exponentiation. This does not change their probabilities, but their
+    exponentiated utilities (and logsums) are scaled by exp(-shift), so the shift is returned for
+    utils_to_logsums. Rows whose max utility is below log(EXP_UTIL_MIN) are not shifted, so they
+    still have zero probabilities, as they would for float64 utilities.
+
+    Parameters
+    ----------
+    utils_arr : 2-D numpy.ndarray
+        utilities with one row per chooser and one column per alternative
+
+    Returns
+    -------
+    exp_utils_arr : 2-D numpy.ndarray
+    shift : 1-D numpy.ndarray or None
+        amount subtracted from the utilities in each row (None if float64)
+    """
+
+    if utils_arr.dtype == np.float64:
+        return np.exp(utils_arr), None
+
+    # fmax ignores nan utilities, and we leave infinite utilities to be reported as such
+    shift = np.fmax.reduce(utils_arr, axis=1)
+    shift[~np.isfinite(shift) | (shift < np.log(EXP_UTIL_MIN))] = 0
+
+    return np.exp(utils_arr - shift.reshape(-1, 1)), shift
+
+
 def utils_to_logsums(utils, exponentiated=False):
     """
     Convert a table of utilities to logsum series.
@@ -91,14 +124,17 @@ def utils_to_logsums(utils, exponentiated=False):
     # fixme - conversion to float not needed in either case?
     # utils_arr = utils.values.astype('float')
     utils_arr = utils.values
+    shift = None
     if not exponentiated:
-        utils_arr = np.exp(utils_arr)
+        utils_arr, shift = exp_utilities(utils_arr)
 
     np.clip(utils_arr, EXP_UTIL_MIN, EXP_UTIL_MAX, out=utils_arr)
 
     utils_arr = np.where(utils_arr == EXP_UTIL_MIN, 0.0, utils_arr)
 
     logsums = np.log(utils_arr.sum(axis=1))
+    if shift is not None:
+        logsums += shift
     logsums = pd.Series(logsums, index=utils.index)
 
     return logsums
@@ -142,7 +178,7 @@ def utils_to_probs(utils, trace_label=None, exponentiated=False, allow_zero_prob
     # utils_arr = utils.values.astype('float')
     utils_arr = utils.values
     if not exponentiated:
-        utils_arr = np.exp(utils_arr)
+        utils_arr, _ = exp_utilities(utils_arr)
 
     np.clip(utils_arr, EXP_UTIL_MIN, EXP_UTIL_MAX, out=utils_arr)
 
@@ -181,6 +217,32 @@ def utils_to_probs(utils, trace_label=None, exponentiated=False, allow_zero_prob
     return probs
 
 
+def scaled_rands(rands, cum_probs_arr):
+    """
+    Scale rands to the row totals of cum_probs_arr if cum_probs_arr is single precision
+
+    The last column of float32 cumulative probabilities can fall short of 1.0 by more than
+    the float64 rands do, so that no alternative would be chosen for a rand close to 1.0.
+    Scaling the rands to the actual row totals avoids this without changing float64 choices.
+
+    Parameters
+    ----------
+    rands : numpy.ndarray
+        rands with one row per row in cum_probs_arr (and shape broadcastable to it)
+    cum_probs_arr : 2-D numpy.ndarray
+        cumulative probabilities with one row per chooser and one column per alternative
+
+    Returns
+    -------
+    rands : numpy.ndarray
+    """
+
+    if cum_probs_arr.dtype == np.float64:
+        return rands
+
+    return rands * cum_probs_arr[:, -1:]
+
+
 def make_choices(probs, trace_label=None, trace_choosers=None):
     """
     Make choices for each chooser from among a set of alternatives.
@@ -225,7 +287,10 @@ def make_choices(probs, trace_label=None, trace_choosers=None):
 
     rands = pipeline.get_rn_generator().random_for_df(probs)
 
-    probs_arr = probs.values.cumsum(axis=1) - rands
+    cum_probs_arr = probs.values.cumsum(axis=1)
+
+    # float32 (utility_dtype) cumulative probs may sum to slightly less than a rand close to 1.0
+    probs_arr = cum_probs_arr - scaled_rands(rands, cum_probs_arr)
 
     # rows, cols = np.where(probs_arr > 0)
     # choices = [s.iat[0] for _, s in pd.Series(cols).groupby(rows)]
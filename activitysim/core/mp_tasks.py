@@ -20,6 +20,7 @@ from activitysim.core import config
 
 from activitysim.core import chunk
 from activitysim.core import mem
+from activitysim.core import expression_profile
 
 from activitysim.core.config import setting
 
@@ -848,9 +849,12 @@ def mp_setup_skims(injectables, **kwargs):
         omx_file_path = config.data_file_path(setting('skims_file'))
         tags_to_load = setting('skim_time_periods')['labels']
 
-        skim_info = skims.get_skim_info(omx_file_path, tags_to_load)
+        skim_info = skims.get_skim_info(omx_file_path, tags_to_load, skims.skim_keys_to_load())
         if TEST_SPAWN:
             warning("mp_setup_skims TEST_SPAWN {TEST_SPAWN} skipping skims.load_skims")
+        elif skims.mmap_skim_cache():
+            # sub-processes will map the cache files directly, so we just need to ensure they exist
+            skims.setup_skim_cache(omx_file_path, skim_info)
         else:
             skims.load_skims(omx_file_path, skim_info, shared_data_buffer)
 
@@ -891,6 +895,9 @@ def allocate_shared_skim_buffers():
     """
     This is called by the main process to allocate shared memory buffer to share with subprocs
 
+    If mmap_skim_cache setting is True, no buffers are allocated, since sub-processes
+    will share the (read-only) memory-mapped skim cache through the OS page cache.
+
     Returns
     -------
     skim_buffers : dict {<block_name>: <multiprocessing.RawArray>}
@@ -899,11 +906,15 @@ def allocate_shared_skim_buffers():
 
     info("allocate_shared_skim_buffer")
 
+    if skims.mmap_skim_cache():
+        info("allocate_shared_skim_buffer not allocating skim buffers since mmap_skim_cache is True")
+        return {}
+
     omx_file_path = config.data_file_path(setting('skims_file'))
     tags_to_load = setting('skim_time_periods')['labels']
 
     # select the skims to load
-    skim_info = skims.get_skim_info(omx_file_path, tags_to_load)
+    skim_info = skims.get_skim_info(omx_file_path, tags_to_load, skims.skim_keys_to_load())
     skim_buffers = skims.buffers_for_skims(skim_info, shared=True)
 
     return skim_buffers
@@ -1248,6 +1259,9 @@ def run_multiprocess(run_list, injectables):
     )
     t0 = tracing.print_elapsed_time('setup skims', t0)
 
+    # names of all sub-processes (e.g. to merge their expression profiles)
+    all_sub_proc_names = []
+
     # - for each step in run list
     for step_info in run_list['multiprocess_steps']:
 
@@ -1260,6 +1274,7 @@ def run_multiprocess(run_list, injectables):
             sub_proc_names = [step_name]
         else:
             sub_proc_names = ["%s_%s" % (step_name, i) for i in range(num_processes)]
+        all_sub_proc_names.extend(sub_proc_names)
 
         # - mp_apportion_pipeline
         if not skip_phase('apportion') and num_processes > 1:
@@ -1296,6 +1311,9 @@ def run_multiprocess(run_list, injectables):
             )
         drop_breadcrumb(step_name, 'coalesce')
 
+    if setting('profile_expressions'):
+        expression_profile.merge_profiles(all_sub_proc_names)
+
     mem.log_hwm()
 
 
@@ -14,6 +14,9 @@ from . import orca
 from . import inject
 from . import config
 from . import random
+from . import simulate
+from . import expression_profile
+from . import spec_columns
 from . import tracing
 from . import mem
 
@@ -441,6 +444,7 @@ def run_model(model_name):
         raise RuntimeError("Cannot run model '%s' more than once" % model_name)
 
     _PIPELINE.rng().begin_step(model_name)
+    expression_profile.begin_model(model_name)
 
     # check for args
     if '.' in model_name:
@@ -497,6 +501,19 @@ def open_pipeline(resume_after=None):
     _PIPELINE.is_open = True
 
     get_rn_generator().set_base_seed(inject.get_injectable('rng_base_seed', 0))
+    get_rn_generator().set_channel_type(inject.get_injectable('rng_channel_type', random.SIMPLE_CHANNEL))
+    get_rn_generator().set_bulk_choice(inject.get_injectable('rng_bulk_choice', False))
+
+    simulate.set_utility_dtype(inject.get_injectable('utility_dtype', 'float64'))
+    expression_profile.set_enabled(inject.get_injectable('profile_expressions', False))
+    simulate.set_expression_threads(inject.get_injectable('expression_threads', 1),
+                                    inject.get_injectable('num_processes', 1))
+    spec_columns.set_enabled(inject.get_injectable('prune_chooser_columns', False))
+    simulate.set_dedupe_choosers(inject.get_injectable('dedupe_choosers', False))
+    # (imported here since interaction_sample imports pipeline)
+    from . import interaction_sample
+    interaction_sample.set_broadcast_interaction_sample(inject.get_injectable('broadcast_interaction_sample', False))
+    interaction_sample.set_dedupe_sample_choosers(inject.get_injectable('dedupe_sample_choosers', False))
 
     if resume_after:
         # open existing pipeline
@@ -543,6 +560,9 @@ def close_pipeline():
 
     _PIPELINE.init_state()
 
+    if expression_profile.enabled():
+        expression_profile.write_profile()
+
     logger.info("close_pipeline")
 
 
@@ -37,6 +37,317 @@ def hash32(s):
     return int(h, base=16) & _SEED_MASK
 
 
+# RowStates index modes - dense lookup table or searchsorted of sorted ids
+DENSE_INDEX = 'dense'
+SORTED_INDEX = 'sorted'
+
+# use dense index if max id is less than max(DENSE_MAX_SIZE_RATIO * num_ids, DENSE_MIN_SIZE)
+DENSE_MAX_SIZE_RATIO = 4
+DENSE_MIN_SIZE = 1 << 20
+
+NOT_IN_DOMAIN = -1
+
+# channel types for Random.set_channel_type
+SIMPLE_CHANNEL = 'simple'
+COUNTER_CHANNEL = 'counter'
+CHANNEL_TYPES = [SIMPLE_CHANNEL, COUNTER_CHANNEL]
+
+# splitmix64 constants (golden ratio increment and finalizer multipliers)
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX_MULT_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_MULT_2 = np.uint64(0x94D049BB133111EB)
+
+# 53 bit mantissa of float64 rand in [0, 1)
+_RAND_SHIFT = np.uint64(11)
+_RAND_SCALE = 1.0 / (1 << 53)
+
+
+def mix64(x):
+    """
+    splitmix64 finalizer - a bijective avalanche hash of uint64 values
+
+    All arithmetic is modulo 2**64 (numpy uint64 wraps on overflow)
+
+    Parameters
+    ----------
+    x : uint64 or ndarray of uint64
+
+    Returns
+    -------
+        hashed uint64 or ndarray of uint64 with same shape as x
+    """
+    with np.errstate(over='ignore'):
+        x = np.asanyarray(x, dtype=np.uint64)
+        x = (x ^ (x >> np.uint64(30))) * _MIX_MULT_1
+        x = (x ^ (x >> np.uint64(27))) * _MIX_MULT_2
+        x = x ^ (x >> np.uint64(31))
+    return x
+
+
+def counter_stream_key(*seeds):
+    """
+    Combine integer seeds (e.g. base_seed, channel_seed, step_seed) into a single uint64 key
+
+    Unlike the sum used by SimpleChannel, the seeds are hashed in order so that different
+    combinations of seeds with the same sum produce unrelated keys.
+    """
+    key = np.uint64(0)
+    with np.errstate(over='ignore'):
+        for seed in seeds:
+            key = mix64(key + _GOLDEN_GAMMA + np.uint64(seed & 0xFFFFFFFFFFFFFFFF))
+    return key
+
+
+def counter_rands(stream_key, row_ids, offsets, n):
+    """
+    Return n uniform rands in range [0, 1) for each row, computed in bulk
+
+    Rand k for a row is a pure function of (stream_key, row_id, offset + k) so streams
+    are independent of which (or how many) other rows are in the same call, and a row's
+    stream can be fast-forwarded without generating the intervening rands.
+
+    Each row gets a splitmix64 sequence whose state is a hash of the stream_key and row_id.
+
+    Parameters
+    ----------
+    stream_key : uint64
+        key for the channel and step (see counter_stream_key)
+    row_ids : 1-D array of int
+        domain_df index values of the rows
+    offsets : 1-D array of int
+        number of rands already consumed this step by each row
+    n : int
+        number of rands desired per row
+
+    Returns
+    -------
+    rands : 2-D ndarray of float64 with shape (len(row_ids), n)
+    """
+
+    row_ids = np.asanyarray(row_ids).astype(np.int64).view(np.uint64)
+    offsets = np.asanyarray(offsets).astype(np.uint64)
+
+    with np.errstate(over='ignore'):
+        row_keys = mix64(stream_key + row_ids * _GOLDEN_GAMMA)
+        counters = offsets[:, np.newaxis] + np.arange(1, n + 1, dtype=np.uint64)
+        bits = mix64(row_keys[:, np.newaxis] + counters * _GOLDEN_GAMMA)
+
+    return (bits >> _RAND_SHIFT) * _RAND_SCALE
+
+
+def rands_for_choice(a, size, replace):
+    """
+    Return the number of rands per row that choices_from_rands needs for a choice of size from a
+    """
+    num_alts = a if isinstance(a, int) else len(a)
+    return size if replace else num_alts
+
+
+def choices_from_rands(rands, a, size, replace):
+    """
+    Vectorized equivalent of calling numpy.random.choice(a, size, replace) for every row,
+    using each row's uniform rands (so each row's sample depends only on its own stream)
+
+    With replacement, each of the size choices is floor(rand * num_alts).
+
+    Without replacement, each alternative gets a rand as a random sort key and the sample is
+    the size alternatives with the smallest keys (in key order) - found with argpartition
+    over the whole (rows, num_alts) matrix rather than a permutation per row.
+
+    Parameters
+    ----------
+    rands : 2-D ndarray with shape (num_rows, rands_for_choice(a, size, replace))
+    a : 1-D array-like or int
+        If an ndarray, a random sample is generated from its elements.
+        If an int, the random sample is generated as if a was np.arange(n)
+    size : int
+        number of choices per row
+    replace : boolean
+        Whether the sample is with or without replacement
+
+    Returns
+    -------
+    choices : 1-D ndarray of length: size * num_rows
+    """
+
+    assert isinstance(size, int)
+
+    num_alts = a if isinstance(a, int) else len(a)
+    assert rands.shape[1] == rands_for_choice(a, size, replace)
+
+    if replace:
+        sample = np.minimum((rands * num_alts).astype(np.int64), num_alts - 1)
+    else:
+        assert size <= num_alts
+        if size < num_alts:
+            sample = np.argpartition(rands, size - 1, axis=1)[:, :size]
+        else:
+            sample = np.broadcast_to(np.arange(num_alts), rands.shape)
+        # order sampled alternatives by their keys
+        keys = np.take_along_axis(rands, sample, axis=1)
+        sample = np.take_along_axis(sample, np.argsort(keys, axis=1, kind='stable'), axis=1)
+
+    sample = sample.flatten()
+
+    if not isinstance(a, int):
+        sample = np.asanyarray(a)[sample]
+
+    return sample
+
+
+class RowStates(object):
+    """
+    Compact array store of the random stream state (row_seed and offset) of every domain row
+
+    Rows are stored in the order they were added, in numpy arrays that grow geometrically so
+    that extending the domain (e.g. as tours and trips are created) is amortized O(1) per row.
+    Row ids are mapped to array positions by a dense lookup table (for compact non-negative
+    integer ids) or by a searchsorted of the sorted ids, so offset updates for a batch of rows
+    are simple fancy-indexed array operations instead of pandas label-based assignments.
+    """
+
+    def __init__(self, ids=None):
+
+        self.size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._row_seed = np.empty(0, dtype=np.uint32)
+        self._offset = np.empty(0, dtype=np.int64)
+
+        # id to position index (built lazily)
+        self.index_mode = None
+        self._lut = None
+        self._sorted_ids = None
+        self._sorted_positions = None
+
+        if ids is not None:
+            self.extend(ids)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def ids(self):
+        return self._ids[:self.size]
+
+    @property
+    def row_seed(self):
+        return self._row_seed[:self.size]
+
+    @property
+    def offset(self):
+        return self._offset[:self.size]
+
+    def _grow(self, capacity):
+
+        if capacity <= len(self._ids):
+            return
+
+        capacity = max(capacity, 2 * len(self._ids))
+
+        for name in ['_ids', '_row_seed', '_offset']:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _dense_size(self):
+        return max(DENSE_MAX_SIZE_RATIO * self.size, DENSE_MIN_SIZE)
+
+    def _build_index(self):
+
+        ids = self.ids
+
+        if len(ids) > 0 and ids.min() >= 0 and ids.max() < self._dense_size():
+            self.index_mode = DENSE_INDEX
+            self._lut = np.full(ids.max() + 1, NOT_IN_DOMAIN, dtype=np.int64)
+            self._lut[ids] = np.arange(len(ids))
+            self._sorted_ids = self._sorted_positions = None
+        else:
+            self.index_mode = SORTED_INDEX
+            order = np.argsort(ids, kind='stable')
+            self._sorted_ids = ids[order]
+            self._sorted_positions = order
+            self._lut = None
+
+    def positions(self, ids, missing_ok=False):
+        """
+        Map row ids to positions in the row state arrays
+
+        Parameters
+        ----------
+        ids : 1-D array of int
+        missing_ok : bool
+            if True, return NOT_IN_DOMAIN for ids not in the store instead of raising an error
+
+        Returns
+        -------
+        positions : 1-D ndarray of int64
+        """
+
+        ids = np.asanyarray(ids)
+
+        if self.size == 0 or len(ids) == 0:
+            positions = np.full(len(ids), NOT_IN_DOMAIN, dtype=np.int64)
+        else:
+            if self.index_mode is None:
+                self._build_index()
+
+            if self.index_mode == DENSE_INDEX:
+                in_lut = (ids >= 0) & (ids < len(self._lut))
+                if in_lut.all():
+                    positions = self._lut[ids]
+                else:
+                    positions = np.where(in_lut, self._lut[np.where(in_lut, ids, 0)], NOT_IN_DOMAIN)
+            else:
+                i = np.minimum(np.searchsorted(self._sorted_ids, ids), self.size - 1)
+                positions = np.where(self._sorted_ids[i] == ids, self._sorted_positions[i], NOT_IN_DOMAIN)
+
+        if not missing_ok and (positions == NOT_IN_DOMAIN).any():
+            missing = ids[positions == NOT_IN_DOMAIN]
+            raise RuntimeError("%s row ids not in random channel domain (e.g. %s)" %
+                               (len(missing), missing[:5].tolist()))
+
+        return positions
+
+    def extend(self, ids):
+        """
+        Append rows for ids (which must not already be in the store)
+
+        Row seeds and offsets of the new rows are zero.
+
+        Parameters
+        ----------
+        ids : 1-D array of int
+        """
+
+        ids = np.asanyarray(ids).astype(np.int64)
+        if len(ids) == 0:
+            return
+
+        assert len(np.unique(ids)) == len(ids)
+        # if extending, these should be new rows, no intersection with existing ids
+        assert (self.positions(ids, missing_ok=True) == NOT_IN_DOMAIN).all()
+
+        start = self.size
+        self._grow(start + len(ids))
+        self._ids[start:start + len(ids)] = ids
+        self._row_seed[start:start + len(ids)] = 0
+        self._offset[start:start + len(ids)] = 0
+        self.size += len(ids)
+
+        # extend dense lut in place if the new ids still fit, otherwise rebuild index on next lookup
+        if self.index_mode == DENSE_INDEX and ids.min() >= 0 and ids.max() < self._dense_size():
+            if ids.max() >= len(self._lut):
+                lut = np.full(max(ids.max() + 1, min(2 * len(self._lut), self._dense_size())),
+                              NOT_IN_DOMAIN, dtype=np.int64)
+                lut[:len(self._lut)] = self._lut
+                self._lut = lut
+            self._lut[ids] = np.arange(start, self.size)
+        else:
+            self.index_mode = None
+            self._lut = self._sorted_ids = self._sorted_positions = None
+
+
 class SimpleChannel(object):
     """
 
@@ -79,14 +390,14 @@ class SimpleChannel(object):
         self.step_seed = None
         self.row_states = None
 
-        # create dataframe to hold state for every df row
+        # create row state store to hold state for every df row
         self.extend_domain(domain_df)
-        assert self.row_states.shape[0] == domain_df.shape[0]
+        assert len(self.row_states) == domain_df.shape[0]
 
         if step_name:
             self.begin_step(step_name)
 
-    def init_row_states_for_step(self, row_states):
+    def init_row_states_for_step(self, start=0):
         """
         initialize row states (in place) for new step
 
@@ -96,22 +407,24 @@ class SimpleChannel(object):
 
         Parameters
         ----------
-        row_states
+        start : int
+            position of first row state to initialize (e.g. of rows just added by extend_domain)
         """
 
         assert self.step_name
 
-        if self.step_name and not row_states.empty:
+        row_states = self.row_states
 
-            row_states['row_seed'] = (self.base_seed +
-                                      self.channel_seed +
-                                      self.step_seed +
-                                      row_states.index) % _MAX_SEED
+        if self.step_name and len(row_states) > start:
 
-            # number of rands pulled this step
-            row_states['offset'] = 0
+            ids = row_states.ids[start:]
+            row_states.row_seed[start:] = (self.base_seed +
+                                           self.channel_seed +
+                                           self.step_seed +
+                                           ids) % _MAX_SEED
 
-        return row_states
+            # number of rands pulled this step
+            row_states.offset[start:] = 0
 
     def extend_domain(self, domain_df):
         """
@@ -130,19 +443,15 @@ class SimpleChannel(object):
         if domain_df.empty:
             logger.warning("extend_domain for channel %s for empty domain_df" % self.channel_name)
 
-        # dataframe to hold state for every df row
-        row_states = pd.DataFrame(columns=['row_seed', 'offset'], index=domain_df.index)
+        if self.row_states is None:
+            self.row_states = RowStates()
 
-        if self.step_name and not row_states.empty:
-            self.init_row_states_for_step(row_states)
+        # if extending, these should be new rows, no intersection with existing row_states
+        start = len(self.row_states)
+        self.row_states.extend(domain_df.index.values)
 
-        if self.row_states is None:
-            self.row_states = row_states
-        else:
-            # row_states already exists, so we are extending
-            # if extending, these should be new rows, no intersection with existing row_states
-            assert len(self.row_states.index.intersection(domain_df.index)) == 0
-            self.row_states = pd.concat([self.row_states, row_states])
+        if self.step_name:
+            self.init_row_states_for_step(start)
 
     def begin_step(self, step_name):
         """
@@ -159,7 +468,7 @@ class SimpleChannel(object):
         self.step_name = step_name
         self.step_seed = hash32(self.step_name)
 
-        self.init_row_states_for_step(self.row_states)
+        self.init_row_states_for_step()
 
         # standard constant to use for choice_for_df instead of fast-forwarding rand stream
         self.multi_choice_offset = None
@@ -170,10 +479,20 @@ class SimpleChannel(object):
 
         self.step_name = None
         self.step_seed = None
-        self.row_states['offset'] = 0
-        self.row_states['row_seed'] = 0
+        self.row_states.offset[:] = 0
+        self.row_states.row_seed[:] = 0
+
+    def _positions_for_df(self, df):
+        """
+        Return positions of df rows in row_states
+        """
+
+        # assert no dupes
+        assert len(df.index.unique()) == len(df.index)
 
-    def _generators_for_df(self, df):
+        return self.row_states.positions(df.index.values)
+
+    def _generators_for_df(self, df, positions=None):
         """
         Python generator function for iterating over numpy prngs (nomenclature collision!)
         seeded and fast-forwarded on-the-fly to the appropriate position in the channel's
@@ -189,21 +508,24 @@ class SimpleChannel(object):
         df : pandas.DataFrame
             dataframe with index values for which random streams are to be generated
             and well-known index name corresponding to the channel
+        positions : 1-D ndarray of int or None
+            positions of df rows in row_states, if already known
         """
 
-        # assert no dupes
-        assert len(df.index.unique()) == len(df.index)
+        if positions is None:
+            positions = self._positions_for_df(df)
 
-        df_row_states = self.row_states.loc[df.index]
+        row_seeds = self.row_states.row_seed[positions]
+        offsets = self.row_states.offset[positions]
 
         prng = np.random.RandomState()
-        for row in df_row_states.itertuples():
+        for row_seed, offset in zip(row_seeds, offsets):
 
-            prng.seed(row.row_seed)
+            prng.seed(row_seed)
 
-            if row.offset:
+            if offset:
                 # consume rands
-                prng.rand(row.offset)
+                prng.rand(offset)
 
             yield prng
 
@@ -240,12 +562,14 @@ class SimpleChannel(object):
         assert self.step_name
         assert self.step_name == step_name
 
+        positions = self._positions_for_df(df)
+
         # - reminder: prng must be called when yielded as generated sequence, not serialized
-        generators = self._generators_for_df(df)
+        generators = self._generators_for_df(df, positions)
 
         rands = np.asanyarray([prng.rand(n) for prng in generators])
         # update offset for rows we handled
-        self.row_states.loc[df.index, 'offset'] += n
+        self.row_states.offset[positions] += n
         return rands
 
     def normal_for_df(self, df, step_name, mu, sigma, lognormal=False):
@@ -288,8 +612,10 @@ class SimpleChannel(object):
                 return x.values
             return x
 
+        positions = self._positions_for_df(df)
+
         # - reminder: prng must be called when yielded as generated sequence, not serialized
-        generators = self._generators_for_df(df)
+        generators = self._generators_for_df(df, positions)
 
         mu = to_series(mu)
         sigma = to_series(sigma)
@@ -304,7 +630,7 @@ class SimpleChannel(object):
                                for i, prng in enumerate(generators)])
 
         # update offset for rows we handled
-        self.row_states.loc[df.index, 'offset'] += 1
+        self.row_states.offset[positions] += 1
 
         return rands
 
@@ -347,8 +673,10 @@ class SimpleChannel(object):
         assert self.step_name
         assert self.step_name == step_name
 
+        positions = self._positions_for_df(df)
+
         # initialize the generator iterator
-        generators = self._generators_for_df(df)
+        generators = self._generators_for_df(df, positions)
 
         sample = np.concatenate(tuple(prng.choice(a, size, replace) for prng in generators))
 
@@ -357,10 +685,108 @@ class SimpleChannel(object):
             if replace:
                 logger.warning("choice_for_df MULTI_CHOICE_FF with replace")
             # update offset for rows we handled
-            self.row_states.loc[df.index, 'offset'] += size
+            self.row_states.offset[positions] += size
 
         return sample
 
+    def bulk_choice_for_df(self, df, step_name, a, size, replace):
+        """
+        Like choice_for_df, but draw the rands for every row first and then make all the
+        choices at once with choices_from_rands (q.v.) instead of calling numpy.random.choice
+        for each row.
+
+        The samples are reproducible per row, but differ from those of choice_for_df. The offset
+        of each row is advanced by the number of rands actually consumed (num_alts if sampling
+        without replacement, otherwise size).
+
+        Parameters are the same as choice_for_df
+
+        Returns
+        -------
+        choices : 1-D ndarray of length: size * len(df.index)
+            The generated random samples for each row concatenated into a single (flat) array
+        """
+
+        rands = self.random_for_df(df, step_name, n=rands_for_choice(a, size, replace))
+        return choices_from_rands(rands, a, size, replace)
+
+
+class CounterChannel(SimpleChannel):
+    """
+    Random channel that computes the random streams for all rows at once with a
+    counter-based generator (see counter_rands) instead of reseeding and fast-forwarding a
+    numpy RandomState for each row.
+
+    As with SimpleChannel, each row's stream depends only on the base seed, channel name,
+    step name, and row index (and is stable across runs, chunking, and multiprocessing),
+    but the rands are computed with vectorized uint64 numpy arithmetic so the cost does not
+    grow with the stream offset. Because the underlying generator is different, the streams
+    (and hence model results) are NOT the same as those of SimpleChannel.
+
+    Row state offsets count counter positions consumed, which is not always the number of
+    values returned (e.g. normal_for_df uses two positions per value for the Box-Muller
+    transform and choice_for_df without replacement uses one position per alternative.)
+    """
+
+    def begin_step(self, step_name):
+
+        super().begin_step(step_name)
+
+        self.stream_key = counter_stream_key(self.base_seed, self.channel_seed, self.step_seed)
+
+    def _rands_for_df(self, df, n):
+        """
+        Return 2-D array of n rands for each row of df and advance the row offsets by n
+        """
+
+        positions = self._positions_for_df(df)
+
+        offsets = self.row_states.offset[positions]
+        rands = counter_rands(self.stream_key, df.index.values, offsets, n)
+
+        # update offset for rows we handled
+        self.row_states.offset[positions] += n
+
+        return rands
+
+    def random_for_df(self, df, step_name, n=1):
+
+        assert self.step_name
+        assert self.step_name == step_name
+
+        return self._rands_for_df(df, n)
+
+    def normal_for_df(self, df, step_name, mu, sigma, lognormal=False):
+
+        assert self.step_name
+        assert self.step_name == step_name
+
+        if isinstance(mu, pd.Series):
+            mu = mu.values
+        if isinstance(sigma, pd.Series):
+            sigma = sigma.values
+
+        # Box-Muller transform (1 - u is in (0, 1] so log is finite)
+        u = self._rands_for_df(df, 2)
+        rands = np.sqrt(-2.0 * np.log(1.0 - u[:, 0])) * np.cos(2.0 * np.pi * u[:, 1])
+        rands = rands * sigma + mu
+
+        if lognormal:
+            rands = np.exp(rands)
+
+        return rands
+
+    def choice_for_df(self, df, step_name, a, size, replace):
+
+        assert self.step_name
+        assert self.step_name == step_name
+
+        rands = self._rands_for_df(df, rands_for_choice(a, size, replace))
+        return choices_from_rands(rands, a, size, replace)
+
+    # choices are always made in bulk
+    bulk_choice_for_df = choice_for_df
+
 
 class Random(object):
 
@@ -374,6 +800,8 @@ class Random(object):
         self.step_name = None
         self.step_seed = None
         self.base_seed = 0
+        self.channel_type = SIMPLE_CHANNEL
+        self.bulk_choice = False
         self.global_rng = np.random.RandomState()
 
     def get_channel_for_df(self, df):
@@ -471,7 +899,8 @@ class Random(object):
         else:
             logger.debug("Adding channel '%s' %s ids" % (channel_name, len(domain_df.index)))
 
-            channel = SimpleChannel(channel_name,
+            channel_class = CounterChannel if self.channel_type == COUNTER_CHANNEL else SimpleChannel
+            channel = channel_class(channel_name,
                                     self.base_seed,
                                     domain_df,
                                     self.step_name
@@ -527,6 +956,58 @@ class Random(object):
             logger.info("Set random seed base to %s" % seed)
             self.base_seed = seed
 
+    def set_channel_type(self, channel_type):
+        """
+        Select the generator used for the per-row random streams of all channels.
+
+        SIMPLE_CHANNEL ('simple', the default) reseeds and fast-forwards a numpy Mersenne
+        Twister for each row. COUNTER_CHANNEL ('counter') computes the streams for all rows
+        at once with a vectorized counter-based generator, which is much faster for large
+        tables but produces DIFFERENT random streams (and so different model results)
+
+        Must be called before first step (before any channels are added or rands are consumed)
+
+        Parameters
+        ----------
+        channel_type : str
+            one of CHANNEL_TYPES
+        """
+
+        if self.step_name is not None or self.channels:
+            raise RuntimeError("Can only call set_channel_type before the first step.")
+
+        if channel_type not in CHANNEL_TYPES:
+            raise RuntimeError("Unknown random channel type '%s' - expected one of %s" %
+                               (channel_type, CHANNEL_TYPES))
+
+        if channel_type != self.channel_type:
+            logger.info("Set random channel type to %s" % channel_type)
+
+        self.channel_type = channel_type
+
+    def set_bulk_choice(self, bulk_choice):
+        """
+        Select whether choice_for_df makes the choices for all rows at once (from each row's
+        uniform rands) rather than by calling numpy.random.choice for each row.
+
+        This only affects SIMPLE_CHANNEL channels (COUNTER_CHANNEL channels always choose in bulk)
+        and changes their samples (but not their other random streams)
+
+        Must be called before first step (before any channels are added or rands are consumed)
+
+        Parameters
+        ----------
+        bulk_choice : bool
+        """
+
+        if self.step_name is not None or self.channels:
+            raise RuntimeError("Can only call set_bulk_choice before the first step.")
+
+        if bool(bulk_choice) != self.bulk_choice:
+            logger.info("Set random bulk_choice to %s" % bool(bulk_choice))
+
+        self.bulk_choice = bool(bulk_choice)
+
     def get_global_rng(self):
         """
         Return a numpy random number generator for use within current step.
@@ -707,7 +1188,7 @@ class Random(object):
 
         return rands
 
-    def choice_for_df(self, df, a, size, replace):
+    def choice_for_df(self, df, a, size, replace, bulk=None):
         """
         Apply numpy.random.choice once for each row in df
         using the appropriate random channel for each row.
@@ -736,6 +1217,9 @@ class Random(object):
             Output shape
         replace : boolean
             Whether the sample is with or without replacement
+        bulk : boolean or None
+            whether to make the choices for all rows at once (see SimpleChannel.bulk_choice_for_df)
+            or row by row, defaults to the set_bulk_choice setting
 
         Returns
         -------
@@ -751,6 +1235,12 @@ class Random(object):
 
         t0 = print_elapsed_time()
         channel = self.get_channel_for_df(df)
-        choices = channel.choice_for_df(df, self.step_name, a, size, replace)
+        if bulk is None:
+            bulk = self.bulk_choice
+
+        if bulk:
+            choices = channel.bulk_choice_for_df(df, self.step_name, a, size, replace)
+        else:
+            choices = channel.choice_for_df(df, self.step_name, a, size, replace)
         t0 = print_elapsed_time("choice_for_df for %s rows" % len(df.index), t0, debug=True)
         return choices
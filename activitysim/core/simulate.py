@@ -3,9 +3,13 @@
 
 from builtins import range
 
+import builtins
 import os
+import re
+import types
 import logging
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
@@ -18,6 +22,9 @@ from . import config
 from . import util
 from . import assign
 from . import chunk
+from . import spec_compiler
+from . import expression_profile
+from . import spec_columns
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +32,30 @@ SPEC_DESCRIPTION_NAME = 'Description'
 SPEC_EXPRESSION_NAME = 'Expression'
 SPEC_LABEL_NAME = 'Label'
 
+# compute utilities with a product of only the spec rows with nonzero coefficients if fewer than
+# this fraction of spec coefficients are nonzero (and spec has more than one alternative column)
+SPARSE_SPEC_MAX_DENSITY = 0.1
+
+# types of spec expression locals whose values don't depend on choosers (see spec_chooser_columns)
+CHOOSER_INDEPENDENT_LOCAL_TYPES = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, np.ufunc,
+                                   bool, int, float, str, np.generic)
+
+# (chunkless) trace_labels of specs whose density has already been reported
+_reported_spec_densities = set()
+
+# dtypes allowed for the utility_dtype setting
+UTILITY_DTYPES = ['float64', 'float32']
+_utility_dtype = np.dtype(UTILITY_DTYPES[0])
+
+# max number of threads eval_utilities uses to evaluate spec expressions
+_expression_threads = 1
+
+# (pid, max_workers, ThreadPoolExecutor) of expression thread pool (not inherited by forked processes)
+_expression_executor = None
+
+# whether eval_mnl and eval_nl compute utilities once per unique chooser (see dedupe_choosers)
+_dedupe_choosers = False
+
 
 def random_rows(df, n):
 
@@ -119,6 +150,9 @@ def read_model_spec(file_name, spec_dir=None):
     # this allows us to use pandas dot to compute_utilities
     uniquify_spec_index(spec)
 
+    # parse expressions once here rather than for every chunk and segment they are evaluated for
+    spec_compiler.compile_spec_expressions(spec.index)
+
     if SPEC_LABEL_NAME in spec:
         spec = spec.set_index(SPEC_LABEL_NAME, append=True)
         assert isinstance(spec.index, pd.MultiIndex)
@@ -293,6 +327,240 @@ def eval_coefficients(spec, coefficients, estimator):
     return spec
 
 
+def set_utility_dtype(dtype):
+    """
+    Set the numpy dtype in which expression values, utilities and probabilities are computed
+
+    This is called with the utility_dtype setting when the pipeline is opened. Computing in
+    float32 halves the size of the largest choice model temporaries (expression_values,
+    utilities, probs) at the cost of some precision, so that a small fraction of choices
+    may differ from float64 runs.
+
+    Parameters
+    ----------
+    dtype : str or numpy.dtype
+        'float64' (default) or 'float32'
+    """
+
+    global _utility_dtype
+
+    if str(np.dtype(dtype)) not in UTILITY_DTYPES:
+        raise RuntimeError("utility_dtype '%s' not in %s" % (dtype, UTILITY_DTYPES))
+
+    _utility_dtype = np.dtype(dtype)
+
+
+def utility_dtype():
+    """
+    Return the numpy dtype in which expression values, utilities and probabilities are computed
+
+    Returns
+    -------
+    dtype : numpy.dtype
+    """
+
+    return _utility_dtype
+
+
+def set_expression_threads(threads, num_processes=1):
+    """
+    Set the max number of threads eval_utilities uses to evaluate spec expressions
+
+    This is called with the expression_threads setting when the pipeline is opened.
+    Spec rows are independent, and the numpy operations that evaluate them mostly release the
+    GIL, so they can be evaluated concurrently, each writing its own row of expression_values.
+    To avoid oversubscribing cores in multiprocess runs, the number of threads is limited to
+    the number of cpus divided by num_processes.
+
+    Parameters
+    ----------
+    threads : int
+        1 to evaluate expressions sequentially (the default), 0 for as many threads as there are
+        cpus available to this process (cpu_count / num_processes), or max number of threads
+    num_processes : int
+        number of concurrent processes (e.g. of multiprocess step)
+    """
+
+    global _expression_threads
+
+    threads = int(threads)
+    if threads < 0:
+        raise RuntimeError("expression_threads (%s) should not be negative" % threads)
+
+    available_threads = max((os.cpu_count() or 1) // max(num_processes, 1), 1)
+    threads = min(threads or available_threads, available_threads)
+
+    if threads != _expression_threads:
+        logger.info("eval_utilities will use %s threads (num_processes %s)" % (threads, num_processes))
+
+    _expression_threads = threads
+
+
+def expression_threads():
+    """
+    Return the max number of threads eval_utilities uses to evaluate spec expressions
+    """
+
+    return _expression_threads
+
+
+def set_dedupe_choosers(dedupe):
+    """
+    Turn simple_simulate chooser deduplication on or off
+
+    This is called with the dedupe_choosers setting when the pipeline is opened.
+
+    Parameters
+    ----------
+    dedupe : bool
+    """
+
+    global _dedupe_choosers
+    _dedupe_choosers = bool(dedupe)
+
+
+def expression_executor():
+    """
+    Return thread pool for evaluating spec expressions, with expression_threads() workers
+    """
+
+    global _expression_executor
+
+    pid = os.getpid()
+    if _expression_executor is None or _expression_executor[:2] != (pid, _expression_threads):
+        if _expression_executor is not None and _expression_executor[0] == pid:
+            _expression_executor[2].shutdown(wait=False)
+        executor = ThreadPoolExecutor(max_workers=_expression_threads, thread_name_prefix='eval_utilities')
+        _expression_executor = (pid, _expression_threads, executor)
+
+    return _expression_executor[2]
+
+
+def report_spec_density(nonzero, sparse, trace_label):
+    """
+    Log (once per model, not for every chunk) how sparse the spec coefficients matrix is
+
+    Parameters
+    ----------
+    nonzero : 2-D numpy.ndarray of bool
+        nonzero spec coefficients with one row per expression and one column per alternative
+    sparse : bool
+        whether utilities are computed with the sparse product
+    trace_label : str
+    """
+
+    key = re.sub(r'\.chunk_\d+', '', str(trace_label))
+    if key in _reported_spec_densities:
+        return
+    _reported_spec_densities.add(key)
+
+    logger.info("%s spec density %.3f (%s of %s coefficients nonzero, "
+                "%s of %s expressions all zero) %s product" %
+                (key, spec_density(nonzero), nonzero.sum(), nonzero.size,
+                 (~nonzero.any(axis=1)).sum(), nonzero.shape[0],
+                 'sparse' if sparse else 'dense'))
+
+
+def spec_density(nonzero):
+    """
+    Return fraction of spec coefficients that are nonzero
+    """
+    return nonzero.mean() if nonzero.size else 1.0
+
+
+def sparse_utilities(expression_values, coefficients):
+    """
+    Return np.dot(expression_values.transpose(), coefficients) for a sparse coefficients matrix
+
+    The product is a single dense product of only the expressions (rows) with a nonzero coefficient
+    for some alternative, which is faster than the full product when many rows of a sparse
+    coefficients matrix are all zero (see SPARSE_SPEC_MAX_DENSITY.)
+
+    Parameters
+    ----------
+    expression_values : 2-D numpy.ndarray with shape (num_expressions, num_choosers)
+    coefficients : 2-D numpy.ndarray with shape (num_expressions, num_alternatives)
+
+    Returns
+    -------
+    utilities : 2-D numpy.ndarray with shape (num_choosers, num_alternatives)
+    """
+
+    rows = coefficients.any(axis=1)
+    if not rows.all():
+        expression_values = expression_values[rows]
+        coefficients = coefficients[rows]
+
+    return np.dot(expression_values.transpose(), coefficients)
+
+
+def masked_utilities(expression_values, coefficients, nonzero):
+    """
+    Return utilities summing only the terms with nonzero coefficients, one alternative at a time
+
+    Unlike a matrix product, nan or inf expression values do not affect the utility of alternatives
+    with zero coefficients for that expression. This is much slower than a matrix product, so
+    nonzero_term_utilities only uses it for the choosers whose product utilities are not finite.
+
+    Parameters
+    ----------
+    expression_values : 2-D numpy.ndarray with shape (num_expressions, num_choosers)
+    coefficients : 2-D numpy.ndarray with shape (num_expressions, num_alternatives)
+    nonzero : 2-D numpy.ndarray of bool
+        coefficients != 0
+
+    Returns
+    -------
+    utilities : 2-D numpy.ndarray with shape (num_choosers, num_alternatives)
+    """
+
+    utilities = np.empty((expression_values.shape[1], coefficients.shape[1]),
+                         dtype=np.result_type(expression_values, coefficients))
+    for j in range(coefficients.shape[1]):
+        rows = np.flatnonzero(nonzero[:, j])
+        utilities[:, j] = np.dot(coefficients[rows, j], expression_values[rows])
+
+    return utilities
+
+
+def nonzero_term_utilities(expression_values, coefficients, nonzero, sparse):
+    """
+    Return utilities computed from only the expression values with nonzero coefficients
+
+    So (as if expressions with zero coefficients were never evaluated) nan or inf values of
+    expressions with zero coefficients don't affect utilities, whether or not all expressions were
+    evaluated (for tracing or estimation) and whether the product is sparse or dense.
+
+    Parameters
+    ----------
+    expression_values : 2-D numpy.ndarray with shape (num_expressions, num_choosers)
+    coefficients : 2-D numpy.ndarray with shape (num_expressions, num_alternatives)
+    nonzero : 2-D numpy.ndarray of bool
+        coefficients != 0
+    sparse : bool
+        use sparse_utilities product
+
+    Returns
+    -------
+    utilities : 2-D numpy.ndarray with shape (num_choosers, num_alternatives)
+    """
+
+    if sparse:
+        utilities = sparse_utilities(expression_values, coefficients)
+    else:
+        utilities = np.dot(expression_values.transpose(), coefficients)
+
+    # a nan or inf value of an expression with a zero coefficient makes the product nan (nan * 0 is nan)
+    # so recompute the utilities of those (usually few) choosers from only their nonzero terms.
+    # (checking the row sums only needs a num_choosers temporary, and a sum that overflows
+    # to inf merely recomputes the same utilities)
+    recompute = ~np.isfinite(utilities.sum(axis=1))
+    if recompute.any():
+        utilities[recompute] = masked_utilities(expression_values[:, recompute], coefficients, nonzero)
+
+    return utilities
+
+
 def eval_utilities(spec, choosers, locals_d=None, trace_label=None,
                    have_trace_targets=False, estimator=None, alt_col_name=None):
     """
@@ -352,17 +620,52 @@ def eval_utilities(spec, choosers, locals_d=None, trace_label=None,
     else:
         exprs = spec.index
 
-    expression_values = np.empty((spec.shape[0], choosers.shape[0]))
-    for i, expr in enumerate(exprs):
+    dtype = utility_dtype()
+
+    coefficients = spec.astype(dtype).values
+    nonzero = (coefficients != 0)
+    sparse = coefficients.shape[1] > 1 and spec_density(nonzero) < SPARSE_SPEC_MAX_DENSITY
+    report_spec_density(nonzero, sparse, trace_label)
+
+    # no need to evaluate expressions whose coefficients are zero for all alternatives
+    # (unless tracing or estimating, which want all expression values)
+    if estimator or have_trace_targets:
+        zero_rows = np.zeros(len(exprs), dtype=bool)
+    else:
+        zero_rows = ~nonzero.any(axis=1)
+
+    profiling = expression_profile.enabled()
+
+    def eval_expression(i):
+        # evaluate spec row i into row i of expression_values
+        expr = exprs[i]
         try:
-            if expr.startswith('@'):
-                expression_values[i] = eval(expr[1:], globals_dict, locals_dict)
+            if profiling:
+                t0 = expression_profile.start()
+            compiled = spec_compiler.compile_spec_expression(expr, allow_temps=False)
+            if compiled.kind == spec_compiler.PYTHON_EXPRESSION:
+                value = compiled.eval_python(globals_dict, locals_dict)
+                expression_values[i] = value
             else:
-                expression_values[i] = choosers.eval(expr)
+                value = compiled.eval_pandas_into(choosers, expression_values[i])
+            if profiling:
+                expression_profile.record(trace_label, i, expr, value, t0, len(choosers))
         except Exception as err:
             logger.exception("Variable evaluation failed for: %s" % str(expr))
             raise err
 
+    expression_values = np.empty((spec.shape[0], choosers.shape[0]), dtype=dtype)
+    expression_values[zero_rows] = 0
+
+    rows = np.flatnonzero(~zero_rows)
+    if expression_threads() > 1 and len(rows) > 1:
+        # spec rows are independent (eval_utilities specs don't have temps)
+        # list() waits for all rows and raises the exception of first failed row (if any)
+        list(expression_executor().map(eval_expression, rows))
+    else:
+        for i in rows:
+            eval_expression(i)
+
     if estimator:
         df = pd.DataFrame(
             data=expression_values.transpose(),
@@ -372,7 +675,8 @@ def eval_utilities(spec, choosers, locals_d=None, trace_label=None,
         estimator.write_expression_values(df)
 
     # - compute_utilities
-    utilities = np.dot(expression_values.transpose(), spec.astype(np.float64).values)
+    # (expression values with zero coefficients are ignored, even if evaluated for tracing or estimation)
+    utilities = nonzero_term_utilities(expression_values, coefficients, nonzero, sparse)
     utilities = pd.DataFrame(data=utilities, index=choosers.index, columns=spec.columns)
 
     t0 = tracing.print_elapsed_time(" eval_utilities", t0)
@@ -481,10 +785,11 @@ def eval_variables(exprs, df, locals_d=None):
     values = OrderedDict()
     for expr in exprs:
         try:
-            if expr.startswith('@'):
-                expr_values = to_array(eval(expr[1:], globals_dict, locals_dict))
+            compiled = spec_compiler.compile_spec_expression(expr, allow_temps=False)
+            if compiled.kind == spec_compiler.PYTHON_EXPRESSION:
+                expr_values = to_array(compiled.eval_python(globals_dict, locals_dict))
             else:
-                expr_values = to_array(df.eval(expr))
+                expr_values = to_array(compiled.eval_pandas(df))
             # read model spec should ensure uniqueness, otherwise we should uniquify
             assert expr not in values
             values[expr] = expr_values
@@ -624,7 +929,7 @@ def compute_nested_exp_utilities(raw_utilities, nest_spec):
         if nest.is_leaf:
             # leaf_utility = raw_utility / nest.product_of_coefficients
             nested_utilities[name] = \
-                raw_utilities[name].astype(float) / nest.product_of_coefficients
+                raw_utilities[name].astype(np.float64) / nest.product_of_coefficients
 
         else:
             # nest node
@@ -714,6 +1019,153 @@ def compute_base_probabilities(nested_probabilities, nests, spec):
     return base_probabilities
 
 
+def spec_chooser_columns(spec, choosers, locals_d):
+    """
+    Return the choosers columns that the (nonzero coefficient) spec expressions depend on
+
+    Returns None if this can't be determined, e.g. if an expression references df other than
+    by column (df.column or df['column']), references something other than a column of choosers
+    (e.g. the choosers index), or references a local that isn't a module, function, or scalar
+    constant (e.g. a skim wrapper keyed on choosers columns that don't appear in the expressions,
+    a random channel, or a series aligned with choosers), since its values could depend on more
+    than the chooser columns.
+
+    Parameters
+    ----------
+    spec : pandas.DataFrame
+    choosers : pandas.DataFrame
+    locals_d : Dict or None
+
+    Returns
+    -------
+    columns : list of str or None
+        in choosers column order
+    """
+
+    # expressions are evaluated with local_utilities and locals_d as locals (as in eval_utilities)
+    namespace = assign.local_utilities()
+    if locals_d is not None:
+        namespace.update(locals_d)
+
+    if isinstance(spec.index, pd.MultiIndex):
+        exprs = spec.index.get_level_values(SPEC_EXPRESSION_NAME)
+    else:
+        exprs = spec.index
+
+    nonzero_rows = (spec.values != 0).any(axis=1)
+
+    columns = set()
+    for expr in exprs[nonzero_rows]:
+        try:
+            compiled = spec_compiler.compile_spec_expression(expr, allow_temps=False)
+        except SyntaxError:
+            return None
+        expr_columns, names = compiled.references()
+        if expr_columns is None or not expr_columns.issubset(choosers.columns):
+            return None
+        if not all(is_chooser_independent_local(namespace, name) for name in names):
+            return None
+        columns |= expr_columns
+
+    return [c for c in choosers.columns if c in columns]
+
+
+def is_chooser_independent_local(namespace, name):
+    """
+    Return True if name (in namespace or builtins) is a module, function, or scalar constant
+    """
+
+    if name in namespace:
+        value = namespace[name]
+    elif hasattr(builtins, name):
+        value = getattr(builtins, name)
+    else:
+        return False
+
+    return value is None or isinstance(value, CHOOSER_INDEPENDENT_LOCAL_TYPES)
+
+
+def dedupe_choosers(choosers, spec, locals_d, trace_label):
+    """
+    Return the unique choosers (by spec_chooser_columns) if dedupe_choosers is set (see set_dedupe_choosers)
+
+    Choosers with the same values in every column the spec depends on have the same utilities
+    and probabilities, so eval_mnl and eval_nl can compute them once per unique chooser and
+    broadcast the probabilities back to all choosers (with inverse) before making choices
+    (which still use each chooser's own random stream.)
+
+    Parameters
+    ----------
+    choosers : pandas.DataFrame
+    spec : pandas.DataFrame
+    locals_d : Dict or None
+    trace_label : str
+
+    Returns
+    -------
+    unique_choosers : pandas.DataFrame
+        first chooser row of each unique combination of spec_chooser_columns values
+        (or choosers if not deduped)
+    inverse : numpy.ndarray or None
+        position in unique_choosers of each chooser (or None if not deduped)
+    """
+
+    if not _dedupe_choosers:
+        return choosers, None
+
+    columns = spec_chooser_columns(spec, choosers, locals_d)
+    if columns is None:
+        logger.debug("%s not deduping choosers: can't determine spec chooser columns" % trace_label)
+        return choosers, None
+
+    return unique_choosers(choosers, columns, trace_label)
+
+
+def unique_choosers(choosers, columns, trace_label):
+    """
+    Return the first chooser row of each unique combination of columns values
+
+    Parameters
+    ----------
+    choosers : pandas.DataFrame
+    columns : list of str
+    trace_label : str
+
+    Returns
+    -------
+    unique_choosers : pandas.DataFrame
+        (or choosers if they are all unique)
+    inverse : numpy.ndarray or None
+        position in unique_choosers of each chooser (or None if choosers are all unique)
+    """
+
+    if columns:
+        inverse = choosers.groupby(columns, sort=False, observed=True, dropna=False).ngroup().values
+    else:
+        inverse = np.zeros(len(choosers), dtype=np.int64)
+
+    _, first_rows = np.unique(inverse, return_index=True)
+
+    logger.info("%s deduped %s choosers to %s unique choosers on %s spec columns" %
+                (trace_label, len(choosers), len(first_rows), len(columns)))
+
+    if len(first_rows) == len(choosers):
+        return choosers, None
+
+    return choosers.iloc[first_rows], inverse
+
+
+def broadcast_unique_rows(df, inverse, index):
+    """
+    Broadcast rows computed for dedupe_choosers unique choosers back to all choosers
+    """
+
+    if isinstance(df, pd.Series):
+        return pd.Series(df.values[inverse], index=index, name=df.name)
+
+    return pd.DataFrame(df.values[inverse], index=index, columns=df.columns)
+
+
 def eval_mnl(choosers, spec, locals_d, custom_chooser, estimator,
              want_logsums=False, trace_label=None, trace_choice_name=None):
     """
@@ -765,7 +1217,13 @@ def eval_mnl(choosers, spec, locals_d, custom_chooser, estimator,
     if have_trace_targets:
         tracing.trace_df(choosers, '%s.choosers' % trace_label)
 
-    utilities = eval_utilities(spec, choosers, locals_d,
+    # tracing and estimation want expression values for every chooser
+    if have_trace_targets or estimator:
+        unique_choosers, inverse = choosers, None
+    else:
+        unique_choosers, inverse = dedupe_choosers(choosers, spec, locals_d, trace_label)
+
+    utilities = eval_utilities(spec, unique_choosers, locals_d,
                                trace_label=trace_label, have_trace_targets=have_trace_targets,
                                estimator=estimator)
     chunk.log_df(trace_label, "utilities", utilities)
@@ -774,12 +1232,15 @@ def eval_mnl(choosers, spec, locals_d, custom_chooser, estimator,
         tracing.trace_df(utilities, '%s.utilities' % trace_label,
                          column_labels=['alternative', 'utility'])
 
-    probs = logit.utils_to_probs(utilities, trace_label=trace_label, trace_choosers=choosers)
-    chunk.log_df(trace_label, "probs", probs)
+    probs = logit.utils_to_probs(utilities, trace_label=trace_label, trace_choosers=unique_choosers)
 
     del utilities
     chunk.log_df(trace_label, 'utilities', None)
 
+    if inverse is not None:
+        probs = broadcast_unique_rows(probs, inverse, choosers.index)
+    chunk.log_df(trace_label, "probs", probs)
+
     if have_trace_targets:
         # report these now in case make_choices throws error on bad_choices
         tracing.trace_df(probs, '%s.probs' % trace_label,
@@ -849,7 +1310,13 @@ def eval_nl(choosers, spec, nest_spec, locals_d, custom_chooser, estimator,
     if have_trace_targets:
         tracing.trace_df(choosers, '%s.choosers' % trace_label)
 
-    raw_utilities = eval_utilities(spec, choosers, locals_d,
+    # tracing and estimation want expression values for every chooser
+    if have_trace_targets or estimator:
+        unique_choosers, inverse = choosers, None
+    else:
+        unique_choosers, inverse = dedupe_choosers(choosers, spec, locals_d, trace_label)
+
+    raw_utilities = eval_utilities(spec, unique_choosers, locals_d,
                                    trace_label=trace_label, have_trace_targets=have_trace_targets,
                                    estimator=estimator)
     chunk.log_df(trace_label, "raw_utilities", raw_utilities)
@@ -876,7 +1343,9 @@ def eval_nl(choosers, spec, nest_spec, locals_d, custom_chooser, estimator,
 
     if want_logsums:
         # logsum of nest root
-        logsums = pd.Series(np.log(nested_exp_utilities.root), index=choosers.index)
+        logsums = pd.Series(np.log(nested_exp_utilities.root), index=unique_choosers.index)
+        if inverse is not None:
+            logsums = broadcast_unique_rows(logsums, inverse, choosers.index)
         chunk.log_df(trace_label, "logsums", logsums)
 
     del nested_exp_utilities
@@ -888,11 +1357,14 @@ def eval_nl(choosers, spec, nest_spec, locals_d, custom_chooser, estimator,
 
     # global (flattened) leaf probabilities based on relative nest coefficients (in spec order)
     base_probabilities = compute_base_probabilities(nested_probabilities, nest_spec, spec)
-    chunk.log_df(trace_label, "base_probabilities", base_probabilities)
 
     del nested_probabilities
     chunk.log_df(trace_label, 'nested_probabilities', None)
 
+    if inverse is not None:
+        base_probabilities = broadcast_unique_rows(base_probabilities, inverse, choosers.index)
+    chunk.log_df(trace_label, "base_probabilities", base_probabilities)
+
     if have_trace_targets:
         tracing.trace_df(base_probabilities, '%s.base_probabilities' % trace_label,
                          column_labels=['alternative', 'probability'])
@@ -1052,6 +1524,10 @@ def simple_simulate(choosers, spec, nest_spec, skims=None, locals_d=None,
 
     assert len(choosers) > 0
 
+    # custom_chooser may use choosers columns the spec doesn't reference
+    if custom_chooser is None and estimator is None and not tracing.has_trace_targets(choosers):
+        choosers = spec_columns.prune_choosers(choosers, spec, locals_d, skims, trace_label)
+
     rows_per_chunk, effective_chunk_size = \
         simple_simulate_rpc(chunk_size, choosers, spec, nest_spec, trace_label)
 
@@ -1257,6 +1733,9 @@ def simple_simulate_logsums(choosers, spec, nest_spec,
 
     assert len(choosers) > 0
 
+    if not tracing.has_trace_targets(choosers):
+        choosers = spec_columns.prune_choosers(choosers, spec, locals_d, skims, trace_label)
+
     rows_per_chunk, effective_chunk_size = \
         simple_simulate_logsums_rpc(chunk_size, choosers, spec, nest_spec, trace_label)
 
@@ -16,20 +16,53 @@ from activitysim.core.util import quick_loc_series
 
 logger = logging.getLogger(__name__)
 
+# - skim block layouts
+# od_major: blocks are shaped (orig, dest, skim) so each skim is a strided slice of its block
+# skim_major: blocks are shaped (skim, orig, dest) so each skim is a contiguous 2-D array
+OD_MAJOR = 'od_major'
+SKIM_MAJOR = 'skim_major'
+SKIM_LAYOUTS = [OD_MAJOR, SKIM_MAJOR]
+
+
+# offset of zone ids not in skim (mapped by OffsetMapper) and value returned for their skim lookups
+NOT_IN_SKIM = -1
+NOT_IN_SKIM_VALUE = np.nan
+
+# - OffsetMapper offset_list modes
+# dense: np.int32 lookup table indexed by zone id (fast, but table size is max zone id)
+# sorted: np.searchsorted on sorted zone ids (for very sparse zone ids)
+# series: pandas index lookup
+DENSE = 'dense'
+SORTED = 'sorted'
+SERIES = 'series'
+OFFSET_LIST_MODES = [DENSE, SORTED, SERIES]
+
+# use dense mode unless lookup table would be larger than this multiple of the number of zones
+# (or DENSE_MIN_SIZE, so that small tables are always dense)
+DENSE_MAX_SIZE_RATIO = 8
+DENSE_MIN_SIZE = 1 << 20
+
 
 class OffsetMapper(object):
     """
     Utility to map skim zone ids to ordinal offsets (e.g. numpy array indices)
 
     Can map either by a fixed offset (e.g. -1 to map 1-based to 0-based)
-    or by an explicit mapping of zone id to offset (slower but more flexible)
+    or by an explicit mapping of zone id to offset (via a dense lookup table,
+    a searchsorted of sorted zone ids, or a pandas series)
+
+    Zone ids not in an explicit mapping are mapped to NOT_IN_SKIM
     """
 
     def __init__(self, offset_int=None):
         self.offset_series = None
         self.offset_int = offset_int
+        self.offset_mode = None
+        self.offset_lut = None
+        self.sorted_ids = None
+        self.sorted_offsets = None
 
-    def set_offset_list(self, offset_list):
+    def set_offset_list(self, offset_list, mode=None):
         """
         Specify the zone ids corresponding to the offsets (ordinal positions)
 
@@ -40,6 +73,8 @@ class OffsetMapper(object):
         Parameters
         ----------
         offset_list : list of int
+        mode : str or None
+            one of OFFSET_LIST_MODES, or None to choose dense or sorted based on zone id density
         """
         assert isinstance(offset_list, list)
         assert self.offset_int is None
@@ -52,11 +87,33 @@ class OffsetMapper(object):
             self.set_offset_int(offset_int)
             return
 
-        if self.offset_series is None:
-            self.offset_series = pd.Series(data=list(range(len(offset_list))), index=offset_list)
-        else:
+        if self.offset_series is not None:
             # make sure it offsets are the same
             assert (offset_list == self.offset_series.index).all()
+            return
+
+        zone_ids = np.asanyarray(offset_list)
+        assert len(np.unique(zone_ids)) == len(zone_ids), "set_offset_list zone ids are not unique"
+
+        if mode is None:
+            dense_size = max(DENSE_MAX_SIZE_RATIO * len(zone_ids), DENSE_MIN_SIZE)
+            is_dense = np.issubdtype(zone_ids.dtype, np.integer) and \
+                zone_ids.min() >= 0 and zone_ids.max() < dense_size
+            mode = DENSE if is_dense else SORTED
+        assert mode in OFFSET_LIST_MODES
+
+        self.offset_series = pd.Series(data=list(range(len(offset_list))), index=offset_list)
+        self.offset_mode = mode
+
+        if mode == DENSE:
+            self.offset_lut = np.full(zone_ids.max() + 1, NOT_IN_SKIM, dtype=np.int32)
+            self.offset_lut[zone_ids] = np.arange(len(zone_ids), dtype=np.int32)
+        elif mode == SORTED:
+            order = np.argsort(zone_ids, kind='stable')
+            self.sorted_ids = zone_ids[order]
+            self.sorted_offsets = order.astype(np.int32)
+
+        logger.debug("OffsetMapper set_offset_list mode %s for %s zone ids" % (mode, len(zone_ids)))
 
     def set_offset_int(self, offset_int):
         """
@@ -90,9 +147,21 @@ class OffsetMapper(object):
         offsets : numpy array of int
         """
 
-        NOT_IN_SKIM = -1
-
-        if self.offset_series is not None:
+        if self.offset_lut is not None:
+            zone_ids = np.asanyarray(zone_ids)
+            in_lut = (zone_ids >= 0) & (zone_ids < len(self.offset_lut))
+            if in_lut.all():
+                offsets = self.offset_lut[zone_ids]
+            else:
+                offsets = np.where(in_lut, self.offset_lut[np.where(in_lut, zone_ids, 0)], NOT_IN_SKIM)
+
+        elif self.sorted_ids is not None:
+            zone_ids = np.asanyarray(zone_ids)
+            positions = np.searchsorted(self.sorted_ids, zone_ids)
+            positions = np.minimum(positions, len(self.sorted_ids) - 1)
+            offsets = np.where(self.sorted_ids[positions] == zone_ids, self.sorted_offsets[positions], NOT_IN_SKIM)
+
+        elif self.offset_series is not None:
             assert(self.offset_int is None)
             assert isinstance(self.offset_series, pd.Series)
             offsets = np.asanyarray(quick_loc_series(zone_ids, self.offset_series).fillna(NOT_IN_SKIM).astype(int))
@@ -106,6 +175,113 @@ class OffsetMapper(object):
         return offsets
 
 
+def in_skim(offsets, num_zones):
+    """
+    boolean mask of (mapped) offsets that are valid indexes into skim dimension of size num_zones
+    """
+    offsets = np.asanyarray(offsets)
+    return (offsets >= 0) & (offsets < num_zones)
+
+
+def map_od_offsets(offset_mapper, orig, dest, od_shape):
+    """
+    map orig and dest zone ids to skim offsets
+
+    Parameters
+    ----------
+    offset_mapper : OffsetMapper
+    orig : 1D array
+    dest : 1D array
+    od_shape : tuple (num_orig_zones, num_dest_zones)
+
+    Returns
+    -------
+    offsets : tuple (mapped_orig, mapped_dest, valid)
+        valid is a boolean mask of od pairs in skim (or None if all od pairs are in skim)
+        mapped offsets of od pairs not in skim are set to 0 so they can be safely gathered
+    """
+
+    # fixme - remove?
+    assert not (np.isnan(orig) | np.isnan(dest)).any()
+
+    # only working with numpy in here
+    orig = np.asanyarray(orig).astype(int)
+    dest = np.asanyarray(dest).astype(int)
+
+    mapped_orig = np.asanyarray(offset_mapper.map(orig))
+    mapped_dest = np.asanyarray(offset_mapper.map(dest))
+
+    # return nan if not in skim (rather than letting negative indices wrap around)
+    valid = in_skim(mapped_orig, od_shape[0]) & in_skim(mapped_dest, od_shape[1])
+    if valid.all():
+        return mapped_orig, mapped_dest, None
+
+    return np.where(valid, mapped_orig, 0), np.where(valid, mapped_dest, 0), valid
+
+
+def reverse_od_offsets(offsets):
+    """
+    reverse (d-o) offsets for offsets returned by map_od_offsets
+    """
+    mapped_orig, mapped_dest, valid = offsets
+    return mapped_dest, mapped_orig, valid
+
+
+def key_column_values(df, keys):
+    """
+    return the values of df key columns (used to notice when cached offsets of df are stale)
+    """
+    return tuple(df[key].values for key in keys)
+
+
+def same_key_column_values(cached_values, values):
+    """
+    return True if key column values are the same arrays as the cached key column values
+
+    Columns reassigned to df after the cached values were taken will have new arrays. (Since
+    cached_values holds references to the old arrays, their memory can't have been reused.)
+    util.assign_in_place gives the columns it updates new arrays, but values written in place
+    some other way (e.g. by DataFrame.update or df.loc) are not noticed, so call set_df again.
+    """
+
+    def same(cached, v):
+        if cached is v:
+            return True
+        if isinstance(cached, np.ndarray) and isinstance(v, np.ndarray):
+            return cached.__array_interface__['data'] == v.__array_interface__['data'] \
+                and cached.shape == v.shape and cached.strides == v.strides and cached.dtype == v.dtype
+        return False
+
+    return cached_values is not None and all(same(c, v) for c, v in zip(cached_values, values))
+
+
+def decode_skim_values(values, dtype=None, scale=None):
+    """
+    decode skim values stored as a (possibly quantized) storage dtype
+
+    Parameters
+    ----------
+    values : numpy array
+        stored skim values
+    dtype : numpy.dtype or None
+        dtype of decoded values (or None to leave values in their storage dtype)
+    scale : float or None
+        scale factor of quantized values (decoded value is stored value * scale)
+
+    Returns
+    -------
+    values : numpy array
+    """
+
+    if dtype is not None and values.dtype != dtype:
+        values = values.astype(dtype)
+
+    if scale:
+        values = values * scale
+
+    return values
+
+
 class SkimWrapper(object):
     """
     Container for skim arrays.
@@ -118,17 +294,31 @@ class SkimWrapper(object):
         values to turn them into array indices.
         For example, if zone IDs are 1-based, an offset of -1
         would turn them into 0-based array indices.
+    scale : float, optional
+        scale factor to decode quantized data values
+    dtype : numpy.dtype, optional
+        dtype to decode data values to if it differs from data storage dtype
 
     """
-    def __init__(self, data, offset_mapper=None):
+    def __init__(self, data, offset_mapper=None, scale=None, dtype=None):
 
         self.data = data
         self.offset_mapper = offset_mapper if offset_mapper is not None else OffsetMapper()
+        self.scale = scale
+        self.dtype = dtype
+
+    def decode(self, values):
+        """
+        decode values from data (e.g. a slice or gather) to dtype, applying scale
+        """
+        return decode_skim_values(values, self.dtype, self.scale)
 
     def get(self, orig, dest):
         """
         Get impedence values for a set of origin, destination pairs.
 
+        Values for zones not in skim are NOT_IN_SKIM_VALUE (nan)
+
         Parameters
         ----------
         orig : 1D array
@@ -140,23 +330,12 @@ class SkimWrapper(object):
 
         """
 
-        # fixme - remove?
-        assert not (np.isnan(orig) | np.isnan(dest)).any()
-
-        # only working with numpy in here
-        orig = np.asanyarray(orig).astype(int)
-        dest = np.asanyarray(dest).astype(int)
+        mapped_orig, mapped_dest, valid = map_od_offsets(self.offset_mapper, orig, dest, self.data.shape)
 
-        mapped_orig = self.offset_mapper.map(orig)
-        mapped_dest = self.offset_mapper.map(dest)
-        result = self.data[mapped_orig, mapped_dest]
+        result = self.decode(self.data[mapped_orig, mapped_dest])
 
-        # FIXME - should return nan if not in skim (negative indices wrap around)
-        # NOT_IN_SKIM = np.nan
-        # in_skim = \
-        #     (mapped_orig <0) & (mapped_orig < self.data.shape[0]) & \
-        #     (mapped_dest <0) & (mapped_dest < self.data.shape[0])
-        # result = np.where(in_skim, result, NOT_IN_SKIM)
+        if valid is not None:
+            result = np.where(valid, result, NOT_IN_SKIM_VALUE)
 
         return result
 
@@ -175,6 +354,12 @@ class SkimDict(object):
         self.skim_info = skim_info
         self.skim_data = skim_data
 
+        self.skim_major = (skim_info.get('layout', OD_MAJOR) == SKIM_MAJOR)
+
+        # quantized (or non-default dtype) skims are decoded to skim_info dtype on lookup
+        self.dtype = skim_info.get('dtype')
+        self.scales = skim_info.get('scales', {})
+
         self.offset_mapper = OffsetMapper()
         self.usage = set()
 
@@ -182,6 +367,26 @@ class SkimDict(object):
 
         self.usage.add(key)
 
+    def missing_key_error(self, key):
+        """
+        KeyError explaining why skim key is not in skim_dict
+        """
+
+        key1 = key[0] if isinstance(key, tuple) else key
+        if key1 in self.skim_info.get('skipped_keys', ()):
+            return KeyError("skim key %s was not loaded because load_only_used_skims setting is True "
+                            "and %s is not referenced by any config file or by skim_usage_file"
+                            % (key, key1))
+        return KeyError("skim key %s not in skim_dict" % (key, ))
+
+    def decode(self, key, values):
+        """
+        decode skim values stored for skim key (or key1) to skim dtype
+        """
+
+        key1 = key[0] if isinstance(key, tuple) else key
+        return decode_skim_values(values, self.dtype, self.scales.get(key1))
+
     def get(self, key):
         """
         Get an available wrapped skim object (not the lookup)
@@ -197,14 +402,90 @@ class SkimDict(object):
              The skim object
         """
 
-        block, offset = self.skim_info['block_offsets'].get(key)
+        if key not in self.skim_info['block_offsets']:
+            raise self.missing_key_error(key)
+
+        block, offset = self.skim_info['block_offsets'][key]
         block_data = self.skim_data[block]
 
         self.touch(key)
 
-        data = block_data[:, :, offset]
+        if self.skim_major:
+            data = block_data[offset]
+        else:
+            data = block_data[:, :, offset]
+
+        key1 = key[0] if isinstance(key, tuple) else key
+        return SkimWrapper(data, self.offset_mapper, scale=self.scales.get(key1), dtype=self.dtype)
+
+    @property
+    def od_shape(self):
+        """
+        (num_orig_zones, num_dest_zones) shape of skims
+        """
+        block_shape = self.skim_data[0].shape
+        return block_shape[1:3] if self.skim_major else block_shape[0:2]
+
+    def map_offsets(self, orig, dest):
+        """
+        map orig and dest zone ids to skim offsets once, for use (and reuse) by gather
+
+        Returns
+        -------
+        offsets : tuple (mapped_orig, mapped_dest, valid)
+            as returned by map_od_offsets
+        """
+        return map_od_offsets(self.offset_mapper, orig, dest, self.od_shape)
+
+    def gather(self, keys, offsets):
+        """
+        lookup skim values of multiple skim keys for the same (already mapped) od pairs
+
+        Skims in the same block are gathered with a single fancy index of the block.
+
+        Parameters
+        ----------
+        keys : list of hashable
+            skim keys (identifiers) of skims to lookup
+        offsets : tuple
+            od offsets as returned by map_offsets
+
+        Returns
+        -------
+        values : 2D numpy array
+            array of shape (len(keys), num_od_pairs) with one row of values per key
+        """
+
+        mapped_orig, mapped_dest, valid = offsets
+
+        # - block_keys dict maps block to list of (row, key, offset) of keys in block
+        block_keys = OrderedDict()
+        for row, key in enumerate(keys):
+            if key not in self.skim_info['block_offsets']:
+                raise self.missing_key_error(key)
+            block, offset = self.skim_info['block_offsets'][key]
+            block_keys.setdefault(block, []).append((row, key, offset))
+            self.touch(key)
+
+        rows = [None] * len(keys)
+        for block, block_items in block_keys.items():
+            block_data = self.skim_data[block]
+            block_offsets = np.array([offset for row, key, offset in block_items])
+
+            if self.skim_major:
+                values = block_data[block_offsets[:, None], mapped_orig, mapped_dest]
+            else:
+                values = block_data[mapped_orig[:, None], mapped_dest[:, None], block_offsets].T
+
+            for i, (row, key, offset) in enumerate(block_items):
+                rows[row] = self.decode(key, values[i])
+
+        result = np.stack(rows) if rows else np.empty((0, len(mapped_orig)))
 
-        return SkimWrapper(data, self.offset_mapper)
+        if valid is not None:
+            result = np.where(valid, result, NOT_IN_SKIM_VALUE)
+
+        return result
 
     def wrap(self, left_key, right_key):
         """
@@ -241,11 +522,17 @@ class SkimDictWrapper(object):
         self.left_key = left_key
         self.right_key = right_key
         self.df = None
+        self.offsets = None
+        self.offset_key_values = None
 
     def set_df(self, df):
         """
         Set the dataframe
 
+        The od offsets of the df origin and destination columns are mapped (once) on first lookup
+        and reused for subsequent lookups until set_df is called again or the origin or destination
+        column of df is reassigned.
+
         Parameters
         ----------
         df : DataFrame
@@ -256,6 +543,23 @@ class SkimDictWrapper(object):
         Nothing
         """
         self.df = df
+        self.offsets = None
+        self.offset_key_values = None
+
+    def get_offsets(self, reverse=False):
+        """
+        return (cached) skim offsets of df origin and destination columns
+        """
+
+        assert self.df is not None, "Call set_df first"
+
+        # map lazily, since preprocessors may add (or reassign) left or right key column of df after set_df
+        key_values = key_column_values(self.df, [self.left_key, self.right_key])
+        if self.offsets is None or not same_key_column_values(self.offset_key_values, key_values):
+            self.offsets = self.skim_dict.map_offsets(self.df[self.left_key], self.df[self.right_key])
+            self.offset_key_values = key_values
+
+        return reverse_od_offsets(self.offsets) if reverse else self.offsets
 
     def lookup(self, key, reverse=False):
         """
@@ -277,25 +581,31 @@ class SkimDictWrapper(object):
             with the same index as df
         """
 
-        # The skim object to perform the lookup
         # using df[left_key] as the origin and df[right_key] as the destination
-        skim = self.skim_dict.get(key)
+        s = self.skim_dict.gather([key], self.get_offsets(reverse))[0]
 
-        # assert self.df is not None, "Call set_df first"
-        # origins = self.df[self.left_key].astype('int')
-        # destinations = self.df[self.right_key].astype('int')
-        # if self.offset:
-        #     origins = origins + self.offset
-        #     destinations = destinations + self.offset
+        return pd.Series(s, index=self.df.index)
 
-        assert self.df is not None, "Call set_df first"
+    def lookup_many(self, keys, reverse=False):
+        """
+        lookup multiple skims at once
 
-        if reverse:
-            s = skim.get(self.df[self.right_key], self.df[self.left_key])
-        else:
-            s = skim.get(self.df[self.left_key], self.df[self.right_key])
+        Parameters
+        ----------
+        keys : list of hashable
+             The keys (identifiers) of the skim objects
+        reverse : bool
+            lookup destination-origin skim values
 
-        return pd.Series(s, index=self.df.index)
+        Returns
+        -------
+        impedances: pd.DataFrame
+            A DataFrame with one column of impedances per key and with the same index as df
+        """
+
+        values = self.skim_dict.gather(keys, self.get_offsets(reverse))
+
+        return pd.DataFrame(values.T, index=self.df.index, columns=pd.Index(keys, tupleize_cols=False))
 
     def reverse(self, key):
         """
@@ -308,13 +618,9 @@ class SkimDictWrapper(object):
         return max skim value in either o-d or d-o direction
         """
 
-        skim = self.skim_dict.get(key)
-
-        assert self.df is not None, "Call set_df first"
-
         s = np.maximum(
-            skim.get(self.df[self.right_key], self.df[self.left_key]),
-            skim.get(self.df[self.left_key], self.df[self.right_key])
+            self.skim_dict.gather([key], self.get_offsets(reverse=True))[0],
+            self.skim_dict.gather([key], self.get_offsets(reverse=False))[0]
         )
 
         return pd.Series(s, index=self.df.index)
@@ -338,8 +644,24 @@ class SkimDictWrapper(object):
 
 
 class SkimStack(object):
+    """
+    Stacked (3-D) lookups of skims with (key1, key2) tuple keys, where key2 (e.g. time period)
+    varies by od pair.
 
-    def __init__(self, skim_dict):
+    key2 values of lookups (dim3) can be specified as labels (e.g. 'AM'), as a pandas categorical
+    of labels, or as integer codes (indexes into dim3_labels). Labels are converted to codes once
+    per lookup (or once per set_df by SkimStackWrapper) and codes are converted to skim offsets with
+    a small per-key1 code_offsets array, so the 3-D gather is pure fancy indexing.
+
+    Parameters
+    ----------
+    skim_dict : SkimDict
+    dim3_labels : list of str, optional
+        key2 labels in code order (e.g. skim_time_periods labels).
+        Defaults to key2 labels in order of first appearance in skim_dict.
+    """
+
+    def __init__(self, skim_dict, dim3_labels=None):
 
         self.offset_mapper = skim_dict.offset_mapper
         self.skim_dict = skim_dict
@@ -368,6 +690,26 @@ class SkimStack(object):
 
         self.skim_dim3 = skim_dim3
 
+        # - dim3_labels list of key2 labels, dim3_codes dict maps key2 label to code
+        if dim3_labels is None:
+            dim3_labels = list(OrderedDict.fromkeys(key2 for d in skim_dim3.values() for key2 in d))
+        else:
+            dim3_labels = list(dim3_labels) + \
+                [key2 for key2 in OrderedDict.fromkeys(k2 for d in skim_dim3.values() for k2 in d)
+                 if key2 not in dim3_labels]
+        self.dim3_labels = dim3_labels
+        self.dim3_codes = {label: code for code, label in enumerate(dim3_labels)}
+
+        # - code_offsets dict maps key1 to array of block offsets indexed by key2 code
+        # (with NOT_IN_SKIM for key2 labels not in skims for key1)
+        # DRV_COM_WLK_BOARDS: [3, 4, 5, -1, -1], ...
+        self.code_offsets = {}
+        for key1, key2_offsets in skim_dim3.items():
+            code_offsets = np.full(len(dim3_labels), NOT_IN_SKIM, dtype=np.int32)
+            for key2, offset in key2_offsets.items():
+                code_offsets[self.dim3_codes[key2]] = offset
+            self.code_offsets[key1] = code_offsets
+
         logger.info("SkimStack.__init__ loaded %s keys with %s total skims"
                     % (len(self.skim_dim3),
                        sum([len(d) for d in self.skim_dim3.values()])))
@@ -379,23 +721,117 @@ class SkimStack(object):
 
     def lookup(self, orig, dest, dim3, key):
 
-        orig = self.offset_mapper.map(orig)
-        dest = self.offset_mapper.map(dest)
+        return self.gather([key], self.map_offsets(orig, dest), self.map_dim3(dim3))[0]
 
-        assert key in self.key1_blocks, "SkimStack key %s missing" % key
-        assert key in self.skim_dim3, "SkimStack key %s missing" % key
+    def map_dim3(self, dim3):
+        """
+        convert key2 labels (or categorical labels, or integer codes) to integer dim3 codes
 
-        block = self.key1_blocks[key]
-        stacked_skim_data = self.skim_dict.skim_data[block]
-        skim_keys_to_indexes = self.skim_dim3[key]
+        Parameters
+        ----------
+        dim3 : 1D array or pandas Series
+            key2 labels (e.g. time period 'AM'), pandas categorical of key2 labels,
+            or integer indexes into dim3_labels
 
-        self.touch(key)
+        Returns
+        -------
+        codes : 1D numpy array of int
 
-        # skim_indexes = dim3.map(skim_keys_to_indexes).astype('int')
-        # this should be faster than map
-        skim_indexes = np.vectorize(skim_keys_to_indexes.get)(dim3)
+        Raises
+        ------
+        KeyError
+            if any label is not in dim3_labels (or is nan)
+        """
+
+        if isinstance(dim3, pd.Series) and isinstance(dim3.dtype, pd.CategoricalDtype):
+            labels = dim3.cat.categories
+            label_codes = dim3.cat.codes.values
+        else:
+            dim3 = np.asanyarray(dim3)
+
+            if np.issubdtype(dim3.dtype, np.integer):
+                return dim3
+
+            # factorize labels so we only need a dict lookup per unique label
+            label_codes, labels = pd.factorize(dim3)
+
+        # label code -1 (nan) indexes trailing NOT_IN_SKIM
+        label_dim3_codes = np.array([self.dim3_codes.get(label, NOT_IN_SKIM) for label in labels] + [NOT_IN_SKIM],
+                                    dtype=np.int32)
+        codes = label_dim3_codes[label_codes]
+
+        # (rather than letting NOT_IN_SKIM codes index the offsets of the last label)
+        if (codes < 0).any():
+            missing_labels = pd.unique(np.asarray(dim3, dtype=object)[codes < 0])
+            raise KeyError("skim dim3 labels %s not in SkimStack dim3_labels %s"
+                           % (list(missing_labels), self.dim3_labels))
+
+        return codes
+
+    def map_offsets(self, orig, dest):
+        """
+        map orig and dest zone ids to skim offsets once, for use (and reuse) by gather
+        """
+        return self.skim_dict.map_offsets(orig, dest)
+
+    def gather(self, keys, offsets, dim3_codes):
+        """
+        lookup stacked skim values of multiple skim key1s for the same (already mapped) od pairs
+
+        Parameters
+        ----------
+        keys : list of str
+            key1 of stacked skims to lookup
+        offsets : tuple
+            od offsets as returned by map_offsets
+        dim3_codes : 1D array of int
+            key2 (e.g. time period) codes of each od pair, as returned by map_dim3
+
+        Returns
+        -------
+        values : 2D numpy array
+            array of shape (len(keys), num_od_pairs) with one row of values per key
+        """
+
+        mapped_orig, mapped_dest, valid = offsets
+
+        # (don't let negative codes index the offsets of the last labels)
+        dim3_codes = np.asanyarray(dim3_codes)
+        if len(dim3_codes) and ((dim3_codes.min() < 0) or (dim3_codes.max() >= len(self.dim3_labels))):
+            bad_codes = dim3_codes[(dim3_codes < 0) | (dim3_codes >= len(self.dim3_labels))]
+            raise KeyError("skim dim3 codes %s not in range of SkimStack dim3_labels %s"
+                           % (list(np.unique(bad_codes)), self.dim3_labels))
+
+        rows = []
+        for key in keys:
 
-        return stacked_skim_data[orig, dest, skim_indexes]
+            if key not in self.key1_blocks or key not in self.skim_dim3:
+                raise self.skim_dict.missing_key_error(key)
+
+            block = self.key1_blocks[key]
+            stacked_skim_data = self.skim_dict.skim_data[block]
+
+            self.touch(key)
+
+            skim_indexes = self.code_offsets[key][dim3_codes]
+            if (skim_indexes < 0).any():
+                code = dim3_codes[skim_indexes < 0][0]
+                raise self.skim_dict.missing_key_error((key, self.dim3_labels[code]))
+
+            if self.skim_dict.skim_major:
+                result = stacked_skim_data[skim_indexes, mapped_orig, mapped_dest]
+            else:
+                result = stacked_skim_data[mapped_orig, mapped_dest, skim_indexes]
+
+            rows.append(self.skim_dict.decode(key, result))
+
+        result = np.stack(rows) if rows else np.empty((0, len(mapped_orig)))
+
+        # return nan if not in skim (rather than letting negative indices wrap around)
+        if valid is not None:
+            result = np.where(valid, result, NOT_IN_SKIM_VALUE)
+
+        return result
 
     def wrap(self, left_key, right_key, skim_key):
         """
@@ -455,11 +891,17 @@ class SkimStackWrapper(object):
         self.right_key = right_key
         self.skim_key = skim_key
         self.df = None
+        self.offsets = None
+        self.offset_key_values = None
 
     def set_df(self, df):
         """
         Set the dataframe
 
+        The od offsets of the df origin and destination columns are mapped (once) on first lookup
+        and reused for subsequent lookups until set_df is called again or the origin or destination
+        column of df is reassigned.
+
         Parameters
         ----------
         df : DataFrame
@@ -470,6 +912,57 @@ class SkimStackWrapper(object):
         Nothing
         """
         self.df = df
+        self.offsets = None
+        self.offset_key_values = None
+        self.dim3_codes = None
+        self.dim3_key_values = None
+
+    def get_offsets(self):
+        """
+        return (cached) skim offsets of df origin and destination columns
+        """
+
+        assert self.df is not None, "Call set_df first"
+
+        key_values = key_column_values(self.df, [self.left_key, self.right_key])
+        if self.offsets is None or not same_key_column_values(self.offset_key_values, key_values):
+            self.offsets = self.stack.map_offsets(self.df[self.left_key], self.df[self.right_key])
+            self.offset_key_values = key_values
+
+        return self.offsets
+
+    def get_dim3_codes(self):
+        """
+        return (cached) dim3 codes of df skim_key column
+        """
+
+        assert self.df is not None, "Call set_df first"
+
+        key_values = key_column_values(self.df, [self.skim_key])
+        if self.dim3_codes is None or not same_key_column_values(self.dim3_key_values, key_values):
+            self.dim3_codes = self.stack.map_dim3(self.df[self.skim_key])
+            self.dim3_key_values = key_values
+
+        return self.dim3_codes
+
+    def lookup_many(self, keys):
+        """
+        lookup multiple stacked skims at once
+
+        Parameters
+        ----------
+        keys : list of str
+             The key1s (identifiers) of the stacked skims
+
+        Returns
+        -------
+        impedances: pd.DataFrame
+            A DataFrame with one column of impedances per key and with the same index as df
+        """
+
+        values = self.stack.gather(keys, self.get_offsets(), self.get_dim3_codes())
+
+        return pd.DataFrame(values.T, index=self.df.index, columns=keys)
 
     def __getitem__(self, key):
         """
@@ -486,12 +979,7 @@ class SkimStackWrapper(object):
              The skim object
         """
 
-        assert self.df is not None, "Call set_df first"
-        orig = self.df[self.left_key].astype('int')
-        dest = self.df[self.right_key].astype('int')
-        dim3 = self.df[self.skim_key]
-
-        skim_values = self.stack.lookup(orig, dest, dim3, key)
+        skim_values = self.stack.gather([key], self.get_offsets(), self.get_dim3_codes())[0]
 
         return pd.Series(skim_values, self.df.index)
 
@@ -0,0 +1,537 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+import io
+import keyword
+import logging
+import re
+import tokenize
+
+import pandas as pd
+
+from .skim import SkimDictWrapper, SkimStackWrapper
+from . import spec_compiler
+
+logger = logging.getLogger(__name__)
+
+# suffix logit.interaction_dataset (and interaction_sample_simulate join) gives chooser columns
+# whose names are also alternatives columns
+CHOOSER_SUFFIX = '_chooser'
+
+# expression level of MultiIndex specs (as simulate.SPEC_EXPRESSION_NAME)
+SPEC_EXPRESSION_NAME = 'Expression'
+
+# tables on which interaction spec expressions can be evaluated (see interaction_expression_sides)
+CHOOSER_SIDE = 'choosers'
+ALT_SIDE = 'alternatives'
+INTERACTION_SIDE = 'interaction'
+
+_ENABLED = False
+
+# (chunkless) trace_label and list_name of column lists that have already been reported
+_reported_column_lists = set()
+
+
+def set_enabled(enabled):
+    """
+    Turn chooser column pruning on or off (called with the prune_chooser_columns setting by open_pipeline)
+    """
+    global _ENABLED
+    _ENABLED = bool(enabled)
+
+
+def enabled():
+    return _ENABLED
+
+
+def _pandas_expression_names(expr):
+    """
+    Return the names that may be df columns in a pandas expression (as evaluated by DataFrame.eval)
+
+    This is a superset of the referenced columns (e.g. it includes method names), since names
+    that aren't columns are ignored by callers. @local references are not columns.
+    Returns None for backtick quoted column names.
+    """
+
+    if '`' in expr:
+        return None
+
+    names = set()
+    local = False
+    for token in tokenize.generate_tokens(io.StringIO(expr.strip()).readline):
+        if token.type == tokenize.NAME and not local and not keyword.iskeyword(token.string):
+            names.add(token.string)
+        local = token.type == tokenize.OP and token.string == '@'
+
+    return names
+
+
+def expression_columns(expr, locals_d=None, allow_temps=True, index_only_calls=True):
+    """
+    Return the df columns and other names referenced by a model spec expression
+
+    Unlike CompiledExpression.references, df[name] is recognized as a column if name is a str
+    in locals_d, and (unless index_only_calls is False) df passed to random channel methods
+    (e.g. rng.lognormal_for_df(df, ...)) is taken to depend only on the df index.
+
+    Parameters
+    ----------
+    expr : str
+        model spec expression
+    locals_d : Dict or None
+    allow_temps : bool
+        whether '_target@python_expression' temps are allowed (only in interaction_simulate specs)
+    index_only_calls : bool
+        False if callers need rows with the same column values to have the same results
+
+    Returns
+    -------
+    columns : set of str or None
+        df columns (for pandas expressions, a superset including any name that might be a column),
+        or None if they can't be determined (e.g. python expression referencing df other than by column)
+    names : set of str
+        other (e.g. locals_d) names referenced by a python expression
+    """
+
+    try:
+        compiled = spec_compiler.compile_spec_expression(expr, allow_temps=allow_temps)
+    except SyntaxError:
+        return None, set()
+
+    if compiled.kind == spec_compiler.PANDAS_EXPRESSION:
+        if compiled.code is not None:
+            return set(compiled.names), set()
+        try:
+            return _pandas_expression_names(expr), set()
+        except tokenize.TokenError:
+            return None, set()
+
+    source = expr[expr.index('@') + 1:]
+    return spec_compiler._python_expression_references(source, locals_d=locals_d, index_only_calls=index_only_calls)
+
+
+def skim_key_columns(skims):
+    """
+    Return the df columns that skim wrappers look up their origins, destinations (and time periods) in
+
+    Parameters
+    ----------
+    skims : SkimDictWrapper or SkimStackWrapper object, or a list or dict of skims (as for set_skim_wrapper_targets)
+        or None
+
+    Returns
+    -------
+    columns : set of str
+    """
+
+    if isinstance(skims, dict):
+        skims = list(skims.values())
+    elif not isinstance(skims, list):
+        skims = [skims]
+
+    columns = set()
+    for skim in skims:
+        if isinstance(skim, (SkimDictWrapper, SkimStackWrapper)):
+            columns |= {skim.left_key, skim.right_key}
+        if isinstance(skim, SkimStackWrapper):
+            columns.add(skim.skim_key)
+
+    return columns
+
+
+def spec_columns(spec, locals_d=None, skims=None, allow_temps=True, index_only_calls=True):
+    """
+    Return the df columns referenced by the spec expressions with nonzero coefficients
+
+    Skim wrappers (in skims or referenced from locals_d) look up their key columns of df,
+    so those are included, and temp targets are locals rather than columns. Temps are
+    evaluated whatever their coefficients, so their columns are always included.
+
+    Parameters
+    ----------
+    spec : pandas.DataFrame
+        model spec with expressions in index (or Expression level of MultiIndex)
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+    allow_temps : bool
+    index_only_calls : bool
+        as for expression_columns
+
+    Returns
+    -------
+    columns : set of str or None
+        None if the columns can't be determined
+    """
+
+    locals_d = locals_d or {}
+
+    if isinstance(spec.index, pd.MultiIndex):
+        exprs = spec.index.get_level_values(SPEC_EXPRESSION_NAME)
+    else:
+        exprs = spec.index
+
+    nonzero_rows = (spec.values != 0).any(axis=1) if spec.values.dtype.kind in 'biuf' else [True] * len(exprs)
+
+    columns = skim_key_columns(skims)
+    for expr, nonzero in zip(exprs, nonzero_rows):
+        if not nonzero and spec_compiler.spec_expression_kind(expr, allow_temps) != spec_compiler.TEMP_EXPRESSION:
+            continue
+        expr_columns, names = expression_columns(expr, locals_d, allow_temps=allow_temps,
+                                                 index_only_calls=index_only_calls)
+        if expr_columns is None:
+            return None
+        columns |= expr_columns
+        for name in names:
+            columns |= skim_key_columns(locals_d.get(name))
+
+    return columns
+
+
+def assignment_columns(assignment_expressions, locals_d=None, df_names=('df',)):
+    """
+    Return the df columns read by assignment spec (e.g. preprocessor) expressions and the assigned targets
+
+    Parameters
+    ----------
+    assignment_expressions : pandas.DataFrame
+        assignment spec with target and expression columns (from assign.read_assignment_spec)
+    locals_d : Dict or None
+    df_names : iterable of str
+        names by which expressions reference df (e.g. 'df' and the DF alias of the model settings)
+
+    Returns
+    -------
+    columns : set of str or None
+        None if the columns can't be determined
+    targets : set of str
+        non-temp targets (which are added to df by assign_columns)
+    """
+
+    columns = set()
+    targets = set()
+    for target, expression in zip(assignment_expressions.target, assignment_expressions.expression):
+        if not target.startswith('_'):
+            targets.add(target)
+        for df_name in df_names:
+            try:
+                expr_columns, _ = spec_compiler._python_expression_references(
+                    str(expression), df_name=df_name, locals_d=locals_d, index_only_calls=True)
+            except SyntaxError:
+                expr_columns = None
+            if expr_columns is None:
+                return None, targets
+            columns |= expr_columns
+
+    return columns, targets
+
+
+def interaction_columns(spec, choosers, alternatives, locals_d=None, skims=None, keep_alt_columns=(),
+                        index_only_calls=True):
+    """
+    Return the choosers and alternatives columns referenced by an interaction spec
+
+    The interaction dataset suffixes chooser columns whose names are also alternatives columns
+    with CHOOSER_SUFFIX, so alternatives columns are kept if they are referenced with or without
+    the suffix (so that the names of chooser columns in the interaction dataset don't change).
+    If skims are used, the alternatives index is added as a column (e.g. TAZ) before interaction.
+
+    Parameters
+    ----------
+    spec : pandas.DataFrame
+    choosers : pandas.DataFrame
+    alternatives : pandas.DataFrame
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+    keep_alt_columns : iterable of str
+        alternatives columns to keep even if spec doesn't reference them (e.g. choice_column)
+    index_only_calls : bool
+        as for expression_columns
+
+    Returns
+    -------
+    chooser_columns : list of str or None
+    alt_columns : list of str or None
+        in choosers and alternatives column order, or None if columns can't be determined
+    """
+
+    columns = spec_columns(spec, locals_d, skims, index_only_calls=index_only_calls)
+    if columns is None:
+        return None, None
+
+    alt_columns = [c for c in alternatives.columns
+                   if c in columns or '%s%s' % (c, CHOOSER_SUFFIX) in columns or c in keep_alt_columns]
+
+    alt_names = set(alt_columns)
+    if skims is not None:
+        alt_names.add(alternatives.index.name)
+
+    chooser_columns = [c for c in choosers.columns
+                       if ('%s%s' % (c, CHOOSER_SUFFIX) if c in alt_names else c) in columns]
+
+    return chooser_columns, alt_columns
+
+
+def interaction_expression_sides(spec, choosers, alternatives, locals_d=None, skims=None):
+    """
+    Return the table on which each expression of an interaction spec can be evaluated
+
+    Expressions that only reference chooser columns (by their interaction dataset names,
+    i.e. with CHOOSER_SUFFIX if alternatives have a column of the same name) are CHOOSER_SIDE,
+    expressions that only reference alternatives columns (or no columns at all) are ALT_SIDE,
+    and expressions that reference both, skims, or (e.g. through random channel methods) the
+    interaction dataset index are INTERACTION_SIDE. Temps are on the side of the expression
+    that assigns them, and expressions that reference temps are on their side too.
+
+    Parameters
+    ----------
+    spec : pandas.DataFrame
+        interaction spec with one coefficient column
+    choosers : pandas.DataFrame
+    alternatives : pandas.DataFrame
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+        if not None, the alternatives index is also an interaction dataset column
+
+    Returns
+    -------
+    sides : list of str or None
+        CHOOSER_SIDE, ALT_SIDE, INTERACTION_SIDE, or None (for non-temp expressions with zero
+        coefficients, which needn't be evaluated) for each spec row,
+        or None if the columns of an evaluated expression can't be determined
+    """
+
+    locals_d = locals_d or {}
+
+    if isinstance(spec.index, pd.MultiIndex):
+        exprs = spec.index.get_level_values(SPEC_EXPRESSION_NAME)
+    else:
+        exprs = spec.index
+
+    alt_names = set(alternatives.columns)
+    if skims is not None:
+        alt_names.add(alternatives.index.name)
+
+    chooser_names = {('%s%s' % (c, CHOOSER_SUFFIX) if c in alt_names else c) for c in choosers.columns}
+
+    temp_sides = {}
+    sides = []
+    for expr, coefficient in zip(exprs, spec.iloc[:, 0]):
+
+        kind = spec_compiler.spec_expression_kind(expr)
+        if coefficient == 0 and kind != spec_compiler.TEMP_EXPRESSION:
+            sides.append(None)
+            continue
+
+        columns, names = expression_columns(expr, locals_d)
+        if columns is None:
+            return None
+
+        expr_sides = set()
+        for column in columns:
+            if column in chooser_names:
+                expr_sides.add(CHOOSER_SIDE)
+            elif column in alt_names or (kind == spec_compiler.PANDAS_EXPRESSION
+                                         and column == alternatives.index.name):
+                expr_sides.add(ALT_SIDE)
+        for name in names:
+            if name in temp_sides:
+                expr_sides.add(temp_sides[name])
+            elif skim_key_columns(locals_d.get(name)):
+                expr_sides.add(INTERACTION_SIDE)
+
+        if expression_columns(expr, locals_d, index_only_calls=False)[0] is None:
+            # df passed to (e.g. random channel) methods of the interaction dataset index
+            expr_sides.add(INTERACTION_SIDE)
+
+        if len(expr_sides) > 1:
+            side = INTERACTION_SIDE
+        else:
+            side = expr_sides.pop() if expr_sides else ALT_SIDE
+
+        if kind == spec_compiler.TEMP_EXPRESSION:
+            temp_sides[spec_compiler.compile_spec_expression(expr).target] = side
+
+        sides.append(side)
+
+    return sides
+
+
+def prune_columns(df, columns, table_name, trace_label):
+    """
+    Return df with only columns (a copy, so callers can add columns to it), or df if no columns are pruned
+    """
+
+    if columns is None or len(columns) == len(df.columns):
+        return df
+
+    logger.debug("%s pruned %s of %s %s columns: %s" %
+                 (trace_label, len(df.columns) - len(columns), len(df.columns), table_name,
+                  [c for c in df.columns if c not in columns]))
+
+    return df.reindex(columns=columns)
+
+
+def prune_choosers(choosers, spec, locals_d, skims, trace_label):
+    """
+    Return choosers with only the columns spec references, if the prune_chooser_columns setting is True
+
+    Callers should not prune choosers when tracing (trace targets may be found by chooser columns)
+    or estimating.
+
+    Parameters
+    ----------
+    choosers : pandas.DataFrame
+    spec : pandas.DataFrame
+        simple_simulate spec (without temps)
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+    trace_label : str
+
+    Returns
+    -------
+    choosers : pandas.DataFrame
+    """
+
+    if not _ENABLED:
+        return choosers
+
+    columns = spec_columns(spec, locals_d, skims, allow_temps=False)
+    if columns is None:
+        return choosers
+
+    return prune_columns(choosers, [c for c in choosers.columns if c in columns], 'choosers', trace_label)
+
+
+def prune_interaction_tables(choosers, alternatives, spec, locals_d, skims, trace_label, keep_alt_columns=()):
+    """
+    Return choosers and alternatives with only the columns spec references (see interaction_columns),
+    if the prune_chooser_columns setting is True
+
+    Parameters
+    ----------
+    choosers : pandas.DataFrame
+    alternatives : pandas.DataFrame
+    spec : pandas.DataFrame
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+    trace_label : str
+    keep_alt_columns : iterable of str
+
+    Returns
+    -------
+    choosers : pandas.DataFrame
+    alternatives : pandas.DataFrame
+    """
+
+    if not _ENABLED:
+        return choosers, alternatives
+
+    chooser_columns, alt_columns = interaction_columns(spec, choosers, alternatives, locals_d, skims, keep_alt_columns)
+    if chooser_columns is None:
+        return choosers, alternatives
+
+    return (prune_columns(choosers, chooser_columns, 'choosers', trace_label),
+            prune_columns(alternatives, alt_columns, 'alternatives', trace_label))
+
+
+def column_list_reported(list_name, trace_label):
+    """
+    Return True if report_column_list has already reported list_name for (chunkless) trace_label
+    """
+
+    return (re.sub(r'\.chunk_\d+', '', str(trace_label)), list_name) in _reported_column_lists
+
+
+def report_column_list(list_name, configured_columns, required_columns, available_columns, trace_label):
+    """
+    Log (once per trace_label) whether a configured chooser column list is too wide or too narrow
+
+    Columns are too narrow if spec expressions reference columns of the source table that are not
+    in the list, and too wide if the list has columns the expressions don't reference (which
+    may still be used by the model code, e.g. to merge choices back into the source table.)
+
+    Parameters
+    ----------
+    list_name : str
+        name of setting (e.g. SIMULATE_CHOOSER_COLUMNS)
+    configured_columns : list of str
+    required_columns : iterable of str or None
+        columns required by spec (and preprocessor) expressions, or None if they can't be determined
+    available_columns : iterable of str
+        columns of source table the configured columns are selected from
+    trace_label : str
+    """
+
+    key = (re.sub(r'\.chunk_\d+', '', str(trace_label)), list_name)
+    if key in _reported_column_lists or required_columns is None:
+        return
+    _reported_column_lists.add(key)
+
+    required_columns = set(required_columns)
+    missing = [c for c in available_columns if c in required_columns and c not in configured_columns]
+    unused = [c for c in configured_columns if c not in required_columns]
+
+    if missing:
+        logger.warning("%s %s is missing columns referenced by spec: %s" % (key[0], list_name, missing))
+    if unused:
+        logger.info("%s %s has columns not referenced by spec: %s" % (key[0], list_name, unused))
+
+
+def report_interaction_column_list(list_name, configured_columns, choosers, alternatives, spec,
+                                   locals_d, skims, trace_label):
+    """
+    report_column_list for the chooser columns of an interaction_sample or interaction_sample_simulate
+
+    Parameters
+    ----------
+    list_name : str
+    configured_columns : list of str
+    choosers : pandas.DataFrame
+        source table (e.g. persons_merged) that configured_columns are selected from
+    alternatives : pandas.DataFrame
+    spec : pandas.DataFrame
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+    trace_label : str
+    """
+
+    if column_list_reported(list_name, trace_label):
+        return
+
+    required_columns, _ = interaction_columns(spec, choosers, alternatives, locals_d, skims)
+
+    report_column_list(list_name, configured_columns, required_columns, choosers.columns, trace_label)
+
+
+def select_chooser_columns(model_settings, choosers, alternatives, spec, locals_d, skims, trace_label):
+    """
+    Return the SIMULATE_CHOOSER_COLUMNS of choosers for an interaction_sample or interaction_sample_simulate
+
+    The columns are kept as configured (models may use columns the spec doesn't, e.g. to merge
+    results), but if chooser column pruning is enabled, the first time for each model, configured
+    columns the spec doesn't reference and referenced columns that aren't configured are reported
+    (see report_interaction_column_list.)
+
+    Parameters
+    ----------
+    model_settings : dict
+    choosers : pandas.DataFrame
+        source table (e.g. persons_merged) that the configured columns are selected from
+    alternatives : pandas.DataFrame
+    spec : pandas.DataFrame
+    locals_d : Dict or None
+    skims : skims passed to set_skim_wrapper_targets or None
+    trace_label : str
+
+    Returns
+    -------
+    choosers : pandas.DataFrame
+    """
+
+    chooser_columns = model_settings['SIMULATE_CHOOSER_COLUMNS']
+
+    if _ENABLED:
+        report_interaction_column_list('SIMULATE_CHOOSER_COLUMNS', chooser_columns, choosers, alternatives, spec,
+                                       locals_d, skims, trace_label)
+
+    return choosers[chooser_columns]
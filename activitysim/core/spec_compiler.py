@@ -0,0 +1,475 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+import ast
+import io
+import logging
+import threading
+import tokenize
+from functools import reduce
+
+import pandas as pd
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+logger = logging.getLogger(__name__)
+
+# numexpr.evaluate isn't safe to call from concurrent threads (see simulate.set_expression_threads)
+# but numexpr kernels are multithreaded, so serializing them costs little
+_NUMEXPR_LOCK = threading.Lock()
+
+# kinds of spec expressions
+PANDAS_EXPRESSION = 'pandas'  # evaluated in the context of the chooser df like DataFrame.eval
+PYTHON_EXPRESSION = 'python'  # '@' prefixed python expression
+TEMP_EXPRESSION = 'temp'  # '_target@python_expression' temp assignment (interaction_simulate)
+ASSIGNMENT_EXPRESSION = 'assignment'  # python expression from assignment spec (assign_variables)
+
+# ast node types allowed in pandas expressions translated to python code
+# (anything else, e.g. function calls, attributes, or @local references, is left to DataFrame.eval)
+_PANDAS_EXPRESSION_NODES = (
+    ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare,
+    ast.Name, ast.Constant, ast.List, ast.Tuple, ast.Load,
+    ast.And, ast.Or, ast.Not, ast.Invert, ast.UAdd, ast.USub,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.BitAnd, ast.BitOr, ast.BitXor,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+)
+
+# numexpr operator symbols for the (transformed) pandas expression ast nodes numexpr supports
+_NUMEXPR_OPERATORS = {
+    ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Mod: '%', ast.Pow: '**',
+    ast.BitAnd: '&', ast.BitOr: '|', ast.USub: '-', ast.UAdd: '+', ast.Invert: '~',
+    ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=',
+}
+
+# cache of CompiledExpression by (kind, expression) shared by all callers (and inherited by forked processes)
+_COMPILED_EXPRESSIONS = {}
+
+
+class _PandasExpressionTransformer(ast.NodeTransformer):
+    """
+    Rewrite the ast of a pandas expression so python eval of columns gives the DataFrame.eval result
+
+    As in DataFrame.eval, 'and', 'or', and 'not' (and '&' and '|' which have been replaced by
+    'and' and 'or' by _preparse_pandas_expression) are elementwise, chained comparisons are
+    the elementwise 'and' of the individual comparisons, and 'in' and 'not in' are isin tests.
+    """
+
+    @staticmethod
+    def _and(comparisons):
+        return reduce(lambda left, right: ast.BinOp(left=left, op=ast.BitAnd(), right=right), comparisons)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        return reduce(lambda left, right: ast.BinOp(left=left, op=op, right=right), node.values)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        comparisons = []
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                comparison = ast.Call(func=ast.Attribute(value=left, attr='isin', ctx=ast.Load()),
+                                      args=[right], keywords=[])
+                if isinstance(op, ast.NotIn):
+                    comparison = ast.UnaryOp(op=ast.Invert(), operand=comparison)
+            else:
+                comparison = ast.Compare(left=left, ops=[op], comparators=[right])
+            comparisons.append(comparison)
+            left = right
+        return self._and(comparisons)
+
+
+def _preparse_pandas_expression(expr):
+    """
+    Replace '&' and '|' with 'and' and 'or' (as DataFrame.eval does) so they have boolean precedence
+
+    Returns None if the expression uses DataFrame.eval features we don't translate
+    ('@' local references or backtick quoted column names)
+    """
+
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(expr).readline):
+        toknum, tokval = token[:2]
+        if toknum == tokenize.OP and tokval in ('&', '|'):
+            toknum, tokval = tokenize.NAME, {'&': 'and', '|': 'or'}[tokval]
+        elif tokval in ('@', '`') or toknum == tokenize.ERRORTOKEN:
+            return None
+        tokens.append((toknum, tokval))
+
+    return tokenize.untokenize(tokens)
+
+
+def _numexpr_source(node):
+    """
+    Return numexpr source for (transformed) pandas expression ast node, or None if numexpr can't evaluate it
+
+    numexpr doesn't support floor division, xor, or (non-bytes) strings, and isin tests of
+    constant lists are expanded to equality tests (e.g. 'ptype in [1, 2]' to '(ptype == 1) | (ptype == 2)')
+    """
+
+    if isinstance(node, ast.Expression):
+        return _numexpr_source(node.body)
+
+    if isinstance(node, ast.Name):
+        return node.id
+
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, (bool, int, float)):
+            return repr(node.value)
+        return None
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _NUMEXPR_OPERATORS:
+        left, right = _numexpr_source(node.left), _numexpr_source(node.right)
+        if left is None or right is None:
+            return None
+        return '(%s %s %s)' % (left, _NUMEXPR_OPERATORS[type(node.op)], right)
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _NUMEXPR_OPERATORS:
+        operand = _numexpr_source(node.operand)
+        if operand is None:
+            return None
+        return '(%s%s)' % (_NUMEXPR_OPERATORS[type(node.op)], operand)
+
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _NUMEXPR_OPERATORS:
+        left, right = _numexpr_source(node.left), _numexpr_source(node.comparators[0])
+        if left is None or right is None:
+            return None
+        return '(%s %s %s)' % (left, _NUMEXPR_OPERATORS[type(node.ops[0])], right)
+
+    # isin call generated by _PandasExpressionTransformer for 'in' comparisons
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'isin':
+        values = node.args[0]
+        if not isinstance(values, (ast.List, ast.Tuple)) or not values.elts:
+            return None
+        left = _numexpr_source(node.func.value)
+        values = [_numexpr_source(v) if isinstance(v, ast.Constant) else None for v in values.elts]
+        if left is None or None in values:
+            return None
+        return '(%s)' % ' | '.join('(%s == %s)' % (left, v) for v in values)
+
+    return None
+
+
+def _compile_pandas_expression(expr):
+    """
+    Translate pandas expression into a python code object to be evaluated with df columns as locals
+
+    Returns
+    -------
+    code : code object or None if expr can't be translated
+    names : list of str
+        names of the (column) variables referenced by the expression
+    numexpr_source : str or None
+        equivalent numexpr expression, if there is one
+    """
+
+    try:
+        source = _preparse_pandas_expression(expr)
+        if source is None:
+            return None, [], None
+        tree = ast.parse(source.strip(), mode='eval')
+    except (SyntaxError, tokenize.TokenError, IndentationError):
+        return None, [], None
+
+    if not all(isinstance(node, _PANDAS_EXPRESSION_NODES) for node in ast.walk(tree)):
+        return None, [], None
+
+    names = sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)})
+
+    tree = ast.fix_missing_locations(_PandasExpressionTransformer().visit(tree))
+    code = compile(tree, '<pandas expression: %s>' % expr, 'eval')
+
+    # numexpr can't broadcast constant expressions into output array
+    numexpr_source = _numexpr_source(tree) if names else None
+
+    return code, names, numexpr_source
+
+
+def _python_expression_references(source, df_name='df', locals_d=None, index_only_calls=False):
+    """
+    Return the df columns and other names referenced by a python expression
+
+    df columns are only recognized as df.column or df['column'] (or 'column' in df.columns),
+    so that None is returned if df is referenced in any other way (e.g. df.loc, df[columns] or
+    as a function argument) where we can't tell which columns the expression depends on.
+
+    Parameters
+    ----------
+    source : str
+    df_name : str
+    locals_d : Dict or None
+        if specified, df[name] is also recognized as a column if name is a str in locals_d
+        (e.g. df[dest_col_name])
+    index_only_calls : bool
+        if True, df passed as an argument to a (e.g. random channel) method whose name ends in
+        '_for_df' is taken to depend only on the df index, not its columns. (The results of these
+        calls still differ by row, so callers that dedupe rows mustn't use this.)
+
+    Returns
+    -------
+    columns : set of str (or None)
+    names : set of str
+        other (e.g. locals_d) names referenced by the expression
+    """
+
+    tree = ast.parse(source.strip(), mode='eval')
+
+    def subscript_key(node):
+        # python < 3.9 wraps subscript slice in ast.Index
+        key = node.slice.value if isinstance(node.slice, getattr(ast, 'Index', ())) else node.slice
+        if isinstance(key, ast.Name) and locals_d and isinstance(locals_d.get(key.id), str):
+            return locals_d[key.id]
+        return key.value if isinstance(key, ast.Constant) and isinstance(key.value, str) else None
+
+    columns = set()
+    names = set()
+    df_nodes = set()
+    for node in ast.walk(tree):
+        if index_only_calls and isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and node.func.attr.endswith('_for_df'):
+            df_nodes.update(arg for arg in node.args if isinstance(arg, ast.Name) and arg.id == df_name)
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], (ast.In, ast.NotIn)) \
+                and isinstance(node.left, ast.Constant) and isinstance(node.left.value, str) \
+                and isinstance(node.comparators[0], ast.Attribute) and node.comparators[0].attr == 'columns' \
+                and isinstance(node.comparators[0].value, ast.Name) and node.comparators[0].value.id == df_name:
+            # presence test of column
+            columns.add(node.left.value)
+            df_nodes.add(node.comparators[0].value)
+        if not (isinstance(node, (ast.Attribute, ast.Subscript))
+                and isinstance(node.value, ast.Name) and node.value.id == df_name):
+            continue
+        if isinstance(node, ast.Attribute):
+            # DataFrame attributes (e.g. df.loc or df.index) aren't columns
+            column = node.attr if not hasattr(pd.DataFrame, node.attr) else None
+        else:
+            column = subscript_key(node)
+        if column is not None:
+            columns.add(column)
+            df_nodes.add(node.value)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id != df_name:
+                names.add(node.id)
+            elif node not in df_nodes:
+                return None, names
+
+    return columns, names
+
+
+class CompiledExpression(object):
+    """
+    Spec expression parsed and compiled once, for reuse in every chunk, segment and iteration
+
+    Attributes
+    ----------
+    expr : str
+        expression as it appears in the spec (e.g. '@df.income > 0' or 'income > 0')
+    kind : str
+        one of PANDAS_EXPRESSION, PYTHON_EXPRESSION, TEMP_EXPRESSION, or ASSIGNMENT_EXPRESSION
+    target : str or None
+        name of temp variable for TEMP_EXPRESSION
+    code : code object or None
+        compiled python expression (for pandas expressions, a translation evaluated with the
+        referenced df columns as locals, or None if the expression must be left to DataFrame.eval)
+    names : list of str
+        df column names referenced by a translated pandas expression
+    numexpr_source : str or None
+        numexpr translation of pandas expression used by eval_pandas_into (if numexpr is installed)
+    """
+
+    def __init__(self, expr, kind):
+
+        self.expr = expr
+        self.kind = kind
+        self.target = None
+        self.names = []
+        self.numexpr_source = None
+
+        if kind == PANDAS_EXPRESSION:
+            self.code, self.names, self.numexpr_source = _compile_pandas_expression(expr)
+        elif kind == TEMP_EXPRESSION:
+            self.target = expr[:expr.index('@')]
+            self.code = compile(expr[expr.index('@') + 1:], '<temp expression>', 'eval')
+        elif kind == PYTHON_EXPRESSION:
+            self.code = compile(expr[1:], '<python expression>', 'eval')
+        elif kind == ASSIGNMENT_EXPRESSION:
+            self.code = compile(expr, '<assignment expression>', 'eval')
+        else:
+            raise RuntimeError("Unknown spec expression kind '%s'" % kind)
+
+    def references(self):
+        """
+        Return the chooser df columns and other names the expression depends on
+
+        For pandas expressions, the referenced names are the df columns. For python expressions,
+        df columns are those referenced as df.column or df['column'] and other names are locals
+        (e.g. skims or constants), functions, or builtins.
+
+        Returns
+        -------
+        columns : set of str or None
+            referenced df columns, or None if they can't be determined (e.g. for an untranslated
+            pandas expression, or a python expression that references df other than by column)
+        names : set of str
+            other names referenced by a python expression
+        """
+
+        if self.kind == PANDAS_EXPRESSION:
+            return (set(self.names) if self.code is not None else None), set()
+
+        if self.kind == PYTHON_EXPRESSION:
+            return _python_expression_references(self.expr[1:])
+
+        return None, set()
+
+    def eval_python(self, globals_dict, locals_dict):
+        """
+        Evaluate compiled python (or temp or assignment) expression (with same semantics as python eval)
+        """
+        return eval(self.code, globals_dict, locals_dict)
+
+    def eval_pandas(self, df):
+        """
+        Evaluate PANDAS_EXPRESSION in the context of df (with same result as df.eval(expr))
+
+        Expressions that could not be translated, or whose translation fails (e.g. because they
+        reference the df index name rather than a column) are evaluated by DataFrame.eval
+        """
+
+        if self.code is not None:
+            try:
+                columns = {name: df[name] for name in self.names}
+                return eval(self.code, {'__builtins__': {}}, columns)
+            except Exception as err:
+                logger.debug("compiled pandas expression failed (%s: %s), using DataFrame.eval for: %s" %
+                             (type(err).__name__, err, self.expr))
+                self.code = None
+
+        return df.eval(self.expr)
+
+    def eval_pandas_into(self, df, out):
+        """
+        Evaluate PANDAS_EXPRESSION in the context of df, writing the result into out
+
+        If numexpr is installed and the expression has a numexpr translation, the expression is
+        evaluated as a single fused numexpr kernel over the df column arrays, writing directly
+        into out without creating temporary pandas Series. Otherwise (or if numexpr fails, e.g.
+        for object or categorical columns) the result of eval_pandas is copied into out.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+        out : 1-D numpy.ndarray of length len(df)
+            (e.g. row of eval_utilities expression_values, which may be float32 or float64)
+
+        Returns
+        -------
+        out
+        """
+
+        if self.numexpr_source is not None and numexpr is not None:
+            try:
+                columns = {name: df[name].values for name in self.names}
+                with _NUMEXPR_LOCK:
+                    numexpr.evaluate(self.numexpr_source, local_dict=columns, global_dict={},
+                                     out=out, casting='same_kind')
+                return out
+            except Exception as err:
+                logger.debug("numexpr failed (%s: %s), using python eval for: %s" %
+                             (type(err).__name__, err, self.expr))
+                self.numexpr_source = None
+
+        out[:] = self.eval_pandas(df)
+        return out
+
+
+def spec_expression_kind(expr, allow_temps=True):
+    """
+    Classify model spec expression as PANDAS_EXPRESSION, PYTHON_EXPRESSION, or TEMP_EXPRESSION
+    """
+
+    if expr.startswith('@'):
+        return PYTHON_EXPRESSION
+    if allow_temps and expr.startswith('_') and '@' in expr:
+        return TEMP_EXPRESSION
+    return PANDAS_EXPRESSION
+
+
+def compile_expression(expr, kind):
+    """
+    Return (cached) CompiledExpression for expr of specified kind
+
+    Parameters
+    ----------
+    expr : str
+    kind : str
+        one of PANDAS_EXPRESSION, PYTHON_EXPRESSION, TEMP_EXPRESSION, or ASSIGNMENT_EXPRESSION
+
+    Returns
+    -------
+    CompiledExpression
+    """
+
+    key = (kind, expr)
+    compiled = _COMPILED_EXPRESSIONS.get(key)
+    if compiled is None:
+        compiled = _COMPILED_EXPRESSIONS[key] = CompiledExpression(expr, kind)
+    return compiled
+
+
+def compile_spec_expression(expr, allow_temps=True):
+    """
+    Return (cached) CompiledExpression for a model spec expression
+
+    Parameters
+    ----------
+    expr : str
+        expression from model spec index
+    allow_temps : bool
+        whether '_target@python_expression' temps are allowed (only in interaction_simulate specs)
+    """
+
+    return compile_expression(expr, spec_expression_kind(expr, allow_temps))
+
+
+def compile_spec_expressions(exprs):
+    """
+    Compile model spec expressions (e.g. when spec is read) so they are ready for first use
+
+    Expressions that fail to compile are left for the evaluator to report in context
+    """
+
+    for expr in exprs:
+        try:
+            compile_spec_expression(expr)
+        except SyntaxError:
+            logger.debug("spec expression does not compile: %s" % expr)
+
+
+def compile_assignment_expressions(expressions):
+    """
+    Compile assignment spec python expressions (e.g. when spec is read) so they are ready for first use
+    """
+
+    for expr in expressions:
+        if isinstance(expr, str):
+            try:
+                compile_expression(expr, ASSIGNMENT_EXPRESSION)
+            except SyntaxError:
+                logger.debug("assignment expression does not compile: %s" % expr)
+
+
+def clear_cache():
+    _COMPILED_EXPRESSIONS.clear()
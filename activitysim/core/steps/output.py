@@ -19,7 +19,8 @@ def track_skim_usage(output_dir):
     """
     write statistics on skim usage (diagnostic to detect loading of un-needed skims)
 
-    FIXME - have not yet implemented a facility to avoid loading of unused skims
+    The resulting skim_usage.txt can be used as skim_usage_file with load_only_used_skims
+    setting to avoid loading of unused skims in subsequent runs
 
     Parameters
     ----------
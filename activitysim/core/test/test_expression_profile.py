@@ -0,0 +1,107 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+import os.path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from .. import assign
+from .. import expression_profile
+from .. import inject
+from .. import simulate
+
+
+@pytest.fixture
+def profiling():
+    expression_profile.clear()
+    expression_profile.set_enabled(True)
+    expression_profile.begin_model('test_model')
+    yield
+    expression_profile.set_enabled(False)
+    expression_profile.begin_model('')
+    expression_profile.clear()
+
+
+def teardown_function(func):
+    inject.clear_cache()
+    inject.reinject_decorated_tables()
+
+
+@pytest.fixture(scope='module')
+def data_dir():
+    return os.path.join(os.path.dirname(__file__), 'data')
+
+
+@pytest.fixture(scope='module')
+def data(data_dir):
+    return pd.read_csv(os.path.join(data_dir, 'data.csv'))
+
+
+def test_profile_eval_utilities(profiling, data, data_dir):
+
+    spec = simulate.read_model_spec(file_name='sample_spec.csv', spec_dir=data_dir)
+
+    for chunk in [0, 1]:
+        simulate.eval_utilities(spec, data, trace_label='test.simple_simulate.chunk_%s' % chunk)
+
+    profile = expression_profile.profile_df()
+
+    # chunks are profiled together
+    assert len(profile) == len(spec)
+    assert set(profile.model) == {'test_model'}
+    assert set(profile.trace_label) == {'test.simple_simulate'}
+    assert sorted(profile.spec_row) == list(range(len(spec)))
+    assert set(profile.expression) == set(spec.index)
+    assert (profile.calls == 2).all()
+    assert (profile.rows == 2 * len(data)).all()
+
+    # sorted by descending seconds
+    assert (np.diff(profile.seconds) <= 0).all()
+    assert profile.pct_seconds.sum() == pytest.approx(100, abs=0.01)
+
+
+def test_profile_assign_variables(profiling, data, data_dir):
+
+    spec = assign.read_assignment_spec(os.path.join(data_dir, 'assignment_spec.csv'))
+
+    assign.assign_variables(spec, data, {'CONSTANT': 7, '_shadow': 99}, trace_label='test_assign')
+
+    profile = expression_profile.profile_df().set_index('spec_row').sort_index()
+
+    assert len(profile) == len(spec)
+    assert set(profile.trace_label) == {'test_assign'}
+    assert profile.expression[0] == '_temp = CONSTANT+df.thing1'
+    assert profile.dtype[0] == 'int64'
+    assert profile.bytes[0] == 8 * len(data)
+
+    # temp scalar
+    assert profile.expression[2] == "_DF_COL_NAME = 'thing2'"
+    assert profile.dtype[2] == 'str'
+    assert profile.bytes[2] == 0
+
+
+def test_write_and_merge_profiles(profiling, data, tmpdir):
+
+    inject.add_injectable('output_dir', str(tmpdir))
+
+    spec = pd.DataFrame({'alt0': [1.0, 2.0]}, index=['thing1', '@df.thing2 * 2'])
+
+    # write a profile for each of two sub-processes
+    for process_name in ['mp_households_0', 'mp_households_1']:
+        inject.add_injectable('log_file_prefix', process_name)
+        expression_profile.clear()
+        simulate.eval_utilities(spec, data, trace_label='test')
+        expression_profile.write_profile()
+        assert os.path.exists(os.path.join(str(tmpdir), '%s-expression_profile.csv' % process_name))
+
+    inject.remove_injectable('log_file_prefix')
+    expression_profile.merge_profiles(['mp_households_0', 'mp_households_1', 'mp_summarize'])
+
+    merged = pd.read_csv(os.path.join(str(tmpdir), 'expression_profile.csv'))
+
+    assert len(merged) == 2
+    assert (merged.calls == 2).all()
+    assert (merged.rows == 2 * len(data)).all()
+    assert merged.pct_seconds.sum() == pytest.approx(100, abs=0.01)
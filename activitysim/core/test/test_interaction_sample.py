@@ -0,0 +1,182 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from .. import inject
+from .. import interaction_sample
+from .. import pipeline
+from .. import skim
+
+
+def teardown_function(func):
+    inject.clear_cache()
+    inject.reinject_decorated_tables()
+
+
+@pytest.fixture
+def skims():
+    skim_data = np.arange(100, dtype=float).reshape((10, 10, 1)) % 13
+    skim_dict = skim.SkimDict([skim_data], {'block_offsets': {'DIST': (0, 0)}})
+    skim_dict.offset_mapper.set_offset_int(-1)
+    return skim_dict.wrap('TAZ_chooser', 'TAZ')
+
+
+@pytest.fixture
+def choosers():
+    return pd.DataFrame({
+        'TAZ': np.arange(200) % 10 + 1,
+        'income_segment': np.arange(200) % 3,
+        'age': np.arange(200) % 70},
+        index=pd.Index(np.arange(200), name='person_id'))
+
+
+@pytest.fixture
+def alternatives():
+    size_term = np.arange(10, dtype=float)
+    size_term[3] = 0
+    return pd.DataFrame({'size_term': size_term}, index=pd.Index(np.arange(10) + 1, name='TAZ'))
+
+
+def sample(choosers, alternatives, skims, settings, spec=None, chunk_size=0, allow_zero_probs=False):
+
+    if spec is None:
+        spec = pd.DataFrame({'coefficient': [1.0, -0.2, 0.05, 1.0, -999]},
+                            index=['_DIST@skims["DIST"]',
+                                   '@_DIST',
+                                   '@_DIST * df.income_segment',
+                                   '@np.log1p(df.size_term)',
+                                   'size_term == 0'])
+
+    settings = dict(settings, check_for_variability=False)
+    inject.add_injectable('settings', settings)
+
+    # as applied by open_pipeline
+    interaction_sample.set_broadcast_interaction_sample(settings.get('broadcast_interaction_sample', False))
+    interaction_sample.set_dedupe_sample_choosers(settings.get('dedupe_sample_choosers', False))
+
+    rng = pipeline.get_rn_generator()
+    rng.begin_step('test_interaction_sample')
+    rng.add_channel('persons', choosers)
+    try:
+        return interaction_sample.interaction_sample(
+            choosers, alternatives.copy(), spec, sample_size=6, alt_col_name='alt_dest',
+            allow_zero_probs=allow_zero_probs, skims=skims, locals_d={'skims': skims},
+            chunk_size=chunk_size, trace_label='test')
+    finally:
+        rng.drop_channel('persons')
+        rng.end_step('test_interaction_sample')
+        interaction_sample.set_broadcast_interaction_sample(False)
+        interaction_sample.set_dedupe_sample_choosers(False)
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_sample_positions(dtype):
+
+    rng = np.random.RandomState(0)
+
+    probs = rng.random_sample((50, 37)).astype(dtype)
+    probs[probs < 0.3] = 0
+    probs[:, 0] = 0
+    probs[7] = 0
+    probs /= np.maximum(probs.sum(axis=1, keepdims=True), 1e-3)
+    cum_probs_arr = probs.cumsum(axis=1)
+
+    rands = rng.random_sample((50, 20))
+    # rands equal to cum_probs and greater than row totals
+    rands[:, 0] = cum_probs_arr[np.arange(50), rng.randint(0, 37, 50)]
+    rands[:, 1] = 1.0
+
+    expected = np.stack([np.argmax(cum_probs_arr > rands[:, [i]], axis=1) for i in range(rands.shape[1])], axis=1)
+    np.testing.assert_array_equal(interaction_sample.sample_positions(cum_probs_arr, rands), expected)
+
+    # rows
+    rows = rng.randint(0, 50, 80)
+    rands = rng.random_sample((80, 5))
+    expected = np.stack([np.argmax(cum_probs_arr[rows] > rands[:, [i]], axis=1) for i in range(5)], axis=1)
+    np.testing.assert_array_equal(interaction_sample.sample_positions(cum_probs_arr, rands, rows), expected)
+
+
+def test_collapse_duplicate_picks():
+
+    rng = np.random.RandomState(0)
+
+    choices_df = pd.DataFrame({
+        'alt_dest': rng.randint(1, 8, 60),
+        'rand': rng.random_sample(60),
+        'prob': rng.random_sample(60),
+        'person_id': np.repeat([3, 5, 6, 9, 12, 20], 10)})
+
+    collapsed = interaction_sample.collapse_duplicate_picks(choices_df, 'person_id', 'alt_dest')
+
+    first_picks = choices_df.drop_duplicates(['person_id', 'alt_dest']).sort_values(['person_id', 'alt_dest'])
+    pick_count = choices_df.groupby(['person_id', 'alt_dest']).size()
+
+    assert list(collapsed.columns) == ['alt_dest', 'rand', 'prob', 'pick_count']
+    assert collapsed.index.name == 'person_id'
+    np.testing.assert_array_equal(collapsed.index, first_picks.person_id)
+    np.testing.assert_array_equal(collapsed.alt_dest, first_picks.alt_dest)
+    np.testing.assert_array_equal(collapsed.rand, first_picks.rand)
+    np.testing.assert_array_equal(collapsed.pick_count, pick_count.values)
+    assert collapsed.pick_count.sum() == len(choices_df)
+
+    # alternative ids spanning most of the int64 range
+    sparse_ids = choices_df.alt_dest.map({alt: alt * 2**59 for alt in range(1, 8)})
+    collapsed = interaction_sample.collapse_duplicate_picks(choices_df.assign(alt_dest=sparse_ids),
+                                                            'person_id', 'alt_dest')
+    np.testing.assert_array_equal(collapsed.alt_dest, first_picks.alt_dest * 2**59)
+    np.testing.assert_array_equal(collapsed.pick_count, pick_count.values)
+
+    # non-integer alternative ids
+    choices_df['alt_dest'] = choices_df.alt_dest.map(lambda alt: 'alt_%s' % alt)
+    collapsed = interaction_sample.collapse_duplicate_picks(choices_df, 'person_id', 'alt_dest')
+    np.testing.assert_array_equal(collapsed.pick_count, pick_count.values)
+
+
+def test_dedupe_sample_choosers(choosers, alternatives, skims):
+
+    expected = sample(choosers, alternatives, skims, {})
+
+    # choosers are deduped on the origin and income_segment columns spec references
+    assert interaction_sample.dedupe_sample_chooser_columns(
+        choosers, alternatives, pd.DataFrame({'c': [1.0, 1.0]}, index=['@skims["DIST"]', 'income_segment']),
+        {'skims': skims}, skims, 'test') is None
+
+    interaction_sample.set_dedupe_sample_choosers(True)
+    try:
+        assert interaction_sample.dedupe_sample_chooser_columns(
+            choosers, alternatives, pd.DataFrame({'c': [1.0, 1.0]}, index=['@skims["DIST"]', 'income_segment']),
+            {'skims': skims}, skims, 'test') == ['TAZ', 'income_segment']
+    finally:
+        interaction_sample.set_dedupe_sample_choosers(False)
+
+    for settings in [{'dedupe_sample_choosers': True},
+                     {'dedupe_sample_choosers': True, 'broadcast_interaction_sample': True}]:
+        for chunk_size in [0, 5000]:
+            pdt.assert_frame_equal(sample(choosers, alternatives, skims, settings, chunk_size=chunk_size),
+                                   expected)
+
+
+def test_dedupe_sample_choosers_zero_probs(choosers, alternatives, skims):
+
+    # choosers in TAZ 2 have no available alternatives
+    spec = pd.DataFrame({'coefficient': [1.0, -999]},
+                        index=['@np.log1p(df.size_term)', '@(df.TAZ_chooser == 2) | (df.size_term == 0)'])
+    alternatives['TAZ'] = alternatives.index
+
+    expected = sample(choosers, alternatives, None, {}, spec=spec, allow_zero_probs=True)
+    assert 2 not in choosers.TAZ.reindex(expected.index).values
+
+    choices = sample(choosers, alternatives, None, {'dedupe_sample_choosers': True}, spec=spec, allow_zero_probs=True)
+    pdt.assert_frame_equal(choices, expected)
+
+
+def test_broadcast_interaction_sample(choosers, alternatives, skims):
+
+    expected = sample(choosers, alternatives, skims, {})
+
+    choices = sample(choosers, alternatives, skims, {'broadcast_interaction_sample': True}, chunk_size=5000)
+    pdt.assert_frame_equal(choices, expected)
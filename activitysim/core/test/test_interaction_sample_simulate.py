@@ -0,0 +1,54 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from .. import inject
+from .. import interaction_sample_simulate
+
+
+def teardown_function(func):
+    inject.clear_cache()
+    inject.reinject_decorated_tables()
+
+
+def test_padded_sample_layout():
+
+    choosers = pd.DataFrame({'income': [10, 20, 30]}, index=pd.Index([3, 5, 8], name='person_id'))
+    alternatives = pd.DataFrame({'TAZ': [1, 4, 2, 1, 5, 6]},
+                                index=pd.Index([3, 3, 5, 8, 8, 8], name='person_id'))
+
+    chooser_rows, sample_columns, first_row_offsets, available = \
+        interaction_sample_simulate.padded_sample_layout(choosers, alternatives)
+
+    np.testing.assert_array_equal(chooser_rows, [0, 0, 1, 2, 2, 2])
+    np.testing.assert_array_equal(sample_columns, [0, 1, 0, 0, 1, 2])
+    np.testing.assert_array_equal(first_row_offsets, [0, 2, 3])
+    np.testing.assert_array_equal(available, [[True, True, False],
+                                              [True, False, False],
+                                              [True, True, True]])
+
+
+def test_interaction_sample_simulate():
+
+    inject.add_injectable('settings', {'check_for_variability': False})
+
+    choosers = pd.DataFrame({'income': [10, 20, 30], 'TAZ': [7, 7, 7]},
+                            index=pd.Index([3, 5, 8], name='person_id'))
+    # one alternative is so much better than the others for each chooser that choices are deterministic
+    alternatives = pd.DataFrame({'TAZ': [1, 4, 2, 1, 5, 6],
+                                 'size_term': [1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
+                                 'pick_count': [1, 2, 3, 1, 1, 1]},
+                                index=pd.Index([3, 3, 5, 8, 8, 8], name='person_id'))
+    spec = pd.DataFrame({'coefficient': [100.0, 1.0]},
+                        index=['@(df.TAZ == 4) | (df.TAZ == 6) | (df.income == 20)',
+                               '@np.log(df.size_term) + df.TAZ_chooser * 0'])
+
+    choices = interaction_sample_simulate.interaction_sample_simulate(
+        choosers, alternatives, spec, choice_column='TAZ', want_logsums=True, trace_label='test')
+
+    pdt.assert_series_equal(choices.choice, pd.Series([4, 2, 6], index=choosers.index), check_names=False)
+    np.testing.assert_allclose(choices.logsum, [np.log(np.exp(0) + np.exp(100)), 100,
+                                                np.log(2 * np.exp(0) + np.exp(100))])
@@ -4,6 +4,7 @@
 import os.path
 
 import numpy as np
+import numpy.testing as npt
 import pandas as pd
 
 import pandas.testing as pdt
@@ -107,6 +108,43 @@ def test_make_choices_real_probs(utilities):
         pd.Series([1, 2], index=[0, 1]))
 
 
+def test_utils_to_probs_float32():
+
+    utils = pd.DataFrame([[100, 101, 99], [1, 2, 3], [-999, 0, -999]], dtype=np.float64)
+
+    probs = logit.utils_to_probs(utils.astype(np.float32))
+    assert (probs.dtypes == np.float32).all()
+    npt.assert_allclose(probs.values, logit.utils_to_probs(utils).values, atol=1e-6)
+
+    logsums = logit.utils_to_logsums(utils.astype(np.float32))
+    npt.assert_allclose(logsums.values, logit.utils_to_logsums(utils).values, rtol=1e-6)
+
+    # float32 exp of all these utilities underflows to zero unless shifted
+    utils = pd.DataFrame([[-200, -201, -199], [-999, -1000, -999]], dtype=np.float64)
+
+    probs = logit.utils_to_probs(utils.astype(np.float32), allow_zero_probs=True)
+    npt.assert_allclose(probs.values, logit.utils_to_probs(utils, allow_zero_probs=True).values, atol=1e-6)
+    assert (probs.values[1] == 0).all()
+
+    logsums = logit.utils_to_logsums(utils.astype(np.float32))
+    npt.assert_allclose(logsums.values[0], logit.utils_to_logsums(utils).values[0], rtol=1e-6)
+
+
+def test_scaled_rands():
+
+    rands = np.array([[0.5], [0.9999999]])
+
+    # float64 rands are not changed
+    cum_probs = np.array([[0.5, 1.0], [0.25, 1.0]])
+    assert logit.scaled_rands(rands, cum_probs) is rands
+
+    # float32 cum probs that sum to less than a rand
+    cum_probs = np.array([[0.5, 0.9999998], [0.25, 0.9999998]], dtype=np.float32)
+    scaled = logit.scaled_rands(rands, cum_probs)
+    assert (scaled < cum_probs[:, -1:]).all()
+    npt.assert_array_almost_equal(scaled, rands)
+
+
 @pytest.fixture(scope='module')
 def interaction_choosers():
     return pd.DataFrame({
@@ -109,3 +109,113 @@ def test_channel():
     npt.assert_almost_equal(np.asanyarray(rands).flatten(), test1_expected_rands2)
 
     rng.end_step('test_step')
+
+
+def test_counter_channel():
+
+    rng = random.Random()
+    rng.set_channel_type(random.COUNTER_CHANNEL)
+
+    households = pd.DataFrame({
+        "data": np.arange(1000),
+    }, index=np.arange(1000) * 7 + 3)
+    households.index.name = 'household_id'
+
+    rng.begin_step('test_step')
+    rng.add_channel('households', households)
+
+    rands = rng.random_for_df(households, n=2)
+    assert rands.shape == (1000, 2)
+    assert ((rands >= 0) & (rands < 1)).all()
+    assert abs(rands.mean() - 0.5) < 0.02
+
+    rands2 = rng.random_for_df(households)
+
+    subset = households.iloc[[500, 3, 999]]
+    choices = rng.choice_for_df(subset, [1, 2, 3, 4], 4, replace=False)
+    for row_choices in choices.reshape(3, 4):
+        assert sorted(row_choices) == [1, 2, 3, 4]
+
+    normals = rng.normal_for_df(households, mu=1, sigma=2)
+    assert abs(normals.mean() - 1) < 0.2 and abs(normals.std() - 2) < 0.2
+
+    rng.end_step('test_step')
+
+    # same step name repeats the same streams, which do not depend on the other rows in df
+    rng.begin_step('test_step')
+    npt.assert_array_equal(rng.random_for_df(subset, n=2), rands[[500, 3, 999]])
+    npt.assert_array_equal(rng.random_for_df(households.iloc[:3], n=3)[:, 2], rands2[:3, 0])
+    rng.end_step('test_step')
+
+    with pytest.raises(RuntimeError) as excinfo:
+        rng.set_channel_type(random.SIMPLE_CHANNEL)
+    assert "call set_channel_type before the first step" in str(excinfo.value)
+
+
+def test_row_states():
+
+    row_states = random.RowStates([10, 30, 20])
+    npt.assert_array_equal(row_states.positions([20, 10]), [2, 0])
+    assert row_states.index_mode == random.DENSE_INDEX
+
+    # extend in place
+    row_states.extend([5, 40])
+    assert row_states.index_mode == random.DENSE_INDEX
+    npt.assert_array_equal(row_states.ids, [10, 30, 20, 5, 40])
+    npt.assert_array_equal(row_states.positions([40, 5, 30]), [4, 3, 1])
+
+    row_states.offset[row_states.positions([5, 30])] += 3
+    npt.assert_array_equal(row_states.offset, [0, 3, 0, 3, 0])
+
+    # very sparse ids switch to sorted index
+    row_states.extend([10**12, -7])
+    npt.assert_array_equal(row_states.positions([-7, 10**12, 20]), [6, 5, 2])
+    assert row_states.index_mode == random.SORTED_INDEX
+    npt.assert_array_equal(row_states.offset, [0, 3, 0, 3, 0, 0, 0])
+
+    npt.assert_array_equal(row_states.positions([11, 20], missing_ok=True), [random.NOT_IN_DOMAIN, 2])
+    with pytest.raises(RuntimeError) as excinfo:
+        row_states.positions([11, 20])
+    assert "not in random channel domain" in str(excinfo.value)
+
+    # ids must be new
+    with pytest.raises(AssertionError):
+        row_states.extend([30])
+
+
+def test_bulk_choice():
+
+    households = pd.DataFrame({
+        "data": np.arange(100),
+    }, index=np.arange(100) + 1)
+    households.index.name = 'household_id'
+    subset = households.iloc[[70, 2, 31]]
+
+    alts = np.array([10, 20, 30, 40, 50, 60])
+
+    rng = random.Random()
+    rng.set_bulk_choice(True)
+    rng.add_channel('households', households)
+
+    rng.begin_step('test_step')
+    choices = rng.choice_for_df(households, alts, 4, replace=False).reshape(100, 4)
+    for row_choices in choices:
+        assert len(set(row_choices)) == 4 and set(row_choices) <= set(alts)
+    # all alts were chosen first about equally often
+    assert (np.unique(choices[:, 0], return_counts=True)[1] > 5).all()
+
+    # choices are made from the row rands, which are advanced by the number of alts
+    rands = rng.random_for_df(households, n=len(alts))
+    rng.end_step('test_step')
+
+    # same choices and rands for a subset of rows, and per-row path still available
+    rng.begin_step('test_step')
+    npt.assert_array_equal(rng.choice_for_df(subset, alts, 4, replace=False).reshape(3, 4),
+                           choices[[70, 2, 31]])
+    npt.assert_array_equal(
+        alts[np.argsort(rands[[70, 2, 31]], axis=1)[:, :2]].flatten(),
+        rng.choice_for_df(subset, alts, 2, replace=False, bulk=True))
+
+    per_row_choices = rng.choice_for_df(subset, alts, 2, replace=True, bulk=False)
+    assert len(per_row_choices) == 6 and set(per_row_choices) <= set(alts)
+    rng.end_step('test_step')
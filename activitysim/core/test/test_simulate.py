@@ -10,6 +10,7 @@ import pandas.testing as pdt
 import pytest
 
 from .. import inject
+from .. import orca
 
 from .. import simulate
 
@@ -87,3 +88,209 @@ def test_simple_simulate_chunked(data, spec):
     choices = simulate.simple_simulate(choosers=data, spec=spec, nest_spec=None, chunk_size=2)
     expected = pd.Series([1, 1, 1], index=data.index)
     pdt.assert_series_equal(choices, expected)
+
+
+def test_eval_utilities_sparse(data):
+
+    inject.add_injectable("settings", {'check_for_variability': False})
+
+    coefficients = np.zeros((4, 12))
+    coefficients[0, 0] = 1.5
+    coefficients[1, 3] = -2
+    coefficients[1, 11] = 0.5
+    coefficients[3, 7] = 4
+
+    # expression with all zero coefficients is not evaluated
+    spec = pd.DataFrame(coefficients,
+                        index=['thing1 == 1', 'thing2', '@no_such_variable', '@df.thing1 * 2'],
+                        columns=['alt%s' % i for i in range(12)])
+
+    utilities = simulate.eval_utilities(spec, data, trace_label='test_sparse')
+
+    expression_values = np.array([
+        data.thing1 == 1,
+        data.thing2,
+        np.zeros(len(data)),
+        data.thing1 * 2])
+    npt.assert_array_almost_equal(simulate.sparse_utilities(expression_values, coefficients),
+                                  np.dot(expression_values.T, coefficients))
+    npt.assert_array_almost_equal(simulate.masked_utilities(expression_values, coefficients, coefficients != 0),
+                                  np.dot(expression_values.T, coefficients))
+    npt.assert_array_almost_equal(utilities.values, np.dot(expression_values.T, coefficients))
+    assert list(utilities.columns) == list(spec.columns)
+
+
+@pytest.mark.parametrize("num_alts", [2, 12])
+def test_eval_utilities_zero_coefficient_nan(data, num_alts, monkeypatch):
+
+    inject.add_injectable("settings", {'check_for_variability': False})
+
+    # trace household 2 (restoring injectables after test)
+    monkeypatch.setitem(orca._INJECTABLES, 'output_dir', os.path.join(os.path.dirname(__file__), 'output'))
+    monkeypatch.setitem(orca._INJECTABLES, 'traceable_table_indexes', {'household_id': 'households'})
+    monkeypatch.setitem(orca._INJECTABLES, 'traceable_table_ids', {'households': [2]})
+    data = data.assign(household_id=[1, 2, 3])
+
+    # (dense product for 2 alternatives and sparse product for 12)
+    coefficients = np.zeros((3, num_alts))
+    coefficients[0, 0] = 1.5
+    coefficients[1, 1] = -2
+    spec = pd.DataFrame(coefficients,
+                        index=['thing1', '@np.where(df.thing1 == 1, np.nan, df.thing2)', '@np.log(df.thing1 - 1)'],
+                        columns=['alt%s' % i for i in range(num_alts)])
+
+    expected = np.zeros((len(data), num_alts))
+    expected[:, 0] = 1.5 * data.thing1
+    expected[:, 1] = -2 * data.thing2
+    expected[0, 1] = np.nan
+
+    # nan values of expressions with zero coefficients don't affect utilities of traced runs
+    for have_trace_targets in [False, True]:
+        utilities = simulate.eval_utilities(spec, data, trace_label='test_nan',
+                                            have_trace_targets=have_trace_targets)
+        npt.assert_array_equal(utilities.values, expected)
+
+
+def test_utility_dtype(data, spec):
+
+    inject.add_injectable("settings", {'check_for_variability': False})
+
+    expected_utilities = simulate.eval_utilities(spec, data)
+    assert (expected_utilities.dtypes == np.float64).all()
+
+    simulate.set_utility_dtype('float32')
+    try:
+        utilities = simulate.eval_utilities(spec, data)
+        assert (utilities.dtypes == np.float32).all()
+        npt.assert_allclose(utilities.values, expected_utilities.values, rtol=1e-6)
+
+        choices = simulate.simple_simulate(choosers=data, spec=spec, nest_spec=None)
+        pdt.assert_series_equal(choices, pd.Series([1, 1, 1], index=data.index))
+    finally:
+        simulate.set_utility_dtype('float64')
+
+    with pytest.raises(RuntimeError, match='utility_dtype'):
+        simulate.set_utility_dtype('float16')
+
+
+def test_dedupe_choosers(spec):
+
+    prng = np.random.RandomState(0)
+    choosers = pd.DataFrame({
+        'thing1': prng.randint(1, 4, 100),
+        'thing2': prng.randint(1, 8, 100),
+        'unused': np.arange(100)})
+    spec = spec / 10
+
+    assert simulate.spec_chooser_columns(spec, choosers, None) == ['thing1', 'thing2']
+    assert simulate.spec_chooser_columns(spec, choosers, {'df': None}) == ['thing1', 'thing2']
+
+    nest_spec = {'name': 'root', 'coefficient': 1.0,
+                 'alternatives': [{'name': 'nest', 'coefficient': 0.5, 'alternatives': ['alt0', 'alt1']}]}
+
+    inject.add_injectable("settings", {'check_for_variability': False})
+
+    results = {}
+    for dedupe in [False, True]:
+        simulate.set_dedupe_choosers(dedupe)
+        try:
+            unique_choosers, inverse = simulate.dedupe_choosers(choosers, spec, None, 'test')
+            if dedupe:
+                assert len(unique_choosers) == len(choosers[['thing1', 'thing2']].drop_duplicates())
+                pdt.assert_frame_equal(
+                    unique_choosers.iloc[inverse][['thing1', 'thing2']].reset_index(drop=True),
+                    choosers[['thing1', 'thing2']])
+            else:
+                assert inverse is None
+
+            results[dedupe] = (
+                simulate.simple_simulate(choosers=choosers, spec=spec, nest_spec=None),
+                simulate.simple_simulate(choosers=choosers, spec=spec, nest_spec=nest_spec, want_logsums=True,
+                                         trace_label='test_dedupe'))
+        finally:
+            simulate.set_dedupe_choosers(False)
+
+    pdt.assert_series_equal(results[True][0], results[False][0])
+    pdt.assert_frame_equal(results[True][1], results[False][1])
+
+
+def test_spec_chooser_columns_undetermined(data):
+
+    spec = pd.DataFrame({'alt0': [1.0, 0.0], 'alt1': [2.0, 0.0]}, index=['thing1', '@len(df)'])
+
+    # expression with all zero coefficients is ignored
+    assert simulate.spec_chooser_columns(spec, data, None) == ['thing1']
+
+    spec.iloc[1] = 1.0
+    assert simulate.spec_chooser_columns(spec, data, None) is None
+
+    spec.index = ['thing1', '@df.index']
+    assert simulate.spec_chooser_columns(spec, data, None) is None
+
+    # locals that are modules, functions, or scalar constants don't depend on choosers
+    spec.index = ['thing1', '@np.log1p(df.thing2) * scale + abs(offset)']
+    assert simulate.spec_chooser_columns(spec, data, {'scale': 2.0, 'offset': np.float32(-1)}) == \
+        ['thing1', 'thing2']
+
+    # but other locals (like a series aligned with choosers) might
+    spec.index = ['thing1', '@df.thing2 * weight']
+    assert simulate.spec_chooser_columns(spec, data, {'weight': 2}) == ['thing1', 'thing2']
+    assert simulate.spec_chooser_columns(spec, data, {'weight': pd.Series([1, 2, 3], index=data.index)}) is None
+    assert simulate.spec_chooser_columns(spec, data, None) is None
+
+    spec.index = ['thing1', '@rng.random_for_df(df).flatten() * df.thing2']
+    assert simulate.spec_chooser_columns(spec, data, None) is None
+
+
+def test_dedupe_choosers_chooser_aligned_local():
+
+    prng = np.random.RandomState(0)
+    choosers = pd.DataFrame({'thing1': prng.randint(1, 4, 100)})
+    locals_d = {'weight': pd.Series(prng.random_sample(100), index=choosers.index)}
+
+    spec = pd.DataFrame({'alt0': [1.0, 0.0], 'alt1': [0.0, 1.0]}, index=['thing1', '@df.thing1 * weight'])
+
+    inject.add_injectable("settings", {'check_for_variability': False})
+    expected = simulate.simple_simulate(choosers, spec, nest_spec=None, locals_d=locals_d)
+
+    # choosers with the same thing1 have different utilities, so they aren't deduped
+    simulate.set_dedupe_choosers(True)
+    try:
+        unique_choosers, inverse = simulate.dedupe_choosers(choosers, spec, locals_d, 'test')
+        assert unique_choosers is choosers and inverse is None
+
+        choices = simulate.simple_simulate(choosers, spec, nest_spec=None, locals_d=locals_d)
+    finally:
+        simulate.set_dedupe_choosers(False)
+    pdt.assert_series_equal(choices, expected)
+
+
+def test_expression_threads(data, spec, monkeypatch):
+
+    inject.add_injectable("settings", {'check_for_variability': False})
+
+    spec = pd.concat([spec] * 4)
+    expected_utilities = simulate.eval_utilities(spec, data)
+
+    monkeypatch.setattr(simulate.os, 'cpu_count', lambda: 8)
+
+    # limited to cpus available to each of num_processes
+    simulate.set_expression_threads(0, num_processes=3)
+    assert simulate.expression_threads() == 2
+    simulate.set_expression_threads(16, num_processes=16)
+    assert simulate.expression_threads() == 1
+
+    simulate.set_expression_threads(4)
+    try:
+        assert simulate.expression_threads() == 4
+        pdt.assert_frame_equal(simulate.eval_utilities(spec, data), expected_utilities)
+
+        # exception of failed expression is raised by eval_utilities
+        spec.index = ['thing1', 'no_such_column'] + list(spec.index[2:])
+        with pytest.raises(Exception):
+            simulate.eval_utilities(spec, data)
+    finally:
+        simulate.set_expression_threads(1)
+
+    with pytest.raises(RuntimeError, match='expression_threads'):
+        simulate.set_expression_threads(-1)
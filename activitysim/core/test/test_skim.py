@@ -8,6 +8,7 @@ import pandas.testing as pdt
 import pytest
 
 from .. import skim
+from ..util import assign_in_place
 
 
 @pytest.fixture
@@ -58,16 +59,50 @@ def test_offset_list(data):
         [52, 99, 16])
 
 
-# fixme - nan support disabled in skim.py (not sure we need it?)
-# def test_skim_nans(data):
-#     sk = skim.SkimWrapper(data)
-#
-#     orig = [5, np.nan, 1, 2]
-#     dest = [np.nan, 9, 6, 4]
-#
-#     npt.assert_array_equal(
-#         sk.get(orig, dest),
-#         [np.nan, np.nan, 16, 24])
+@pytest.mark.parametrize("mode", skim.OFFSET_LIST_MODES)
+def test_offset_list_modes(data, mode):
+
+    zone_ids = [100, 20, 3000, 40, 5, 60, 700, 80, 9, 1]
+
+    offset_mapper = skim.OffsetMapper()
+    offset_mapper.set_offset_list(zone_ids, mode=mode)
+    assert offset_mapper.offset_mode == mode
+
+    npt.assert_array_equal(offset_mapper.map(np.array([3000, 1, 100, 21, -5, 5000])), [2, 9, 0, -1, -1, -1])
+
+    sk = skim.SkimWrapper(data, offset_mapper)
+
+    orig = [60, 1, 20, 21]
+    dest = [3000, 1, 700, 20]
+
+    npt.assert_array_equal(
+        sk.get(orig, dest),
+        [52, 99, 16, np.nan])
+
+
+def test_offset_list_mode_choice():
+
+    offset_mapper = skim.OffsetMapper()
+    offset_mapper.set_offset_list([10, 20, 30, 40])
+    assert offset_mapper.offset_mode == skim.DENSE
+
+    # very sparse zone ids
+    offset_mapper = skim.OffsetMapper()
+    offset_mapper.set_offset_list([10, 20, 30, 10**12])
+    assert offset_mapper.offset_mode == skim.SORTED
+
+
+def test_skim_not_in_skim(data):
+
+    sk = skim.SkimWrapper(data, skim.OffsetMapper(-1))
+
+    # zone ids 0 and 11 are not in 1-based 10 zone skim
+    orig = [6, 0, 2, 11]
+    dest = [3, 10, 7, 1]
+
+    npt.assert_array_equal(
+        sk.get(orig, dest),
+        [52, np.nan, 16, np.nan])
 
 
 def test_skims(data):
@@ -144,3 +179,151 @@ def test_3dskims(data):
         ),
         check_dtype=False
     )
+
+
+def test_skim_major_layout(data):
+
+    skim_data = np.zeros((2,) + data.shape, dtype=int)
+    skim_data[0] = data
+    skim_data[1] = data*10
+
+    skim_info = {
+        'layout': skim.SKIM_MAJOR,
+        'block_offsets': {('SOV', 'AM'): (0, 0), ('SOV', 'PM'): (0, 1)},
+        'key1_block_offsets': {'SOV': (0, 0)}
+    }
+    skim_dict = skim.SkimDict([skim_data], skim_info)
+
+    # each skim should be a contiguous view into its block
+    assert skim_dict.get(('SOV', 'PM')).data.flags['C_CONTIGUOUS']
+
+    skims = skim_dict.wrap("taz_l", "taz_r")
+    skims3d = skim.SkimStack(skim_dict).wrap(left_key="taz_l", right_key="taz_r", skim_key="period")
+
+    df = pd.DataFrame({
+        "taz_l": [1, 9, 4],
+        "taz_r": [2, 3, 7],
+        "period": ["AM", "PM", "AM"]
+    })
+
+    skims.set_df(df)
+    skims3d.set_df(df)
+
+    npt.assert_array_equal(skims[('SOV', 'PM')].values, [120, 930, 470])
+    npt.assert_array_equal(skims3d["SOV"].values, [12, 930, 47])
+
+
+def test_skipped_skim_key(data):
+
+    skim_data = np.zeros(data.shape + (1,), dtype=int)
+
+    skim_info = {
+        'block_offsets': {('SOV', 'AM'): (0, 0)},
+        'key1_block_offsets': {'SOV': (0, 0)},
+        'skipped_keys': {'HOV'}
+    }
+    skim_dict = skim.SkimDict([skim_data], skim_info)
+
+    with pytest.raises(KeyError, match='load_only_used_skims'):
+        skim_dict.get(('HOV', 'AM'))
+
+    with pytest.raises(KeyError, match='not in skim_dict'):
+        skim_dict.get('DIST')
+
+    with pytest.raises(KeyError, match='load_only_used_skims'):
+        skim.SkimStack(skim_dict).lookup([1], [2], ['AM'], 'HOV')
+
+
+@pytest.mark.parametrize("layout", skim.SKIM_LAYOUTS)
+def test_lookup_many(data, layout):
+
+    if layout == skim.SKIM_MAJOR:
+        skim_data = np.stack([data, data*10, data*100])
+    else:
+        skim_data = np.stack([data, data*10, data*100], axis=2)
+
+    skim_info = {
+        'layout': layout,
+        'block_offsets': {'DIST': (0, 0), ('SOV', 'AM'): (0, 1), ('SOV', 'PM'): (0, 2)},
+        'key1_block_offsets': {'DIST': (0, 0), 'SOV': (0, 1)}
+    }
+    skim_dict = skim.SkimDict([skim_data], skim_info)
+    skim_dict.offset_mapper.set_offset_int(-1)
+
+    skims = skim_dict.wrap("taz_l", "taz_r")
+    skims3d = skim.SkimStack(skim_dict).wrap(left_key="taz_l", right_key="taz_r", skim_key="period")
+
+    df = pd.DataFrame({
+        "taz_l": [2, 10, 5, 11],
+        "taz_r": [3, 4, 8, 1],
+        "period": ["AM", "PM", "AM", "PM"]
+    }, index=[7, 8, 9, 10])
+
+    skims.set_df(df)
+    skims3d.set_df(df)
+
+    values = skims.lookup_many(['DIST', ('SOV', 'PM')])
+    assert list(values.columns) == ['DIST', ('SOV', 'PM')]
+    npt.assert_array_equal(values.index, df.index)
+    npt.assert_array_equal(values['DIST'], [12, 93, 47, np.nan])
+    npt.assert_array_equal(values[('SOV', 'PM')], [1200, 9300, 4700, np.nan])
+
+    # single key lookups agree with lookup_many
+    npt.assert_array_equal(skims['DIST'], values['DIST'])
+    npt.assert_array_equal(skims.reverse('DIST'), [21, 39, 74, np.nan])
+
+    values = skims3d.lookup_many(['SOV'])
+    npt.assert_array_equal(values['SOV'], [120, 9300, 470, np.nan])
+    npt.assert_array_equal(skims3d['SOV'], values['SOV'])
+
+    # offsets are remapped when key columns of df are reassigned
+    df['taz_r'] = [4, 3, 8, 1]
+    df['period'] = ['PM', 'PM', 'AM', 'PM']
+    npt.assert_array_equal(skims['DIST'], [13, 92, 47, np.nan])
+    npt.assert_array_equal(skims3d['SOV'], [1300, 9200, 470, np.nan])
+
+    # offsets are remapped when assign_in_place updates key columns of df
+    assign_in_place(df, pd.DataFrame({'taz_r': [4], 'period': ['AM']}, index=[8]))
+    npt.assert_array_equal(skims['DIST'], [13, 93, 47, np.nan])
+    npt.assert_array_equal(skims3d['SOV'], [1300, 930, 470, np.nan])
+
+    # offsets are remapped for new df
+    skims.set_df(df.iloc[:2])
+    npt.assert_array_equal(skims['DIST'], [13, 93])
+
+
+def test_skim_stack_dim3_codes(data):
+
+    skim_data = np.stack([data, data*10, data*100], axis=2)
+
+    skim_info = {
+        'block_offsets': {('SOV', 'AM'): (0, 0), ('SOV', 'PM'): (0, 1), ('HOV', 'AM'): (0, 2)},
+        'key1_block_offsets': {'SOV': (0, 0), 'HOV': (0, 2)}
+    }
+    skim_dict = skim.SkimDict([skim_data], skim_info)
+
+    stack = skim.SkimStack(skim_dict, dim3_labels=['EA', 'AM', 'PM'])
+    assert stack.dim3_labels == ['EA', 'AM', 'PM']
+    npt.assert_array_equal(stack.code_offsets['SOV'], [-1, 0, 1])
+
+    orig = [1, 9, 4]
+    dest = [2, 3, 7]
+    labels = ['AM', 'PM', 'AM']
+
+    # labels, categorical labels, and integer codes are equivalent
+    categorical = pd.Series(pd.Categorical(labels, categories=['PM', 'AM']))
+    for dim3 in [labels, np.array(labels, dtype=object), categorical, np.array([1, 2, 1])]:
+        npt.assert_array_equal(stack.lookup(orig, dest, dim3, 'SOV'), [12, 930, 47])
+
+    with pytest.raises(KeyError, match=r"\('HOV', 'PM'\)"):
+        stack.lookup(orig, dest, labels, 'HOV')
+
+    # unknown and nan labels (and codes out of range) don't index the offsets of the last label
+    with pytest.raises(KeyError, match=r"\['XX'\] not in SkimStack dim3_labels"):
+        stack.lookup(orig, dest, ['AM', 'XX', 'AM'], 'SOV')
+    with pytest.raises(KeyError, match=r"\[nan\] not in SkimStack dim3_labels"):
+        stack.lookup(orig, dest, pd.Series(['AM', np.nan, 'AM']), 'SOV')
+    with pytest.raises(KeyError, match=r"\[nan\] not in SkimStack dim3_labels"):
+        stack.lookup(orig, dest, pd.Series(pd.Categorical(['AM', None, 'PM'])), 'SOV')
+    with pytest.raises(KeyError, match=r"codes \[-1\] not in range"):
+        stack.lookup(orig, dest, np.array([1, -1, 1]), 'SOV')
@@ -0,0 +1,265 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from .. import inject
+from .. import logit
+from .. import simulate
+from .. import skim
+from .. import spec_columns
+from ..interaction_simulate import eval_interaction_utilities
+from ..interaction_simulate import eval_broadcast_interaction_utilities
+
+
+def teardown_function(func):
+    spec_columns.set_enabled(False)
+    inject.clear_cache()
+    inject.reinject_decorated_tables()
+
+
+@pytest.fixture
+def skim_dict():
+    skim_data = np.arange(100, dtype=float).reshape((10, 10, 1))
+    skim_info = {'block_offsets': {'DIST': (0, 0)}}
+    skim_dict = skim.SkimDict([skim_data], skim_info)
+    skim_dict.offset_mapper.set_offset_int(-1)
+    return skim_dict
+
+
+@pytest.fixture
+def choosers():
+    return pd.DataFrame({
+        'TAZ': [1, 5, 9],
+        'income': [10, 50, 90],
+        'age': [20, 40, 60],
+        'unused': ['a', 'b', 'c']},
+        index=pd.Index([7, 8, 9], name='person_id'))
+
+
+@pytest.fixture
+def alternatives():
+    return pd.DataFrame({
+        'size_term': [1.0, 2.0, 3.0, 4.0],
+        'income': [1, 2, 3, 4],
+        'unused_alt': [0, 0, 0, 0]},
+        index=pd.Index([2, 4, 6, 8], name='TAZ'))
+
+
+def test_expression_columns():
+
+    assert spec_columns.expression_columns('income > 10') == ({'income'}, set())
+    assert spec_columns.expression_columns('@df.income * rate') == ({'income'}, {'rate'})
+    assert spec_columns.expression_columns('_inc@df.income', allow_temps=True) == ({'income'}, set())
+
+    # untranslated pandas expressions reference (a superset of) their names
+    columns, _ = spec_columns.expression_columns('income.between(1, 5)')
+    assert 'income' in columns
+
+    # df[name] is a column if name is a str local
+    assert spec_columns.expression_columns('@df[dest_col_name]')[0] is None
+    assert spec_columns.expression_columns('@df[dest_col_name]', {'dest_col_name': 'TAZ'})[0] == {'TAZ'}
+
+    # random channel methods only use df index
+    columns, _ = spec_columns.expression_columns('@rng.lognormal_for_df(df, mu=1, sigma=1) * df.age')
+    assert columns == {'age'}
+
+    assert spec_columns.expression_columns('@df.loc[df.age > 1]')[0] is None
+
+    # presence test
+    assert spec_columns.expression_columns("@df.age if 'age' in df.columns else 0")[0] == {'age'}
+
+
+def test_spec_columns(skim_dict):
+
+    skims = skim_dict.wrap('orig', 'dest')
+
+    spec = pd.DataFrame({'coefficient': [1.0, 0.0, 2.0]},
+                        index=pd.Index(['income', 'age', '@skims["DIST"]'], name='Expression'))
+
+    # all zero coefficient row is ignored and skims are keyed on orig and dest
+    assert spec_columns.spec_columns(spec, {'skims': skims}) == {'income', 'orig', 'dest'}
+    assert spec_columns.spec_columns(spec, None, skims=[skims]) == {'income', 'orig', 'dest'}
+
+    spec.index = pd.Index(['income', 'age', '@len(df)'], name='Expression')
+    assert spec_columns.spec_columns(spec) is None
+
+
+def test_assignment_columns():
+
+    assignment_spec = pd.DataFrame({
+        'target': ['_TEMP', 'income_k', 'rich'],
+        'expression': ['1000', 'persons.income / _TEMP', 'income_k > 50']})
+
+    columns, targets = spec_columns.assignment_columns(assignment_spec, df_names=['df', 'persons'])
+    assert columns == {'income'}
+    assert targets == {'income_k', 'rich'}
+
+
+def test_interaction_columns(choosers, alternatives, skim_dict):
+
+    skims = skim_dict.wrap('TAZ_chooser', 'TAZ')
+
+    spec = pd.DataFrame({'coefficient': [1.0, 1.0, 1.0]},
+                        index=['@np.log1p(df.size_term)', 'income_chooser * 2', '@skims["DIST"]'])
+
+    # TAZ and income columns of choosers are suffixed since alternatives have them too
+    chooser_columns, alt_columns = \
+        spec_columns.interaction_columns(spec, choosers, alternatives, {'skims': skims}, skims)
+    assert chooser_columns == ['TAZ', 'income']
+    assert alt_columns == ['size_term', 'income']
+
+    # income refers to alternatives income, so chooser income isn't needed
+    spec.index = ['@np.log1p(df.size_term)', 'income * 2', 'age']
+    chooser_columns, alt_columns = spec_columns.interaction_columns(spec, choosers, alternatives)
+    assert chooser_columns == ['age']
+    assert alt_columns == ['size_term', 'income']
+
+
+def test_prune_interaction_tables(choosers, alternatives):
+
+    inject.add_injectable("settings", {'check_for_variability': False})
+
+    spec = pd.DataFrame({'coefficient': [1.0, 0.5, 2.0]},
+                        index=['@np.log1p(df.size_term)', 'income_chooser * 2', 'age > 30'])
+
+    expected, _ = eval_interaction_utilities(spec, logit.interaction_dataset(choosers, alternatives),
+                                             None, 'test', None)
+
+    # not pruned unless enabled
+    pruned_choosers, pruned_alts = \
+        spec_columns.prune_interaction_tables(choosers, alternatives, spec, None, None, 'test')
+    assert pruned_choosers is choosers and pruned_alts is alternatives
+
+    spec_columns.set_enabled(True)
+    pruned_choosers, pruned_alts = \
+        spec_columns.prune_interaction_tables(choosers, alternatives, spec, None, None, 'test')
+
+    assert list(pruned_choosers.columns) == ['income', 'age']
+    assert list(pruned_alts.columns) == ['size_term', 'income']
+
+    utilities, _ = eval_interaction_utilities(spec, logit.interaction_dataset(pruned_choosers, pruned_alts),
+                                              None, 'test', None)
+    pdt.assert_frame_equal(utilities, expected)
+
+
+def broadcast_spec():
+    return pd.DataFrame({'coefficient': [1.0, 1.0, 0.5, 2.0, -0.1, 0.0, 1.5, 0.2]},
+                        index=['_DIST@skims["DIST"]',
+                               '@np.log1p(df.size_term)',
+                               'income_chooser * 2',
+                               'age > 30',
+                               '@_DIST * df.age',
+                               '@df.unused_alt',
+                               '@_DIST.clip(0, 20)',
+                               '@df.income * df.income_chooser'])
+
+
+def test_interaction_expression_sides(choosers, alternatives, skim_dict):
+
+    skims = skim_dict.wrap('TAZ_chooser', 'TAZ')
+
+    sides = spec_columns.interaction_expression_sides(broadcast_spec(), choosers, alternatives,
+                                                      {'skims': skims}, skims)
+    assert sides == ['interaction', 'alternatives', 'choosers', 'choosers', 'interaction', None, 'interaction',
+                     'interaction']
+
+    # temps are on the side of the expression that assigns them
+    spec = pd.DataFrame({'coefficient': [1.0, 1.0, 1.0]}, index=['_AGE@df.age * 2', '@_AGE + 1', '@1'])
+    assert spec_columns.interaction_expression_sides(spec, choosers, alternatives) == \
+        ['choosers', 'choosers', 'alternatives']
+
+    # interaction dataset index
+    spec.index = ['@rng.random_for_df(df)', 'age', '@len(df)']
+    assert spec_columns.interaction_expression_sides(spec.iloc[:2], choosers, alternatives) == \
+        ['interaction', 'choosers']
+    assert spec_columns.interaction_expression_sides(spec, choosers, alternatives) is None
+
+
+def test_eval_broadcast_interaction_utilities(choosers, alternatives, skim_dict):
+
+    inject.add_injectable("settings", {'check_for_variability': True})
+
+    spec = broadcast_spec()
+
+    skims = skim_dict.wrap('TAZ_chooser', 'TAZ')
+    locals_d = {'skims': skims}
+    alternatives['TAZ'] = alternatives.index
+
+    interaction_df = logit.interaction_dataset(choosers, alternatives)
+    skims.set_df(interaction_df)
+    expected, _ = eval_interaction_utilities(spec, interaction_df, locals_d, 'test', None)
+    expected = expected.utility.values.reshape(len(choosers), len(alternatives))
+
+    sides = spec_columns.interaction_expression_sides(spec, choosers, alternatives, locals_d, skims)
+    utilities = eval_broadcast_interaction_utilities(spec, sides, choosers, alternatives, locals_d, skims, 'test')
+
+    assert utilities.shape == (len(choosers), len(alternatives))
+    pdt.assert_index_equal(utilities.index, choosers.index)
+    np.testing.assert_allclose(utilities.values, expected)
+
+    # without interaction terms
+    spec = spec.iloc[[1, 2, 3]]
+    sides = spec_columns.interaction_expression_sides(spec, choosers, alternatives)
+    assert spec_columns.INTERACTION_SIDE not in sides
+    utilities = eval_broadcast_interaction_utilities(spec, sides, choosers, alternatives, None, None, 'test')
+    expected, _ = eval_interaction_utilities(spec, logit.interaction_dataset(choosers, alternatives),
+                                             None, 'test', None)
+    np.testing.assert_allclose(utilities.values, expected.utility.values.reshape(len(choosers), len(alternatives)))
+
+
+def test_prune_choosers(choosers):
+
+    inject.add_injectable("settings", {'check_for_variability': False})
+
+    spec = pd.DataFrame({'alt0': [1.0, 0.0], 'alt1': [0.0, 0.02]}, index=['age > 30', 'income'])
+
+    expected = simulate.simple_simulate(choosers, spec, nest_spec=None)
+
+    spec_columns.set_enabled(True)
+    assert list(spec_columns.prune_choosers(choosers, spec, None, None, 'test').columns) == ['income', 'age']
+
+    pdt.assert_series_equal(simulate.simple_simulate(choosers, spec, nest_spec=None), expected)
+
+
+def test_report_column_list(caplog):
+
+    caplog.set_level(logging.INFO)
+
+    spec_columns.report_column_list('SIMULATE_CHOOSER_COLUMNS', ['income', 'unused'], {'income', 'age'},
+                                    ['income', 'age', 'unused'], 'test_report.chunk_0')
+
+    assert "missing columns referenced by spec: ['age']" in caplog.text
+    assert "columns not referenced by spec: ['unused']" in caplog.text
+    assert spec_columns.column_list_reported('SIMULATE_CHOOSER_COLUMNS', 'test_report.chunk_1')
+
+    # only reported once
+    caplog.clear()
+    spec_columns.report_column_list('SIMULATE_CHOOSER_COLUMNS', ['income', 'unused'], {'income', 'age'},
+                                    ['income', 'age', 'unused'], 'test_report.chunk_1')
+    assert caplog.text == ''
+
+
+def test_select_chooser_columns(choosers, alternatives, caplog):
+
+    caplog.set_level(logging.INFO)
+
+    spec = pd.DataFrame({'coefficient': [1.0, 1.0]}, index=['@np.log1p(df.size_term)', 'age > 30'])
+    model_settings = {'SIMULATE_CHOOSER_COLUMNS': ['age', 'unused']}
+
+    selected = spec_columns.select_chooser_columns(model_settings, choosers, alternatives, spec, None, None,
+                                                   'test_select.chunk_0')
+    pdt.assert_frame_equal(selected, choosers[['age', 'unused']])
+
+    # column list is only reported when pruning
+    assert caplog.text == ''
+    spec_columns.set_enabled(True)
+    selected = spec_columns.select_chooser_columns(model_settings, choosers, alternatives, spec, None, None,
+                                                   'test_select.chunk_0')
+    pdt.assert_frame_equal(selected, choosers[['age', 'unused']])
+    assert "columns not referenced by spec: ['unused']" in caplog.text
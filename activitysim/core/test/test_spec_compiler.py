@@ -0,0 +1,100 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+import numpy as np
+import pandas as pd
+import numpy.testing as npt
+import pandas.testing as pdt
+import pytest
+
+from .. import spec_compiler
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'income': [10, 20000, 45000, 80000, np.nan],
+        'age': [5, 17, 30, 65, 90],
+        'ptype': [4, 1, 2, 1, 3],
+        'female': [True, False, True, False, True],
+        'tour_type': ['work', 'school', 'work', 'shopping', 'othmaint'],
+    }, index=pd.Index([11, 12, 13, 14, 15], name='person_id'))
+
+
+def test_spec_expression_kind():
+
+    assert spec_compiler.spec_expression_kind('@df.age > 5') == spec_compiler.PYTHON_EXPRESSION
+    assert spec_compiler.spec_expression_kind('_DIST@od_skims["DIST"]') == spec_compiler.TEMP_EXPRESSION
+    assert spec_compiler.spec_expression_kind('_DIST@od_skims["DIST"]', allow_temps=False) == \
+        spec_compiler.PANDAS_EXPRESSION
+    assert spec_compiler.spec_expression_kind('age > 5') == spec_compiler.PANDAS_EXPRESSION
+
+
+@pytest.mark.parametrize("expr", [
+    'age',
+    'age > 17',
+    'income / 1000 + age * 2',
+    'age > 17 & ptype == 1',
+    '(age > 17) | female',
+    'age > 17 and not female',
+    '~female',
+    '18 <= age < 65',
+    'ptype in [1, 2]',
+    'ptype not in [1, 2]',
+    'tour_type == "work"',
+    'income > 30000 # (2)',
+])
+def test_eval_pandas(df, expr):
+
+    compiled = spec_compiler.compile_spec_expression(expr)
+    assert compiled.code is not None
+
+    npt.assert_array_equal(compiled.eval_pandas(df), df.eval(expr))
+
+
+def test_eval_pandas_fallback(df):
+
+    # index names are left to DataFrame.eval
+    compiled = spec_compiler.compile_spec_expression('person_id > 12')
+    pdt.assert_series_equal(compiled.eval_pandas(df), df.eval('person_id > 12'))
+    assert compiled.code is None
+
+    # as are expressions using DataFrame.eval features we don't translate
+    compiled = spec_compiler.compile_spec_expression('age > @threshold')
+    assert compiled.code is None
+
+
+def test_compile_cache():
+
+    spec_compiler.clear_cache()
+
+    compiled = spec_compiler.compile_spec_expression('@df.age * 2')
+    assert compiled is spec_compiler.compile_spec_expression('@df.age * 2')
+    assert compiled.eval_python({}, {'df': pd.DataFrame({'age': [1, 2]})}).tolist() == [2, 4]
+
+    compiled = spec_compiler.compile_spec_expression("_age@df.age")
+    assert compiled.kind == spec_compiler.TEMP_EXPRESSION
+    assert compiled.target == '_age'
+
+
+@pytest.mark.skipif(spec_compiler.numexpr is None, reason="numexpr not installed")
+def test_eval_pandas_into(df):
+
+    expression_values = np.zeros((3, len(df)))
+
+    compiled = spec_compiler.compile_spec_expression('18 <= age < 65 & ptype in [1, 2]')
+    assert compiled.numexpr_source == '(((18 <= age) & (age < 65)) & ((ptype == 1) | (ptype == 2)))'
+    compiled.eval_pandas_into(df, expression_values[0])
+
+    compiled = spec_compiler.compile_spec_expression('income / 1000 * ~female')
+    compiled.eval_pandas_into(df, expression_values[1])
+    assert compiled.numexpr_source is not None
+
+    # numexpr doesn't do strings
+    compiled = spec_compiler.compile_spec_expression('tour_type == "work"')
+    assert compiled.numexpr_source is None
+    compiled.eval_pandas_into(df, expression_values[2])
+
+    npt.assert_array_equal(expression_values[0], [0, 0, 1, 0, 0])
+    npt.assert_array_equal(expression_values[1], [0, 20, 0, 80, np.nan])
+    npt.assert_array_equal(expression_values[2], [1, 0, 1, 0, 0])
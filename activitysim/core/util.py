@@ -294,6 +294,11 @@ def assign_in_place(df, df2):
                     logger.warning("assign_in_place changed dtype %s of column %s to %s" %
                                    (old_dtype, c, df[c].dtype))
 
+        # df.update may have written into the existing column arrays, so give updated columns new arrays
+        # (caches keyed on column arrays, like skim wrapper offsets, would not notice an in-place update)
+        for c in common_columns:
+            df[c] = df[c].values.copy()
+
     # add new columns (in order they appear in df2)
     new_columns = [c for c in df2.columns if c not in df.columns]
 
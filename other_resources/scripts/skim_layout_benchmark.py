@@ -0,0 +1,76 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+# compare skim gather throughput for od_major (orig, dest, skim) and skim_major (skim, orig, dest) blocks
+#
+# python skim_layout_benchmark.py --zones 2900 --skims 100 --lookups 1000000 --repeat 5
+
+import argparse
+import time
+
+import numpy as np
+
+from activitysim.core import skim
+
+
+def build_skim_dict(layout, num_zones, num_skims):
+
+    if layout == skim.SKIM_MAJOR:
+        block_shape = (num_skims, num_zones, num_zones)
+    else:
+        block_shape = (num_zones, num_zones, num_skims)
+
+    block_data = np.random.random_sample(block_shape).astype(np.float32)
+
+    skim_info = {
+        'layout': layout,
+        'block_offsets': {'SKIM_%s' % i: (0, i) for i in range(num_skims)},
+    }
+
+    skim_dict = skim.SkimDict([block_data], skim_info)
+    skim_dict.offset_mapper.set_offset_int(-1)
+
+    return skim_dict
+
+
+def gather(skim_dict, keys, orig, dest):
+
+    for key in keys:
+        skim_dict.get(key).get(orig, dest)
+
+
+def run(args):
+
+    prng = np.random.RandomState(0)
+    orig = prng.randint(1, args.zones + 1, size=args.lookups)
+    dest = prng.randint(1, args.zones + 1, size=args.lookups)
+
+    keys = ['SKIM_%s' % i for i in range(args.skims)]
+
+    for layout in skim.SKIM_LAYOUTS:
+
+        skim_dict = build_skim_dict(layout, args.zones, args.skims)
+
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.time()
+            gather(skim_dict, keys, orig, dest)
+            timings.append(time.time() - t0)
+
+        best = min(timings)
+        print("%-10s zones %s skims %s lookups %s best of %s: %.3f secs (%.1f M gathers/sec)" %
+              (layout, args.zones, args.skims, args.lookups, args.repeat,
+               best, args.skims * args.lookups / best / 1e6))
+
+        del skim_dict
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--zones', type=int, default=1454, help='number of zones')
+    parser.add_argument('--skims', type=int, default=50, help='number of skims')
+    parser.add_argument('--lookups', type=int, default=1000000, help='number of od pairs per skim')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timing runs per layout')
+
+    run(parser.parse_args())
@@ -0,0 +1,115 @@
+# ActivitySim
+# See full license in LICENSE.txt.
+
+# run an example model with utility_dtype float64 and float32 and report how often choices differ
+#
+# python utility_dtype_validation.py --households 1000 --output validation
+#
+# Note that choices that differ early in the model cascade to the choosers and alternatives of
+# downstream models, so differences in later tables include the consequences of upstream differences
+
+import argparse
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pkg_resources
+
+UTILITY_DTYPES = ['float64', 'float32']
+
+# final output tables to compare, with the index column of each
+TABLES = {
+    'households': 'household_id',
+    'persons': 'person_id',
+    'tours': 'tour_id',
+    'trips': 'trip_id',
+}
+
+
+def example_path(example, dirname):
+    resource = os.path.join('examples', example, dirname)
+    return pkg_resources.resource_filename('activitysim', resource)
+
+
+def run_model(args, utility_dtype):
+
+    output_dir = os.path.join(args.output, utility_dtype)
+    override_configs_dir = os.path.join(output_dir, 'configs')
+    os.makedirs(override_configs_dir, exist_ok=True)
+
+    # settings.yaml that inherits the example settings except for these
+    with open(os.path.join(override_configs_dir, 'settings.yaml'), 'w') as f:
+        f.write("inherit_settings: True\n")
+        f.write("utility_dtype: %s\n" % utility_dtype)
+        f.write("households_sample_size: %s\n" % args.households)
+        f.write("use_shadow_pricing: False\n")
+        f.write("multiprocess: False\n")
+
+    cmd = [sys.executable, example_path(args.example, 'simulation.py'),
+           '-c', override_configs_dir,
+           '-c', example_path(args.example, 'configs'),
+           '-d', example_path(args.example, 'data'),
+           '-o', output_dir]
+
+    print("running %s" % ' '.join(cmd))
+    subprocess.check_call(cmd)
+
+    return output_dir
+
+
+def compare_tables(output_dirs):
+
+    results = []
+    for table_name, index_col in TABLES.items():
+
+        file_name = 'final_%s.csv' % table_name
+        base, test = [pd.read_csv(os.path.join(d, file_name), index_col=index_col)
+                      for d in output_dirs]
+
+        # only compare rows and columns present in both runs
+        rows = base.index.intersection(test.index)
+        columns = [c for c in base.columns if c in test.columns]
+
+        print("%s: %s rows in %s, %s rows in %s, %s rows in both" %
+              (table_name, len(base), UTILITY_DTYPES[0], len(test), UTILITY_DTYPES[1], len(rows)))
+
+        base = base.loc[rows, columns]
+        test = test.loc[rows, columns]
+
+        for c in columns:
+            differ = (base[c] != test[c]) & ~(base[c].isnull() & test[c].isnull())
+            if pd.api.types.is_float_dtype(base[c]) and pd.api.types.is_float_dtype(test[c]):
+                # float columns (e.g. logsums) are expected to differ in the low order bits
+                differ &= ~((base[c] - test[c]).abs() <= 1e-4 * base[c].abs().clip(lower=1.0))
+            results.append((table_name, c, len(rows), differ.sum()))
+
+    results = pd.DataFrame(results, columns=['table', 'column', 'rows', 'differ'])
+    results['pct_differ'] = (100.0 * results.differ / results.rows.clip(lower=1)).round(3)
+
+    return results
+
+
+def run(args):
+
+    output_dirs = [run_model(args, utility_dtype) for utility_dtype in UTILITY_DTYPES]
+
+    results = compare_tables(output_dirs)
+
+    results_path = os.path.join(args.output, 'utility_dtype_validation.csv')
+    results.to_csv(results_path, index=False)
+
+    with pd.option_context('display.max_rows', None):
+        print(results[results.differ > 0] if not args.all_columns else results)
+    print("wrote %s" % results_path)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--example', type=str, default='example_mtc', help='example model to run')
+    parser.add_argument('--households', type=int, default=1000, help='households_sample_size')
+    parser.add_argument('--output', type=str, default='utility_dtype_validation', help='output dir')
+    parser.add_argument('--all_columns', action='store_true', help='report columns without differences')
+
+    run(parser.parse_args())